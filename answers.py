@@ -0,0 +1,214 @@
+"""
+Модуль журнала ответов в режиме тренировки.
+
+Обработчик ответа не пишет в базу данных сам: он добавляет событие в буфер
+в памяти (AnswerLog.record), а фоновый поток записывает накопившиеся
+события одной транзакцией - многострочным INSERT в журнал answer_events и
+обновлением сводных счетчиков user_stats и word_stats (см.
+models.write_answer_events). Пачка записывается, когда в буфере набралось
+batch_size событий или прошло interval секунд с первого из них.
+
+Команда "Статистика" читает только сводные счетчики, а перед чтением
+записывает буфер (flush), поэтому видит и самые свежие ответы. При
+остановке бота close записывает оставшиеся события.
+
+Если база данных недоступна (OperationalError и т.п.), события
+возвращаются в начало буфера и записываются следующей пачкой; буфер
+ограничен max_pending событиями, при переполнении отбрасываются самые
+старые. Любая другая ошибка означает, что пачку не принимает сама база
+(например, нарушено ограничение): пачка делится пополам, пока ошибочное
+событие не будет найдено, и отбрасывается только оно, чтобы оно не
+блокировало запись следующих пачек.
+"""
+import logging
+import threading
+import time
+import sqlalchemy as sq
+from metrics import Counter, Histogram, REGISTRY, timed
+from models import write_answer_events
+
+logger = logging.getLogger(__name__)
+
+ANSWER_EVENTS = Counter("bot_answer_events_total", "События ответов", ("result",))
+ANSWER_FLUSH_LATENCY = Histogram(
+    "bot_answer_flush_seconds", "Длительность записи пачки ответов", ()
+)
+REGISTRY.extend([ANSWER_EVENTS, ANSWER_FLUSH_LATENCY])
+
+# ошибки, при которых пачку стоит повторить целиком
+TRANSIENT_ERRORS = (sq.exc.OperationalError, sq.exc.InterfaceError, sq.exc.TimeoutError,
+                    sq.exc.DisconnectionError)
+
+
+class AnswerLog:
+    """
+    Буфер событий ответов с фоновой записью пачками.
+
+    При interval=0 фоновый поток не запускается, и каждое событие
+    записывается сразу в вызывающем потоке (удобно для тестов и отладки).
+
+    Атрибуты:
+        session_factory: Фабрика SQLAlchemy-сессий (свои короткие сессии,
+                         не сессия обновления).
+        batch_size (int): Сколько событий записывать одной пачкой.
+        interval (float): Сколько секунд событие может ждать записи.
+        max_pending (int): Сколько событий может ждать записи, пока база
+                           данных недоступна.
+        stats (dict): Счетчики recorded, flushed, batches, failed, dropped.
+
+    """
+    def __init__(self, session_factory, batch_size=100, interval=1.0, max_pending=100_000):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_pending = max_pending
+        self.stats = dict.fromkeys(("recorded", "flushed", "batches", "failed", "dropped"), 0)
+        self._buffer = []
+        self._first_at = None
+        self._stopped = False
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()  # пачки пишутся строго по очереди
+        self._thread = None
+        if interval > 0:
+            self._thread = threading.Thread(target=self._work, name="answer-log", daemon=True)
+            self._thread.start()
+
+    def record(self, user_id, word_id, correct, answered_at):
+        """
+        Добавляет событие ответа в буфер.
+
+        Параметры:
+            user_id (int): Идентификатор пользователя из таблицы users.
+            word_id (int): Идентификатор пары слов.
+            correct (bool): Правильный ли ответ.
+            answered_at (datetime): Момент ответа (UTC).
+
+        """
+        with self._cond:
+            self._buffer.append((user_id, word_id, bool(correct), answered_at))
+            self.stats["recorded"] += 1
+            self._trim()
+            if self._first_at is None:
+                self._first_at = time.monotonic()
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify()
+        if self._thread is None:
+            self.flush()
+
+    def pending(self):
+        """Возвращает количество событий, ожидающих записи."""
+        with self._cond:
+            return len(self._buffer)
+
+    def flush(self):
+        """
+        Записывает все события из буфера.
+
+        Возвращает:
+            int: Количество записанных событий.
+
+        """
+        with self._flush_lock:
+            with self._cond:
+                events, self._buffer = self._buffer, []
+                self._first_at = None
+            if not events:
+                return 0
+            written, retry = self._write(events)
+            if retry:
+                with self._cond:
+                    self._buffer[:0] = retry  # порядок событий сохраняется
+                    self._first_at = time.monotonic()
+                    self.stats["failed"] += 1
+                    self._trim()
+                ANSWER_EVENTS.inc("failed", amount=len(retry))
+            return written
+
+    def _write(self, events):
+        """
+        Записывает пачку событий одной транзакцией. Если база данных не
+        принимает пачку, делит ее пополам и отбрасывает ошибочные события.
+
+        Возвращает:
+            tuple: (количество записанных событий, события, которые нужно
+                   повторить, потому что база данных недоступна).
+
+        """
+        session = self.session_factory()
+        try:
+            with timed(ANSWER_FLUSH_LATENCY):
+                write_answer_events(session, events)
+        except TRANSIENT_ERRORS:
+            session.rollback()
+            logger.exception("Не удалось записать %d событий ответов", len(events))
+            return 0, events
+        except Exception:  # pylint: disable=broad-except
+            session.rollback()
+            if len(events) == 1:
+                logger.exception("Событие ответа отброшено: %s", events[0])
+                self._drop(1)
+                return 0, []
+        else:
+            with self._cond:
+                self.stats["flushed"] += len(events)
+                self.stats["batches"] += 1
+            ANSWER_EVENTS.inc("flushed", amount=len(events))
+            return len(events), []
+        finally:
+            session.close()
+        middle = len(events) // 2
+        written, retry = self._write(events[:middle])
+        if retry:  # база данных стала недоступна: вторую половину не пробуем
+            return written, retry + events[middle:]
+        more, retry = self._write(events[middle:])
+        return written + more, retry
+
+    def _drop(self, count):
+        with self._cond:
+            self.stats["dropped"] += count
+        ANSWER_EVENTS.inc("dropped", amount=count)
+
+    def _trim(self):
+        """Отбрасывает самые старые события сверх max_pending (под self._cond)."""
+        overflow = len(self._buffer) - self.max_pending
+        if overflow > 0:
+            del self._buffer[:overflow]
+            self.stats["dropped"] += overflow
+            ANSWER_EVENTS.inc("dropped", amount=overflow)
+            logger.warning("Буфер ответов переполнен, отброшено событий: %d", overflow)
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._stopped:
+                    if len(self._buffer) >= self.batch_size:
+                        break
+                    if self._first_at is None:
+                        self._cond.wait()
+                        continue
+                    remaining = self._first_at + self.interval - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._stopped:
+                    return
+            self.flush()
+
+    def close(self, timeout=None):
+        """
+        Останавливает фоновый поток и записывает оставшиеся события.
+
+        Параметры:
+            timeout (float or None): Сколько секунд ждать завершения потока.
+
+        Возвращает:
+            bool: True, если буфер удалось записать полностью.
+
+        """
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+        return self.pending() == 0
@@ -0,0 +1,129 @@
+"""
+Режим работы тг-бота через вебхук.
+
+Обновления принимает локальный HTTP-сервер aiohttp: соединения Telegram
+обслуживаются в одном цикле событий asyncio, поэтому сервер держит сколько
+угодно одновременных запросов и отвечает на каждый, как только обновление
+принято. Обработчики те же, что и в обычном режиме: бот создается
+tg_bot.create_app (база данных, кэши, очередь исходящих сообщений, кэш
+переводов, журнал ответов), и обновление передается на дорожку своего
+пользователя (lanes.py). Поэтому обновления одного пользователя
+обрабатываются строго по порядку прихода, а разных пользователей -
+параллельно. Асинхронный только прием обновлений: обработчики, база данных
+и HTTP-клиенты синхронные, и пропускную способность ограничивают дорожки,
+а не количество соединений.
+
+Обновления передаются на дорожки одним потоком приема по порядку прихода
+запросов. Если очередь дорожки заполнена, ответ Telegram задерживается, пока
+в ней не освободится место (обратное давление), а цикл событий продолжает
+принимать соединения.
+
+Запуск: python async_bot.py
+"""
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from aiohttp import web
+from telebot.types import Update
+import tg_bot
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_PATH = "/webhook"
+BOT = web.AppKey("bot", object)
+SECRET = web.AppKey("secret", object)
+DRAIN_TIMEOUT = web.AppKey("drain_timeout", float)
+ON_STOP = web.AppKey("on_stop", object)
+INTAKE = web.AppKey("intake", ThreadPoolExecutor)  # поток передачи обновлений на дорожки
+
+
+async def handle_webhook(request):
+    """
+    Принимает обновление от Telegram и передает его на дорожку пользователя.
+
+    Ответ отдается после постановки в очередь дорожки, не дожидаясь
+    обработчика, чтобы Telegram не держал соединение на время запросов к
+    базе данных и внешним API.
+
+    Параметры:
+        request (aiohttp.web.Request): POST-запрос с JSON-обновлением.
+
+    Возвращает:
+        aiohttp.web.Response: 200, либо 403 при неверном секретном токене.
+
+    """
+    app = request.app
+    secret = app[SECRET]
+    if secret and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != secret:
+        return web.Response(status=403)
+
+    update = Update.de_json(await request.json())
+    # один поток приема сохраняет порядок, в котором пришли запросы
+    await asyncio.get_running_loop().run_in_executor(
+        app[INTAKE], app[BOT].process_new_updates, [update]
+    )
+    return web.Response()
+
+def _stop(app):
+    # Telegram считает принятые обновления доставленными, поэтому они
+    # обрабатываются до конца; на всю остановку отводится drain_timeout
+    deadline = time.monotonic() + app[DRAIN_TIMEOUT]
+    app[INTAKE].shutdown(wait=True)
+    pool = app[BOT].worker_pool
+    if not pool.drain(max(0.0, deadline - time.monotonic())) \
+            or not pool.stop(max(0.0, deadline - time.monotonic())):
+        logger.warning("Обработка части обновлений не закончилась к остановке")
+    if app[ON_STOP] is not None:
+        app[ON_STOP](max(0.0, deadline - time.monotonic()))
+
+async def _on_cleanup(app):
+    await asyncio.get_running_loop().run_in_executor(None, _stop, app)
+
+def create_webhook_app(bot, secret=None, drain_timeout=10.0, on_stop=None):
+    """
+    Создает aiohttp-приложение с обработчиком вебхука.
+
+    Параметры:
+        bot (telebot.TeleBot): Бот, созданный tg_bot.create_app.
+        secret (str or None): Секретный токен вебхука (заголовок
+                              X-Telegram-Bot-Api-Secret-Token).
+        drain_timeout (float): Сколько секунд при остановке сервера отводится
+                               на обработку принятых обновлений и on_stop.
+        on_stop: Функция on_stop(timeout), вызываемая при остановке после
+                 обработки принятых обновлений с оставшимся до срока
+                 временем в секундах, или None.
+
+    Возвращает:
+        aiohttp.web.Application: Приложение, готовое к запуску.
+
+    """
+    app = web.Application()
+    app[BOT] = bot
+    app[SECRET] = secret
+    app[DRAIN_TIMEOUT] = drain_timeout
+    app[ON_STOP] = on_stop
+    app[INTAKE] = ThreadPoolExecutor(max_workers=1, thread_name_prefix="webhook")
+    app.router.add_post(WEBHOOK_PATH, handle_webhook)
+    app.on_cleanup.append(_on_cleanup)
+    return app
+
+def main():
+    """Создает бота, регистрирует вебхук в Telegram (если задан
+    WEBHOOK_URL) и запускает HTTP-сервер до сигнала остановки."""
+    bot = tg_bot.create_app()
+    config = tg_bot.CONFIG
+    if config["WEBHOOK_URL"]:
+        bot.set_webhook(
+            url=config["WEBHOOK_URL"].rstrip("/") + WEBHOOK_PATH,
+            secret_token=config["WEBHOOK_SECRET"]
+        )
+    print("Bot is currently running (webhook mode)...")
+    web.run_app(
+        create_webhook_app(bot, config["WEBHOOK_SECRET"], config["DRAIN_TIMEOUT"],
+                           on_stop=tg_bot.shutdown),
+        host=config["WEBHOOK_LISTEN"], port=config["WEBHOOK_PORT"], print=None
+    )
+
+if __name__ == '__main__':
+    main()
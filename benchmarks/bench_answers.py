@@ -0,0 +1,78 @@
+"""
+Нагрузочный тест журнала ответов (answers.py): задержка обработки ответа в
+режиме тренировки без журнала, с записью каждого ответа сразу и с записью
+пачками фоновым потоком.
+
+Ответы проходят через настоящие обработчики tg_bot (create_app, SQLite),
+Telegram Bot API заменяет локальная заглушка (replay.StubServer).
+Пользователь начинает тренировку и отвечает на вопрос; время ответа -
+от передачи обновления боту до завершения обработчика.
+
+    python benchmarks/bench_answers.py --answers 2000
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from telebot import apihelper
+from telebot.types import Update
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# pylint: disable=wrong-import-position
+import tg_bot
+from common import Commands
+from replay import StubServer
+
+USER = 42
+MODES = {
+    "без журнала": {"ANSWER_LOG_INTERVAL": 0},
+    "запись каждого ответа сразу": {"ANSWER_LOG_INTERVAL": 0},
+    "запись пачками": {"ANSWER_LOG_INTERVAL": 1.0, "ANSWER_LOG_BATCH": 100},
+}
+
+
+def send(bot, number, text):
+    started = time.perf_counter()
+    bot.process_new_updates([Update.de_json({"update_id": number, "message": {
+        "message_id": number, "date": 1, "text": text,
+        "chat": {"id": USER, "type": "private"},
+        "from": {"id": USER, "is_bot": False, "first_name": "u"},
+        **({"entities": [{"type": "bot_command", "offset": 0, "length": len(text)}]}
+           if text.startswith("/") else {}),
+    }})])
+    assert bot.worker_pool.drain(30)
+    return time.perf_counter() - started
+
+def measure(name, overrides, answers):
+    """Возвращает задержки обработки ответов, с."""
+    stub = StubServer()
+    apihelper.API_URL = stub.api_url
+    bot = tg_bot.create_app({
+        "TOKEN": "0:bench", "DSN": f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}",
+        "TRANSLATE_URL": stub.translate_url, "LANES": 1, "SEND_WORKERS": 0,
+        "TRAINING_INLINE": False, **overrides,
+    })
+    if name == "без журнала":
+        tg_bot.answer_log.record = lambda *args: None
+    for number, text in enumerate(["/start", "u", Commands.TRAIN, Commands.YES]):
+        send(bot, number, text)
+    latencies = [send(bot, 100 + number, "не перевод") for number in range(answers)]
+    tg_bot.shutdown()
+    stub.close()
+    return latencies
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--answers", type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    print(f"Ответов в тренировке: {args.answers}")
+    for name, overrides in MODES.items():
+        latencies = sorted(measure(name, overrides, args.answers))
+        print(f"  {name}: p50 {statistics.median(latencies) * 1000:.2f} мс, "
+              f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.2f} мс")
+
+if __name__ == '__main__':
+    main()
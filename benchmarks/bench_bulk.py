@@ -0,0 +1,105 @@
+"""
+Нагрузочный тест массового импорта и экспорта словаря (bulk.py) в SQLite.
+
+Генерируется файл из N пар слов (CSV или JSON), который импортируется в
+словарь нового пользователя пачками по --chunk-size строк, затем
+импортируется повторно (все пары уже есть в словаре) и экспортируется в
+CSV. Для сравнения часть пар добавляется по одной, как при добавлении
+слова в чате (models.add_word_to_vocabulary, транзакция на слово).
+Выводится пропускная способность в строках в секунду.
+
+    python benchmarks/bench_bulk.py --rows 50000 --format csv
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import sqlalchemy as sq
+from sqlalchemy.orm import Session
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# pylint: disable=wrong-import-position
+from bulk import CHUNK_SIZE, import_pairs, iter_pairs, iter_user_words, write_csv
+from migrations import migrate
+from models import Users, add_word_to_vocabulary
+
+ENGLISH = "abcdefghijklmnopqrstuvwxyz"
+RUSSIAN = "абвгдежзиклмнопрстуфхцчшэюя"
+
+
+def make_pairs(rng, count):
+    return [("".join(rng.choice(ENGLISH) for _ in range(rng.randint(4, 10))),
+             "".join(rng.choice(RUSSIAN) for _ in range(rng.randint(4, 10))))
+            for _ in range(count)]
+
+def write_file(path, pairs, fmt):
+    with open(path, "w", newline="", encoding="utf-8") as out:
+        if fmt == "csv":
+            writer = csv.writer(out)
+            writer.writerow(("target", "translation"))
+            writer.writerows(pairs)
+        else:
+            json.dump([{"target": target, "translation": translation}
+                       for target, translation in pairs], out, ensure_ascii=False)
+
+def add_user(engine, tg_id):
+    with engine.begin() as conn:
+        return conn.execute(sq.insert(Users).values(tg_id=tg_id, name="u")).inserted_primary_key[0]
+
+def import_file(engine, user_id, path, fmt, chunk_size):
+    started = time.perf_counter()
+    with open(path, newline="", encoding="utf-8") as stream:
+        result = import_pairs(engine, user_id, iter_pairs(stream, fmt), chunk_size)
+    return result, time.perf_counter() - started
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--format", choices=("csv", "json"), default="csv")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--single", type=int, default=2000,
+                        help="сколько пар добавить по одной для сравнения")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    directory = tempfile.mkdtemp()
+    engine = sq.create_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+    migrate(engine)
+    rng = random.Random(args.seed)
+    pairs = make_pairs(rng, args.rows)
+    path = os.path.join(directory, f"words.{args.format}")
+    write_file(path, pairs, args.format)
+    user_id = add_user(engine, 1)
+    print(f"Файл {args.format.upper()}: {args.rows} пар, "
+          f"{os.path.getsize(path) / 2 ** 20:.1f} МБ, пачки по {args.chunk_size} строк")
+
+    result, elapsed = import_file(engine, user_id, path, args.format, args.chunk_size)
+    print(f"  импорт: {elapsed:.2f} с, {result['rows'] / elapsed:.0f} строк/с "
+          f"(импортировано {result['imported']})")
+    result, elapsed = import_file(engine, user_id, path, args.format, args.chunk_size)
+    print(f"  повторный импорт: {elapsed:.2f} с, {result['rows'] / elapsed:.0f} строк/с "
+          f"(импортировано {result['imported']})")
+
+    with Session(engine) as session:
+        started = time.perf_counter()
+        count = write_csv(iter_user_words(session, 1), io.StringIO())
+        elapsed = time.perf_counter() - started
+    print(f"  экспорт: {elapsed:.2f} с, {count / elapsed:.0f} строк/с")
+
+    single = make_pairs(rng, args.single)
+    user_id = add_user(engine, 2)
+    with Session(engine) as session:
+        started = time.perf_counter()
+        for target, translation in single:
+            add_word_to_vocabulary(session, user_id, target, translation)
+        elapsed = time.perf_counter() - started
+    print(f"  по одной паре ({args.single} пар): {args.single / elapsed:.0f} строк/с")
+    engine.dispose()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Микробенчмарк подбора дистракторов (distractors.py) для словарей от 1000
+до 100 000 слов.
+
+Пользователь получает N случайных пар слов с переводами разных частей речи
+(по окончанию), общие слова - те, что создает миграция. Измеряется время
+построения индекса пользователя и занимаемая им память, задержка подбора
+трех вариантов DistractorEngine.pick p50/p99 и, для сравнения, случайный
+выбор training.pick_distractors из массива идентификаторов.
+
+    python benchmarks/bench_distractors.py --sizes 1000 10000 100000 --picks 5000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# pylint: disable=wrong-import-position
+from distractors import DistractorEngine
+from migrations import DEFAULT_WORDS
+from training import pick_distractors
+
+RUSSIAN = "абвгдежзиклмнопрстуфхцчшэюя"
+ENDINGS = ("", "а", "ость", "ать", "ить", "ый", "ая", "о")
+USER = 1
+
+
+def make_words(rng, count):
+    return [(100 + number, f"word{number}",
+             "".join(rng.choice(RUSSIAN) for _ in range(rng.randint(3, 8))) + rng.choice(ENDINGS))
+            for number in range(count)]
+
+def percentiles_us(run, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return statistics.median(timings) * 1e6, timings[int(len(timings) * 0.99)] * 1e6
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10_000, 100_000])
+    parser.add_argument("--picks", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    shared = [(number, target, translation)
+              for number, (target, translation) in enumerate(DEFAULT_WORDS, 1)]
+    for size in args.sizes:
+        words = make_words(rng, size)
+        engine = DistractorEngine(lambda session, tg_id, words=words: shared if tg_id == 0 else words)
+        engine.pick(None, 0, 1)  # индекс общих слов
+        started = time.perf_counter()
+        engine.pick(None, USER, words[0][0])  # строит индекс пользователя
+        built = time.perf_counter() - started
+        engine.invalidate(USER)
+        tracemalloc.start()  # замедляет построение, поэтому память измеряется отдельно
+        engine.pick(None, USER, words[0][0])
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        word_ids = array("i", (word_id for word_id, _, _ in words))
+        targets = iter([rng.choice(word_ids) for _ in range(args.picks * 2)])
+        misses = []
+
+        def pick():
+            if engine.pick(None, USER, next(targets)) is None:  # pylint: disable=cell-var-from-loop
+                misses.append(1)  # pylint: disable=cell-var-from-loop
+
+        p50, p99 = percentiles_us(pick, args.picks)
+        random_p50, random_p99 = percentiles_us(
+            lambda: pick_distractors(word_ids, next(targets)), args.picks  # pylint: disable=cell-var-from-loop
+        )
+        print(f"Слов: {size}")
+        print(f"  индекс: {built * 1000:.0f} мс, {memory / 2 ** 20:.1f} МБ")
+        print(f"  pick: p50 {p50:.1f} мкс, p99 {p99:.1f} мкс (без вариантов: {len(misses)})")
+        print(f"  случайные варианты: p50 {random_p50:.1f} мкс, p99 {random_p99:.1f} мкс")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Микробенчмарк накладных расходов метрик (metrics.py).
+
+Измеряется:
+- стоимость одного наблюдения гистограммы и увеличения счетчика;
+- время SQL-запроса к SQLite без подписки на события engine и с ней
+  (instrument_engine);
+- время обработки обновления ботом telebot с обработчиком, выполняющим
+  несколько SQL-запросов, без метрик и с MetricsMiddleware и instrumented,
+  а также с профилированием (Profiler) для сравнения.
+
+    python benchmarks/bench_metrics.py --updates 5000
+"""
+import argparse
+import os
+import sys
+import time
+import sqlalchemy as sq
+import telebot
+from telebot.types import Update
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# pylint: disable=wrong-import-position
+from metrics import Counter, Histogram, MetricsMiddleware, Profiler, instrument_engine
+from metrics import instrumented
+
+QUERIES = 3  # SQL-запросов на обновление, как у обычного обработчика
+
+
+def per_call(run, count):
+    """Среднее время одного вызова run(), мкс."""
+    started = time.perf_counter()
+    for _ in range(count):
+        run()
+    return (time.perf_counter() - started) / count * 1e6
+
+def make_engine(instrument):
+    engine = sq.create_engine("sqlite://")
+    if instrument:
+        instrument_engine(engine)
+    with engine.begin() as conn:
+        conn.execute(sq.text("CREATE TABLE t (id INTEGER PRIMARY KEY, x INTEGER)"))
+        conn.execute(sq.text("INSERT INTO t (x) VALUES (1), (2), (3)"))
+    return engine
+
+def make_bot(engine, middleware):
+    bot = telebot.TeleBot("0:bench", threaded=False, use_class_middlewares=True)
+    if middleware is not None:
+        bot.setup_middleware(middleware)
+
+    def handler(message):  # pylint: disable=unused-argument
+        with engine.connect() as conn:
+            for _ in range(QUERIES):
+                conn.execute(sq.text("SELECT x FROM t WHERE id = 2")).all()
+
+    bot.register_message_handler(
+        instrumented(handler, "state") if middleware is not None else handler,
+        func=lambda message: True
+    )
+    return bot
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--updates", type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    histogram = Histogram("bench_seconds", "", ("handler", "state"))
+    counter = Counter("bench_total", "", ("type",))
+    print(f"Наблюдение гистограммы: {per_call(lambda: histogram.observe(0.003, 'h', 's'), 200_000):.2f} мкс")
+    print(f"Увеличение счетчика: {per_call(lambda: counter.inc('message'), 200_000):.2f} мкс")
+
+    query = sq.text("SELECT x FROM t WHERE id = 2")
+    for instrument in (False, True):
+        engine = make_engine(instrument)
+        with engine.connect() as conn:
+            cost = per_call(lambda: conn.execute(query).all(), args.updates * QUERIES)  # pylint: disable=cell-var-from-loop
+        engine.dispose()
+        print(f"SQL-запрос {'с' if instrument else 'без'} instrument_engine: {cost:.1f} мкс")
+
+    update = Update.de_json({"update_id": 1, "message": {
+        "message_id": 1, "date": 1, "text": "ответ", "chat": {"id": 1, "type": "private"},
+        "from": {"id": 1, "is_bot": False, "first_name": "u"},
+    }})
+    print(f"Обновление ({QUERIES} SQL-запроса в обработчике):")
+    baseline = None
+    for name, instrument, middleware in (
+            ("без метрик", False, None),
+            ("с метриками", True, MetricsMiddleware()),
+            ("с метриками и профилированием", True, MetricsMiddleware(Profiler(10)))):
+        engine = make_engine(instrument)
+        bot = make_bot(engine, middleware)
+        cost = per_call(lambda: bot.process_new_updates([update]), args.updates)  # pylint: disable=cell-var-from-loop
+        engine.dispose()
+        baseline = baseline or cost
+        print(f"  {name}: {cost:.1f} мкс (+{cost - baseline:.1f} мкс, "
+              f"{(cost - baseline) / baseline:+.0%})")
+
+if __name__ == '__main__':
+    main()
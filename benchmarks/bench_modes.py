@@ -0,0 +1,48 @@
+"""
+Нагрузочное сравнение режимов получения обновлений: long polling
+(tg_bot.py, обновления передаются обработчикам напрямую) и вебхук
+(async_bot.py, обновления приходят POST-запросами на локальный
+HTTP-сервер от --clients одновременных клиентов, как от нескольких
+соединений Telegram).
+
+Обе прогонки воспроизводят одну синтетическую запись (replay.py) через
+одинаковый стек обработчиков; Telegram Bot API и API Яндекс для словарей
+заменяет локальная заглушка с задержкой --stub-latency. Для каждого режима
+выводятся пропускная способность и задержки обработки обновлений.
+
+    python benchmarks/bench_modes.py --users 200 --actions 20 --stub-latency 0.05 --clients 1 8 40
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from replay import generate_trace, replay  # pylint: disable=wrong-import-position
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--actions", type=int, default=20,
+                        help="действий (добавление, тренировка, ...) на пользователя")
+    parser.add_argument("--lanes", type=int, default=8)
+    parser.add_argument("--stub-latency", type=float, default=0.05,
+                        help="задержка ответов заглушек API, с")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 8, 40],
+                        help="количества одновременных клиентов вебхука")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    updates = list(generate_trace(args.users, args.actions, seed=args.seed))
+    print(f"Запись: {len(updates)} обновлений от {args.users} пользователей")
+    for webhook, clients in [(False, 1)] + [(True, clients) for clients in args.clients]:
+        result = replay(updates, lanes=args.lanes, stub_latency=args.stub_latency,
+                        webhook=webhook, clients=clients)
+        latency = result["latency"]
+        print(f"  {result['mode']}: {result['throughput']:.1f} обновлений/с, "
+              f"p50 {latency['p50'] * 1000:.1f} мс, p99 {latency['p99'] * 1000:.1f} мс"
+              + ("" if result["completed"] else " (не все обработаны)"))
+
+
+if __name__ == '__main__':
+    main()
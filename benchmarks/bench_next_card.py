@@ -0,0 +1,96 @@
+"""
+Микробенчмарк выбора следующей карточки тренировки (models.next_due_word)
+для словарей из 100, 10 000 и 100 000 карточек в SQLite.
+
+У пользователя N слов с карточками повторения, половина из которых уже
+подошла к повторению. Измеряется время выбора следующей карточки запросом
+по индексу (user_id, due_at), время полного шага (выбор карточки и запись
+результата ответа models.record_review) и, для сравнения, прежний способ:
+загрузка всего словаря пользователя и перемешивание.
+
+    python benchmarks/bench_next_card.py --sizes 100 10000 100000 --picks 500
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import timedelta
+import sqlalchemy as sq
+from sqlalchemy.orm import Session
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# pylint: disable=wrong-import-position
+from migrations import migrate
+from models import Reviews, Users, Vocabulary, Words, load_own_words, next_due_word
+from models import record_review
+from training import utcnow
+
+
+def fill(engine, tg_id, size, rng):
+    """Создает пользователя с size словами и карточками; возвращает users.id."""
+    now = utcnow()
+    with engine.begin() as conn:
+        user_id = conn.execute(sq.insert(Users).values(tg_id=tg_id, name="u")).\
+            inserted_primary_key[0]
+        first = conn.scalar(sq.select(sq.func.max(Words.id))) + 1
+        word_ids = range(first, first + size)
+        conn.execute(sq.insert(Words), [
+            {"id": word_id, "target": f"word{word_id}", "translation": f"слово{word_id}"}
+            for word_id in word_ids
+        ])
+        conn.execute(sq.insert(Vocabulary), [
+            {"user_id": user_id, "word_id": word_id} for word_id in word_ids
+        ])
+        conn.execute(sq.insert(Reviews), [
+            {"user_id": user_id, "word_id": word_id,
+             "due_at": now + timedelta(hours=rng.uniform(-48, 48)),
+             "interval_days": 1.0, "ease": 2.5, "repetitions": 1, "lapses": 0}
+            for word_id in word_ids
+        ])
+    return user_id
+
+def median_ms(run, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 10_000, 100_000])
+    parser.add_argument("--picks", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    engine = sq.create_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+    migrate(engine)
+    print("Карточек | выбор карточки | выбор и запись ответа | весь словарь и shuffle")
+    for number, size in enumerate(args.sizes):
+        tg_id = 1000 + number
+        user_id = fill(engine, tg_id, size, rng)
+        with Session(engine) as session:
+            now = utcnow()
+            pick = median_ms(lambda: next_due_word(session, user_id, now), args.picks)
+
+            def step():
+                word_id = next_due_word(session, user_id, utcnow())
+                record_review(session, user_id, word_id, rng.randint(0, 5), utcnow())
+
+            answer = median_ms(step, args.picks)
+
+            def shuffle_all():
+                words = list(load_own_words(session, tg_id))  # без кэша словарей
+                rng.shuffle(words)
+
+            old = median_ms(shuffle_all, max(3, args.picks // 50))
+        print(f"{size:>8} | {pick:11.3f} мс | {answer:18.3f} мс | {old:19.2f} мс")
+    engine.dispose()
+
+if __name__ == '__main__':
+    main()
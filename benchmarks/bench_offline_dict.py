@@ -0,0 +1,102 @@
+"""
+Микробенчмарк локального словаря (offline_dict.py) на 500 000 записей.
+
+Генерируется N различных случайных слов с переводами и компилируется файл
+словаря. Измеряется время сборки и размер файла, время открытия словаря
+(отображение в память при запуске бота), задержка поиска p50/p99 для
+найденных и отсутствующих слов и прирост резидентной памяти процесса
+(RSS) после открытия и после поиска. Для сравнения те же пары загружаются
+в обычный словарь Python из CSV-файла, как при чтении файла пар целиком
+при запуске.
+
+RSS читается из /proc/self/statm (Linux); на других системах не выводится.
+
+    python benchmarks/bench_offline_dict.py --entries 500000 --lookups 200000
+"""
+import argparse
+import csv
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# pylint: disable=wrong-import-position
+from offline_dict import OfflineDictionary, build
+
+ENGLISH = "abcdefghijklmnopqrstuvwxyz"
+RUSSIAN = "абвгдежзиклмнопрстуфхцчшэюя"
+
+
+def rss_mb():
+    """Резидентная память процесса, МБ, или None вне Linux."""
+    try:
+        with open("/proc/self/statm", encoding="ascii") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def rss_delta(before):
+    after = rss_mb()
+    return "" if before is None or after is None else f", RSS +{after - before:.1f} МБ"
+
+def make_pairs(rng, count):
+    words = set()
+    while len(words) < count:
+        words.add("".join(rng.choice(ENGLISH) for _ in range(rng.randint(4, 12))))
+    return [(word, "".join(rng.choice(RUSSIAN) for _ in range(rng.randint(4, 12))))
+            for word in words]
+
+def latencies_us(lookup, words):
+    timings = []
+    for word in words:
+        started = time.perf_counter()
+        lookup(word)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return statistics.median(timings) * 1e6, timings[int(len(timings) * 0.99)] * 1e6
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--entries", type=int, default=500_000)
+    parser.add_argument("--lookups", type=int, default=200_000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    pairs = make_pairs(rng, args.entries)
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "enru.dict")
+    started = time.perf_counter()
+    build(pairs, path)
+    print(f"Словарь из {args.entries} записей: сборка {time.perf_counter() - started:.2f} с, "
+          f"файл {os.path.getsize(path) / 2 ** 20:.1f} МБ")
+
+    hits = [rng.choice(pairs)[0] for _ in range(args.lookups)]
+    misses = [word + "q" for word in hits]
+    before = rss_mb()
+    started = time.perf_counter()
+    dictionary = OfflineDictionary(path)
+    print(f"  открытие: {(time.perf_counter() - started) * 1000:.2f} мс{rss_delta(before)}")
+    for name, words in (("найденные слова", hits), ("отсутствующие слова", misses)):
+        p50, p99 = latencies_us(dictionary.lookup, words)
+        print(f"  поиск, {name}: p50 {p50:.1f} мкс, p99 {p99:.1f} мкс")
+    print(f"  после {2 * args.lookups} поисков{rss_delta(before)}")
+    dictionary.close()
+
+    source = os.path.join(directory, "words.csv")
+    with open(source, "w", newline="", encoding="utf-8") as out:
+        csv.writer(out).writerows(pairs)
+    before = rss_mb()
+    started = time.perf_counter()
+    with open(source, newline="", encoding="utf-8") as stream:
+        loaded = {word: translation for word, translation in csv.reader(stream)}
+    print(f"Словарь Python из тех же пар: загрузка {(time.perf_counter() - started) * 1000:.0f} мс"
+          f"{rss_delta(before)}")
+    p50, p99 = latencies_us(loaded.get, hits)
+    print(f"  поиск: p50 {p50:.2f} мкс, p99 {p99:.2f} мкс")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+Нагрузочный тест рассылки напоминаний (reminders.py) на 1 000 000
+пользователей в файловой SQLite.
+
+Половина пользователей неактивна; у каждого неактивного одна карточка
+повторения, у половины из них повторение уже наступило. Измеряется время
+обхода таблицы users пачками (models.reminder_candidates) для нескольких
+размеров пачки и время полной рассылки ReminderScheduler.run через
+очередь сообщений sender.SendQueue с ботом, который только запоминает
+получателей (ограничения частоты сняты, время HTTP-запросов к Telegram
+не учитывается). Проверяется, что каждое напоминание отправлено ровно
+один раз, и выводится пиковая резидентная память процесса.
+
+    python benchmarks/bench_reminders.py --users 1000000 --batch-sizes 500 2000
+"""
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import time
+from datetime import timedelta
+import sqlalchemy as sq
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# pylint: disable=wrong-import-position
+from migrations import migrate
+from models import Reviews, Users, reminder_candidates
+from reminders import ReminderScheduler
+from sender import SendQueue
+from training import utcnow
+
+FIRST_TG_ID = 1_000_000
+CHUNK = 50_000
+
+
+class RecordingBot:
+    """Бот, запоминающий получателей вместо обращения к Telegram."""
+    def __init__(self):
+        self.sent = []
+
+    def send_message(self, chat_id, text, **kwargs):  # pylint: disable=unused-argument
+        self.sent.append(chat_id)
+
+
+def fill(engine, users, now):
+    """Создает пользователей; возвращает, скольким положено напоминание."""
+    active, idle = now, now - timedelta(days=3)
+    first = 1000
+    with engine.begin() as conn:
+        for start in range(0, users, CHUNK):
+            numbers = range(start, min(start + CHUNK, users))
+            conn.execute(sq.insert(Users), [
+                {"id": first + number, "tg_id": FIRST_TG_ID + number, "name": "u",
+                 "last_active_at": idle if number % 2 else active}
+                for number in numbers
+            ])
+            conn.execute(sq.insert(Reviews), [
+                {"user_id": first + number, "word_id": 1,
+                 "due_at": now - timedelta(hours=1) if number % 4 == 1 else now + timedelta(days=1),
+                 "interval_days": 1.0, "ease": 2.5, "repetitions": 1, "lapses": 0}
+                for number in numbers if number % 2
+            ])
+    return sum(1 for number in range(users) if number % 4 == 1)
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # КиБ в Linux
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[500, 2000])
+    parser.add_argument("--workers", type=int, default=4, help="потоков очереди сообщений")
+    args = parser.parse_args(argv)
+
+    engine = sq.create_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+    migrate(engine)
+    now = utcnow()
+    started = time.perf_counter()
+    expected = fill(engine, args.users, now)
+    print(f"Пользователей: {args.users}, напоминаний к отправке: {expected} "
+          f"(заполнение {time.perf_counter() - started:.1f} с)")
+    session_factory = sessionmaker(bind=engine)
+
+    idle_before = now - timedelta(hours=20)
+    for batch_size in args.batch_sizes:
+        started = time.perf_counter()
+        found, after_id = 0, 0
+        with session_factory() as session:
+            while True:
+                after_id, due = reminder_candidates(session, after_id, idle_before, now,
+                                                    batch_size, 1)
+                if after_id is None:
+                    break
+                found += len(due)
+        print(f"  обход пачками по {batch_size}: {time.perf_counter() - started:.1f} с, "
+              f"найдено {found}")
+
+    bot = RecordingBot()
+    outbox = SendQueue(bot, workers=args.workers, global_rate=1e9, chat_rate=1e9)
+    scheduler = ReminderScheduler(session_factory, outbox, hour=0, min_words=1, rate=1e9,
+                                  batch_size=args.batch_sizes[-1])
+    started = time.perf_counter()
+    state = scheduler.run(now)
+    elapsed = time.perf_counter() - started
+    outbox.close(timeout=10)
+    engine.dispose()
+    print(f"  рассылка: {elapsed:.1f} с, {state.sent / elapsed:.0f} напоминаний/с, "
+          f"отправлено {state.sent}, повторов {len(bot.sent) - len(set(bot.sent))}, "
+          f"закончена: {'да' if state.finished_at is not None else 'нет'}")
+    print(f"  пиковая RSS процесса: {peak_rss_mb():.0f} МБ")
+
+if __name__ == '__main__':
+    main()
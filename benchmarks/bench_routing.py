@@ -0,0 +1,118 @@
+"""
+Микробенчмарк маршрутизации сообщений: обработчики состояний с фильтрами
+вида bot.get_state(...) == MyStates.X.name (прежний способ) против одного
+чтения состояния и выбора обработчика по словарям (dispatcher.Router).
+
+Хранилище состояний заменяет заглушка, считающая обращения и (по желанию)
+добавляющая задержку удаленного хранилища. Для каждого способа и числа
+состояний выводятся время маршрутизации одного сообщения и количество
+чтений состояния на сообщение.
+
+    python benchmarks/bench_routing.py --states 6 24 96 --messages 20000
+"""
+import argparse
+import os
+import sys
+import time
+import telebot
+from telebot.storage import StateMemoryStorage
+from telebot.types import Message
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dispatcher import Router  # pylint: disable=wrong-import-position
+
+USER = 42
+
+
+class CountingStorage(StateMemoryStorage):
+    """
+    Хранилище состояний в памяти, считающее чтения состояния.
+
+    Атрибуты:
+        reads (int): Количество вызовов get_state.
+        latency (float): Задержка каждого чтения, с (удаленное хранилище).
+
+    """
+    def __init__(self, latency=0.0):
+        super().__init__()
+        self.reads = 0
+        self.latency = latency
+
+    def get_state(self, *args, **kwargs):  # pylint: disable=arguments-differ
+        self.reads += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return super().get_state(*args, **kwargs)
+
+
+def message(text, message_id=1):
+    return Message.de_json({
+        "message_id": message_id, "date": 1, "text": text,
+        "chat": {"id": USER, "type": "private"},
+        "from": {"id": USER, "is_bot": False, "first_name": "u"},
+    })
+
+def filtered_bot(states, commands, storage, handled):
+    """Бот прежней версии: фильтр с get_state у каждого обработчика состояния."""
+    bot = telebot.TeleBot("0:bench", threaded=False, state_storage=storage)
+    for state in states:
+        bot.register_message_handler(
+            lambda msg: handled.append(msg),
+            func=lambda msg, state=state: bot.get_state(msg.from_user.id) == state
+        )
+    for text in commands:
+        bot.register_message_handler(lambda msg: handled.append(msg),
+                                     func=lambda msg, text=text: msg.text == text)
+    return bot
+
+def routed_bot(states, commands, storage, handled):
+    """Бот с одним обработчиком, выбирающим обработчик через Router."""
+    bot = telebot.TeleBot("0:bench", threaded=False, state_storage=storage)
+    router = Router()
+    for key in states:
+        router.state(key)(handled.append)
+    for text in commands:
+        router.command(text)(handled.append)
+
+    def dispatch(msg):
+        handler = router.resolve(bot.get_state(msg.from_user.id), msg.text)
+        if handler is not None:
+            handler(msg)
+
+    bot.register_message_handler(dispatch, func=lambda msg: True)
+    return bot
+
+def measure(factory, states, commands, count, latency):
+    """Возвращает (мкс на сообщение, чтений состояния на сообщение)."""
+    storage = CountingStorage(latency)
+    handled = []
+    bot = factory(states, commands, storage, handled)
+    # пользователь в последнем состоянии - худший случай для перебора фильтров
+    bot.set_state(USER, states[-1], USER)
+    messages = [message("ответ", number) for number in range(count)]
+    started = time.perf_counter()
+    bot.process_new_messages(messages)
+    elapsed = time.perf_counter() - started
+    assert len(handled) == count
+    return elapsed / count * 1e6, storage.reads / count
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--states", type=int, nargs="+", default=[6, 24, 96])
+    parser.add_argument("--commands", type=int, default=8)
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="задержка чтения состояния, с (удаленное хранилище)")
+    args = parser.parse_args(argv)
+
+    commands = [f"команда {number}" for number in range(args.commands)]
+    for count in args.states:
+        states = [f"MyStates:state{number}" for number in range(count)]
+        print(f"Состояний: {count}, команд: {args.commands}")
+        for name, factory in (("фильтры get_state", filtered_bot), ("Router", routed_bot)):
+            per_message, reads = measure(factory, states, commands, args.messages, args.latency)
+            print(f"  {name}: {per_message:.1f} мкс на сообщение, "
+                  f"{reads:.1f} чтений состояния на сообщение")
+
+if __name__ == '__main__':
+    main()
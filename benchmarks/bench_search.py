@@ -0,0 +1,120 @@
+"""
+Микробенчмарк поиска слов (search.py) в сравнении с запросом ILIKE.
+
+Строится индекс из N пар слов (английское слово из случайных букв - худший
+случай для перебора вариантов с опечаткой) и измеряется время запросов по
+началу слова, запросов с одной опечаткой, запросов без совпадений и
+добавления с удалением слова. Для сравнения выполняется такой же поиск по
+началу слова запросом ILIKE по таблице words в SQLite.
+
+    python benchmarks/bench_search.py --words 100000 --queries 2000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import sqlalchemy as sq
+from sqlalchemy.orm import Session
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# pylint: disable=wrong-import-position
+from migrations import migrate
+from models import Words
+from search import SearchIndex
+
+ENGLISH = "abcdefghijklmnopqrstuvwxyz"
+RUSSIAN = "абвгдежзиклмнопрстуфхцчшэюя"
+
+
+def random_word(rng, alphabet):
+    return "".join(rng.choice(alphabet) for _ in range(rng.randint(4, 10)))
+
+def typo(rng, word):
+    """Вносит в слово одну случайную опечатку."""
+    i = rng.randrange(len(word) - 1)
+    kind = rng.choice(("swap", "extra", "missing", "replace"))
+    if kind == "swap":
+        return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+    if kind == "extra":
+        return word[:i] + rng.choice(ENGLISH) + word[i:]
+    if kind == "missing":
+        return word[:i] + word[i + 1:]
+    return word[:i] + rng.choice(ENGLISH.replace(word[i], "")) + word[i + 1:]
+
+def timings(run, queries):
+    """Время выполнения run(query) для каждого запроса, с."""
+    result = []
+    for query in queries:
+        started = time.perf_counter()
+        run(query)
+        result.append(time.perf_counter() - started)
+    return result
+
+def report(title, values):
+    values = sorted(values)
+    print(f"  {title}: p50 {statistics.median(values) * 1e6:.0f} мкс, "
+          f"p99 {values[int(len(values) * 0.99)] * 1e6:.0f} мкс")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--words", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--sql-queries", type=int, default=50,
+                        help="запросов ILIKE (они намного медленнее)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    rows = [(number + 1, random_word(rng, ENGLISH), random_word(rng, RUSSIAN))
+            for number in range(args.words)]
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    index = SearchIndex(rows)
+    built = time.perf_counter() - started
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f"Индекс из {args.words} пар слов: {built:.2f} с, {memory / 2 ** 20:.1f} МБ")
+
+    sample = [rng.choice(rows) for _ in range(args.queries)]
+    prefixes = [target[:rng.randint(2, len(target))] for _, target, _ in sample]
+    report("по началу слова", timings(index.search, prefixes))
+    typos = [typo(rng, target) for _, target, _ in sample]
+    report("с одной опечаткой", timings(index.search, typos))
+    hits = sum(word_id in index.search(query) for query, (word_id, _, _) in zip(typos, sample))
+    print(f"    исходное слово среди первых 10 результатов: {hits / len(sample):.0%} запросов")
+    report("без совпадений", timings(index.search, ["zq" + query for query in typos]))
+
+    def add_remove(row):
+        index.remove(row[0])
+        index.add(*row)
+
+    report("удаление и добавление слова", timings(add_remove, sample))
+
+    engine = sq.create_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+    migrate(engine)
+    with engine.begin() as conn:
+        first = conn.scalar(sq.select(sq.func.max(Words.id))) + 1
+        conn.execute(sq.insert(Words), [
+            {"id": first + word_id, "target": target, "translation": translation}
+            for word_id, target, translation in rows
+        ])
+    with Session(engine) as session:
+        def ilike(query):
+            pattern = query + "%"
+            session.execute(
+                sq.select(Words.id, Words.target, Words.translation).
+                where(sq.or_(Words.target.ilike(pattern), Words.translation.ilike(pattern))).
+                limit(10)
+            ).all()
+
+        report("ILIKE 'q%' в SQLite (опечатки не находит)",
+               timings(ilike, prefixes[:args.sql_queries]))
+    engine.dispose()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+Нагрузочный тест очереди исходящих сообщений (sender.py) с локальной
+заглушкой Bot API (replay.StubServer), которая отвечает ошибкой 429 на
+часть запросов.
+
+Обработчики многих пользователей ставят в очередь по несколько сообщений
+подряд (как "Это правильный ответ" и следующий вопрос тренировки).
+Выводятся устойчивая скорость доставки (сообщений в секунду), количество
+запросов к Bot API и повторов после 429 со склеиванием сообщений и без.
+
+    python benchmarks/bench_sender.py --chats 200 --messages 10 --too-many-requests 20
+"""
+import argparse
+import os
+import sys
+import time
+import telebot
+from telebot import apihelper
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# pylint: disable=wrong-import-position
+from replay import StubServer
+from sender import CHAT_RATE, GLOBAL_RATE, SendQueue
+
+
+def run(args, coalesce):
+    stub = StubServer(latency=args.stub_latency, too_many_requests=args.too_many_requests,
+                      retry_after=args.retry_after)
+    apihelper.API_URL = stub.api_url
+    outbox = SendQueue(telebot.TeleBot("0:bench"), workers=args.workers,
+                       global_rate=args.global_rate, chat_rate=args.chat_rate,
+                       coalesce=coalesce)
+    started = time.perf_counter()
+    for number in range(args.messages):
+        for chat_id in range(1, args.chats + 1):
+            outbox.send_message(chat_id, f"сообщение {number}")
+    outbox.drain()
+    elapsed = time.perf_counter() - started
+    outbox.close()
+    stub.close()
+    total = args.chats * args.messages
+    print(f"  склеивание {'вкл.' if coalesce else 'выкл.'}: {total / elapsed:.1f} сообщений/с "
+          f"за {elapsed:.1f} с, запросов sendMessage {stub.calls.get('sendMessage', 0)}, "
+          f"повторов после 429 {outbox.stats['retried']}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--chats", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=10, help="сообщений в каждый чат")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--global-rate", type=float, default=GLOBAL_RATE)
+    parser.add_argument("--chat-rate", type=float, default=CHAT_RATE)
+    parser.add_argument("--too-many-requests", type=int, default=20,
+                        help="каждый какой запрос заглушка отклоняет ответом 429")
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--stub-latency", type=float, default=0.02)
+    args = parser.parse_args(argv)
+
+    print(f"Чатов: {args.chats}, сообщений в чат: {args.messages}, "
+          f"ограничения: {args.global_rate:g}/с всего, {args.chat_rate:g}/с на чат")
+    for coalesce in (False, True):
+        run(args, coalesce)
+
+if __name__ == '__main__':
+    main()
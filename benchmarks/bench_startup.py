@@ -0,0 +1,81 @@
+"""
+Микробенчмарк запуска бота: время импорта модуля tg_bot и время до
+обработки первого обновления с базой данных SQLite в памяти.
+
+Каждый запуск выполняется в отдельном процессе интерпретатора, чтобы
+импорт был холодным. Импорт tg_bot не читает config.env и не обращается к
+базе данных; create_app создает движок, применяет миграции и собирает
+бота, после чего обрабатывается команда /start. Telegram Bot API заменяет
+локальная заглушка (replay.StubServer).
+
+    python benchmarks/bench_startup.py --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def child():
+    """Один запуск: печатает JSON с длительностями этапов в секундах."""
+    started = time.perf_counter()
+    import tg_bot  # pylint: disable=import-outside-toplevel
+    imported = time.perf_counter()
+
+    # pylint: disable=import-outside-toplevel
+    from telebot import apihelper
+    from telebot.types import Update
+    from replay import StubServer
+
+    stub = StubServer()
+    apihelper.API_URL = stub.api_url
+    app_started = time.perf_counter()
+    bot = tg_bot.create_app({"TOKEN": "0:bench", "DSN": "sqlite://",
+                             "TRANSLATE_URL": stub.translate_url, "SEND_WORKERS": 0})
+    created = time.perf_counter()
+    bot.process_new_updates([Update.de_json({"update_id": 1, "message": {
+        "message_id": 1, "date": 1, "text": "/start",
+        "chat": {"id": 42, "type": "private"},
+        "from": {"id": 42, "is_bot": False, "first_name": "u"},
+        "entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+    }})])
+    bot.worker_pool.drain(10)
+    handled = time.perf_counter()
+    assert stub.calls.get("sendMessage") == 1
+    tg_bot.shutdown()
+    stub.close()
+    print(json.dumps({
+        "import": imported - started,
+        "create_app": created - app_started,
+        "first_update": handled - created,
+        "total": (imported - started) + (handled - app_started),
+    }))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        sys.path.insert(0, ROOT)
+        child()
+        return
+
+    runs = []
+    for _ in range(args.runs):
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), "--child"],
+                                cwd=ROOT, capture_output=True, text=True, check=True).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    print(f"Запусков: {args.runs} (медиана)")
+    for name, title in (("import", "импорт tg_bot"), ("create_app", "create_app"),
+                        ("first_update", "обработка первого обновления"),
+                        ("total", "до первого обновления всего")):
+        print(f"  {title}: {statistics.median(run[name] for run in runs) * 1000:.1f} мс")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Микробенчмарк пула слов тренировки: память состояния пользователя и время
+подготовки одного вопроса для словарей от 10 до 100 тысяч слов.
+
+Сравниваются прежний способ (в состоянии хранится список кортежей
+(target, translation), который перемешивается перед каждым вопросом и
+заменяется срезом all_words[:-1]) и нынешний (массив идентификаторов
+array('i'), выбор вариантов случайными индексами training.pick_distractors
+и загрузка из базы текста только четырех показанных слов).
+
+    python benchmarks/bench_training_pool.py --sizes 10 1000 100000 --questions 200
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from array import array
+import sqlalchemy as sq
+from sqlalchemy.orm import Session
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# pylint: disable=wrong-import-position
+from migrations import migrate
+from models import Words, get_words_by_ids
+from training import pick_distractors
+
+
+def fill(engine, count):
+    """Добавляет count пар слов и возвращает их идентификаторы."""
+    with engine.begin() as conn:
+        first = conn.scalar(sq.select(sq.func.max(Words.id))) + 1
+        conn.execute(sq.insert(Words), [
+            {"id": first + number, "target": f"word{number}", "translation": f"слово{number}"}
+            for number in range(count)
+        ])
+    return list(range(first, first + count))
+
+def pool_size(build):
+    """Сколько байт памяти занимает пул слов, созданный build()."""
+    tracemalloc.start()
+    pool = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return pool, size
+
+def old_questions(all_words, questions):
+    """Прежний способ: перемешать весь список и сохранить срез."""
+    for _ in range(questions):
+        if len(all_words) < 4:
+            all_words = all_words * 2
+        random.shuffle(all_words)
+        target_word, translate = all_words[-1]
+        options = [translate] + [translation for _, translation in all_words[:3]]
+        all_words = all_words[:-1]
+        assert target_word and len(options) == 4
+
+def new_questions(session, word_ids, questions):
+    """Нынешний способ: случайные индексы и текст только показанных слов."""
+    for _ in range(questions):
+        target_id = word_ids[random.randrange(len(word_ids))]
+        texts = get_words_by_ids(session, [target_id, *pick_distractors(word_ids, target_id)])
+        assert len(texts) == 4
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000, 100000])
+    parser.add_argument("--questions", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    engine = sq.create_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+    migrate(engine)
+    ids = fill(engine, max(args.sizes))
+
+    with Session(engine) as session:
+        for size in args.sizes:
+            chosen = ids[:size]
+            # строки создаются заново, как при загрузке списка из базы
+            all_words, old_size = pool_size(
+                lambda size=size: [(f"word{number}", f"слово{number}") for number in range(size)]
+            )
+            word_ids, new_size = pool_size(lambda chosen=chosen: array("i", chosen))
+
+            started = time.perf_counter()
+            old_questions(all_words, args.questions)
+            old_time = (time.perf_counter() - started) / args.questions
+            started = time.perf_counter()
+            new_questions(session, word_ids, args.questions)
+            new_time = (time.perf_counter() - started) / args.questions
+
+            print(f"Слов: {size}")
+            print(f"  список кортежей: {old_size / 1024:.1f} КиБ, "
+                  f"{old_time * 1e6:.1f} мкс на вопрос")
+            print(f"  массив id: {new_size / 1024:.1f} КиБ, "
+                  f"{new_time * 1e6:.1f} мкс на вопрос (с запросом к базе)")
+
+if __name__ == '__main__':
+    main()
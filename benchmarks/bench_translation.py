@@ -0,0 +1,80 @@
+"""
+Нагрузочный тест сервиса перевода (translation.py) с локальной заглушкой
+API Яндекс для словарей (replay.StubServer).
+
+Несколько потоков переводят слова, популярность которых распределена по
+закону Ципфа (как в добавлениях слов пользователями). Выводятся доля
+переводов без обращения к API, количество запросов к заглушке и задержки
+перевода p50/p99.
+
+    python benchmarks/bench_translation.py --lookups 5000 --threads 8 --stub-latency 0.05
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import sqlalchemy as sq
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# pylint: disable=wrong-import-position
+from migrations import migrate
+from replay import StubServer
+from translation import TranslationService
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--lookups", type=int, default=5000)
+    parser.add_argument("--words", type=int, default=2000, help="различных слов")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--stub-latency", type=float, default=0.05,
+                        help="задержка ответа заглушки API, с")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    vocabulary = [f"word{number}" for number in range(args.words)]
+    weights = [1 / (rank + 1) for rank in range(args.words)]
+    words = rng.choices(vocabulary, weights, k=args.lookups)
+
+    engine = sq.create_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+    migrate(engine)
+    stub = StubServer(latency=args.stub_latency)
+    service = TranslationService("key", stub.translate_url, sessionmaker(bind=engine),
+                                 pool_size=args.threads)
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(part):
+        for word in part:
+            started = time.perf_counter()
+            service.translate(word)
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+
+    threads = [threading.Thread(target=worker, args=(words[index::args.threads],))
+               for index in range(args.threads)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    service.close()
+    stub.close()
+
+    latencies.sort()
+    print(f"Переводов: {args.lookups} ({len(set(words))} различных слов), "
+          f"{args.lookups / elapsed:.0f} в секунду")
+    print(f"  без обращения к API: {service.hit_rate():.1%}, запросов к API: "
+          f"{stub.calls.get('lookup', 0)}, объединено одновременных: {service.stats['coalesced']}")
+    print(f"  задержка p50 {latencies[len(latencies) // 2] * 1000:.2f} мс, "
+          f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.2f} мс")
+
+if __name__ == '__main__':
+    main()
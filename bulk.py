@@ -0,0 +1,298 @@
+"""
+Модуль массового импорта и экспорта словаря пользователя.
+
+Файлы CSV/TSV/JSON/JSON Lines разбираются потоково (строка за строкой,
+без загрузки всего списка в память), каждая строка проверяется теми же
+валидаторами, что и при добавлении слова в чате, а в базу данных строки
+записываются пачками: несколько многострочных INSERT (слова, словарь и
+карточки повторения) и одна фиксация транзакции на пачку. Экспорт словаря также выполняется потоково.
+
+Использование из командной строки:
+    python bulk.py import --tg-id 123 words.csv
+    python bulk.py export --tg-id 123 -o words.csv
+"""
+import argparse
+import csv
+import json
+import os.path
+import re
+import sys
+import sqlalchemy as sq
+from sqlalchemy.orm import Session
+from models import Words, Users, Vocabulary, Reviews, dialect_insert
+from common import load_config, validate_target_word, validate_translation
+from migrations import migrate
+from training import utcnow
+
+CHUNK_SIZE = 1000  # количество строк в одной пачке (одна транзакция)
+MAX_WORD_LENGTH = 120  # ограничение столбцов words.target и words.translation
+FORMATS = ("csv", "tsv", "json", "jsonl")
+_WHITESPACE = re.compile(r"[\s,]*")
+
+
+def detect_format(filename):
+    """
+    Определяет формат файла по расширению.
+
+    Параметры:
+        filename (str): Имя файла.
+
+    Возвращает:
+        str or None: Один из FORMATS или None, если формат не поддерживается.
+
+    """
+    extension = os.path.splitext(filename or "")[1].lower().lstrip(".")
+    if extension == "txt":
+        return "tsv"
+    if extension == "ndjson":
+        return "jsonl"
+    return extension if extension in FORMATS else None
+
+def _iter_json_array(stream, read_size=65536):
+    """Потоково разбирает JSON-массив, не загружая его целиком."""
+    decoder = json.JSONDecoder()
+    buffer = stream.read(read_size).lstrip()
+    if not buffer.startswith("["):
+        raise ValueError("Ожидался JSON-массив")
+    pos, eof = 1, False
+    while True:
+        pos = _WHITESPACE.match(buffer, pos).end()
+        if buffer.startswith("]", pos):
+            return
+        try:
+            item, pos = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            more = stream.read(read_size)
+            eof = not more
+            buffer, pos = buffer[pos:] + more, 0
+            continue
+        yield item
+
+def _pair(item):
+    if isinstance(item, dict):
+        return item.get("target"), item.get("translation")
+    if isinstance(item, (list, tuple)) and len(item) >= 2:
+        return item[0], item[1]
+    return None, None
+
+def iter_pairs(stream, fmt):
+    """
+    Потоково читает пары слов из файла.
+
+    Параметры:
+        stream: Текстовый поток с содержимым файла.
+        fmt (str): Формат файла (см. FORMATS). CSV/TSV - два столбца, первая
+                   строка может быть заголовком target,translation; JSON - массив
+                   объектов {"target": ..., "translation": ...} или пар
+                   [target, translation]; JSON Lines - такие же элементы по одному
+                   на строку.
+
+    Возвращает:
+        generator: Пары (target, translation) в исходном виде (без проверки).
+
+    """
+    if fmt in ("csv", "tsv"):
+        reader = csv.reader(stream, delimiter="\t" if fmt == "tsv" else ",")
+        for number, row in enumerate(reader):
+            if number == 0 and row and row[0].strip().lower() == "target":
+                continue  # заголовок
+            yield _pair(row)
+    elif fmt == "json":
+        for item in _iter_json_array(stream):
+            yield _pair(item)
+    elif fmt == "jsonl":
+        for line in stream:
+            if line.strip():
+                yield _pair(json.loads(line))
+    else:
+        raise ValueError(f"Неподдерживаемый формат: {fmt}")
+
+def clean_pair(target, translation):
+    """
+    Приводит пару к нижнему регистру и проверяет ее валидаторами бота.
+
+    Параметры:
+        target: Слово на английском языке.
+        translation: Перевод на русский язык.
+
+    Возвращает:
+        tuple or None: Очищенная пара или None, если пара некорректна.
+
+    """
+    if not isinstance(target, str) or not isinstance(translation, str):
+        return None
+    target, translation = target.strip().lower(), translation.strip().lower()
+    if len(target) > MAX_WORD_LENGTH or len(translation) > MAX_WORD_LENGTH:
+        return None
+    if not validate_target_word(target) or not validate_translation(translation):
+        return None
+    return target, translation
+
+def _insert_ignoring_conflicts(conn, model, rows, index_elements):
+    """Вставляет строки, пропуская существующие; возвращает число вставленных."""
+    stmt = dialect_insert(conn, model)
+    if stmt is not None:
+        # RETURNING возвращает только действительно вставленные строки
+        return len(conn.execute(
+            stmt.on_conflict_do_nothing(index_elements=index_elements).\
+                returning(*model.__table__.primary_key.columns),
+            rows
+        ).all())
+    inserted = 0
+    for row in rows:  # прочие СУБД: вставляем построчно в точке сохранения
+        try:
+            with conn.begin_nested():
+                conn.execute(sq.insert(model), row)
+            inserted += 1
+        except sq.exc.IntegrityError:
+            pass
+    return inserted
+
+def _write_chunk(engine, user_id, pairs):
+    with engine.begin() as conn:
+        _insert_ignoring_conflicts(
+            conn, Words,
+            [{"target": target, "translation": translation} for target, translation in pairs],
+            ["target", "translation"]
+        )
+        word_ids = conn.scalars(
+            sq.select(Words.id).\
+                where(sq.tuple_(Words.target, Words.translation).in_(pairs))
+        ).all()
+        imported = _insert_ignoring_conflicts(
+            conn, Vocabulary,
+            [{"user_id": user_id, "word_id": word_id} for word_id in word_ids],
+            ["user_id", "word_id"]
+        )
+        # карточки повторения создаются вместе со словами, а не в начале тренировки
+        now = utcnow()
+        _insert_ignoring_conflicts(
+            conn, Reviews,
+            [{"user_id": user_id, "word_id": word_id, "due_at": now, "interval_days": 0.0,
+              "ease": 2.5, "repetitions": 0, "lapses": 0} for word_id in word_ids],
+            ["user_id", "word_id"]
+        )
+        return imported
+
+def import_pairs(engine, user_id, pairs, chunk_size=CHUNK_SIZE):
+    """
+    Импортирует пары слов в словарь пользователя пачками.
+
+    Существующие пары переиспользуются (уникальность words и vocabulary),
+    повторы внутри пачки отбрасываются. Каждая пачка - одна транзакция.
+
+    Параметры:
+        engine: SQLAlchemy engine.
+        user_id (int): Идентификатор пользователя из таблицы users.
+        pairs: Итерируемый объект пар (target, translation) в исходном виде.
+        chunk_size (int): Количество строк в пачке.
+
+    Возвращает:
+        dict: Счетчики rows (прочитано строк), imported (пар, добавленных в
+              словарь пользователя; уже бывшие в нем не считаются) и invalid
+              (отброшено некорректных строк).
+
+    """
+    result = {"rows": 0, "imported": 0, "invalid": 0}
+    chunk = {}
+    for target, translation in pairs:
+        result["rows"] += 1
+        pair = clean_pair(target, translation)
+        if pair is None:
+            result["invalid"] += 1
+            continue
+        chunk[pair] = None  # словарь сохраняет порядок и убирает повторы
+        if len(chunk) >= chunk_size:
+            result["imported"] += _write_chunk(engine, user_id, list(chunk))
+            chunk = {}
+    if chunk:
+        result["imported"] += _write_chunk(engine, user_id, list(chunk))
+    return result
+
+def iter_user_words(session, tg_id, batch_size=CHUNK_SIZE):
+    """
+    Потоково выбирает собственные слова пользователя (без общих).
+
+    Параметры:
+        session: SQLAlchemy session.
+        tg_id (int): Идентификатор пользователя в Telegram.
+        batch_size (int): Количество строк, получаемых из базы за раз.
+
+    Возвращает:
+        generator: Пары (target, translation), упорядоченные по target.
+
+    """
+    query = sq.select(Words.target, Words.translation).\
+        select_from(Words).\
+            join(Vocabulary, Words.id == Vocabulary.word_id).\
+            join(Users, Vocabulary.user_id == Users.id).\
+                where(Users.tg_id == tg_id).\
+                order_by(Words.target, Words.id).\
+                execution_options(yield_per=batch_size)
+    for row in session.execute(query):
+        yield row.target, row.translation
+
+def write_csv(pairs, out):
+    """
+    Записывает пары слов в CSV с заголовком target,translation.
+
+    Параметры:
+        pairs: Итерируемый объект пар (target, translation).
+        out: Текстовый поток для записи.
+
+    Возвращает:
+        int: Количество записанных пар.
+
+    """
+    writer = csv.writer(out)
+    writer.writerow(("target", "translation"))
+    count = 0
+    for pair in pairs:
+        writer.writerow(pair)
+        count += 1
+    return count
+
+def main(argv=None):
+    """Точка входа командной строки для импорта и экспорта словаря."""
+    parser = argparse.ArgumentParser(description="Импорт и экспорт словаря пользователя")
+    parser.add_argument("command", choices=("import", "export"))
+    parser.add_argument("--tg-id", type=int, required=True,
+                        help="идентификатор пользователя в Telegram")
+    parser.add_argument("--dsn", help="строка подключения SQLAlchemy (по умолчанию из config.env)")
+    parser.add_argument("--format", choices=FORMATS, help="формат файла импорта")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("-o", "--output", help="файл экспорта (по умолчанию stdout)")
+    parser.add_argument("file", nargs="?", help="файл импорта")
+    args = parser.parse_args(argv)
+
+    engine = sq.create_engine(args.dsn or load_config()["DSN"])
+    migrate(engine)
+    with Session(engine) as session:
+        user_id = session.scalar(sq.select(Users.id).where(Users.tg_id == args.tg_id))
+        if user_id is None:
+            parser.error(f"пользователь с tg_id {args.tg_id} не найден")
+
+        if args.command == "export":
+            out = open(args.output, "w", newline="", encoding="utf-8") if args.output else sys.stdout
+            try:
+                count = write_csv(iter_user_words(session, args.tg_id), out)
+            finally:
+                if out is not sys.stdout:
+                    out.close()
+            print(f"Экспортировано пар: {count}", file=sys.stderr)
+            return
+
+    if not args.file:
+        parser.error("не указан файл импорта")
+    fmt = args.format or detect_format(args.file)
+    if fmt is None:
+        parser.error("не удалось определить формат файла, укажите --format")
+    with open(args.file, newline="", encoding="utf-8-sig") as stream:
+        result = import_pairs(engine, user_id, iter_pairs(stream, fmt), args.chunk_size)
+    print(f"Прочитано строк: {result['rows']}, импортировано пар: {result['imported']}, "
+          f"пропущено некорректных: {result['invalid']}", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
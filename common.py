@@ -0,0 +1,326 @@
+"""
+Общие определения бота:
+команды, состояния, шаблоны сообщений, клавиатуры и валидаторы.
+"""
+import os.path
+from telebot.handler_backends import State, StatesGroup
+from telebot.types import ReplyKeyboardMarkup, KeyboardButton
+from dotenv import load_dotenv
+
+class Commands:
+    """Класс для хранения команд пользователя"""
+    REFUSE_NAME_ENTER = "Отказаться вводить имя"
+    ADD = "Добавить слово"
+    DELETE = "Удалить слово"
+    TRAIN = "Тренироваться"
+    HELP = "Справкаℹ️"
+    MY_DICTIONARY = "Мой словарь"
+    YES = "Да✅"
+    NO = "Нет❌"
+    STOP_TRAINING = "Остановиться"
+    LET_TRANSLATE = "Переведи мое слово сам"
+    PREV_PAGE = "⬅️ Назад"
+    NEXT_PAGE = "Вперед ➡️"
+    STATS = "Статистика📊"
+
+class MyStates(StatesGroup):
+    """Класс для хранения состояний бота для пользователя"""
+    default = State()
+    waiting_for_name = State()
+    waiting_for_target_word = State()
+    waiting_for_translation = State()
+    waiting_word_to_del = State()
+    training = State()
+    training_check = State()
+
+class BotMessages:
+    """Класс для хранения сообщений бота"""
+    WELCOME = """
+👋 Привет! Я ваш помощник в изучении английских слов!
+
+✨ Вот что я умею:
+
+1. Добавлять новые слова для изучения: Скажите мне слово, и я сохраню его для вас, чтобы вы могли учить его позже!
+   
+2. Удалять слово после его полного изучения: Когда вы почувствуете, что освоили слово, дайте мне знать, и я удалю его из вашего списка.
+
+3. Практиковаться над уже существующими словами: Я помогу вам освежить память и потренироваться с вашими словами, которые вы уже добавили.
+
+Начнем учить новые слова? 💪📚 Перед началом, я бы хотел знать, как вас называть! Пожалуйста, напишите своё имя
+"""
+    WELCOME_AGAIN = """
+👋 Рад снова вас видеть! Я ваш помощник в изучении английских слов!
+
+✨ Вот что я умею:
+
+1. Добавлять новые слова для изучения: Просто отправьте мне слово, и я сохраню его для вас, чтобы вы могли учить его позже!
+   
+2. Удалять слово после его полного изучения: Когда вы почувствуете, что освоили слово, дайте мне знать, и я удалю его из вашего списка.
+
+3. Практиковаться над уже существующими словами: Я помогу вам освежить память и потренироваться с вашими словами, которые вы уже добавили.
+
+Начнем учить новые слова? 💪📚
+"""
+    WAITING_NEW_WORD_ENG = """
+Пожалуйста, введите новое слово для изучения по-английски🇬🇧​​
+"""
+    WAITING_NEW_WORD_RUS = """
+Пожалуйста, введите перевод этого слова на русский язык🇷🇺​​
+"""
+    ANSWER_FOR_ANON = """
+Понимаю! Важно быть осторожным в сети 🕵️‍♂️. Давай начнём учить новые слова вместе? 📚😊
+"""
+    ANSWER_FOR_USER = """
+Привет! 😊 Я рад с тобой познакомиться, {}! Давай начнем учить слова и весело проведем время! 🎉✨
+"""
+    INVALID_TARGET_WORD = """
+К сожалению, это слово не подходит! 😔
+
+Но не переживайте, попробуйте ввести слово еще раз! 😊 
+
+Обратите, пожалуйста, внимание: слово должно состоять только из латинских букв (а также допустим символ дефиса)
+"""
+    INVALID_TRASLATION = """
+К сожалению, это слово - не перевод на английский! 😔
+
+Но не переживайте, попробуйте ввести слово еще раз! 😊 
+
+Обратите, пожалуйста, внимание: слово должно состоять только из букв кириллицы (а также допустим символ дефиса)
+"""
+    WORD_SUCCESS_ADDED = """
+Отлично!😊 Пара слов {} - {} была успешно добавлена! Выбирайте, что будем делать сейчас?
+"""
+    WAITING_DEL_WORD_ENG = """
+Давайте выберем слово, которое вы хорошо знаете и уже не хотите изучать!
+"""
+    SUCCESS_DELETE_WORD = """
+Слово было успешно удалено. Командуйте, что мы делаем дальше?
+"""
+    FAILURE_DELETE_WORD = """
+Вы такое слово не добавляли!
+"""
+    DELETE_SUGGESTIONS = """
+Такого слова нет в вашем словаре. Может быть, вы имели в виду одно из этих?
+"""
+    TRAINING_MODE = """
+Добро пожаловать в режим тренировки! 🎉
+
+Сегодня мы будем учиться новым словам и улучшать ваши навыки перевода. Готовы?
+"""
+    TRAINING_MODE_ITERATION = """
+Ваше слово - {}. Укажите правильный перевод!
+"""
+    STOP_TRAINING = """
+Хорошо! Скажите мне, когда будете готовы потренироваться 💪
+"""
+    CORRECT_ANSWER = """
+Замечательно! Это правильный ответ✅
+"""
+    INCORRECT_ANSWER = """
+К сожалению, это неправильный ответ❌ Попробуйте снова
+"""
+    NO_WORDS_LEFT = """
+Супер! Все слова закончились!
+"""
+    FAILURE_TRANSLATE = """
+К сожалению, слово перевести не удалось.😔 Пожалуйста, введите перевод вручную📚
+"""
+    SHOW_DICTIONARY = """
+Слова, которые вы изучаете:
+{}
+"""
+    NO_WORDS_IN_DICT = """
+Вы пока что не добавили слова!
+"""
+    INVALID_USER = """
+Слушайте, похоже, что я вас забыл или не встречал! Давайте срочно познакомимся😊 Напиши мне /start или нажми на "Справкаℹ️"
+"""
+    IMPORT_UNKNOWN_FORMAT = """
+Не получилось разобрать файл😔 Пришлите список слов в формате CSV, TSV, JSON или JSON Lines: по паре "английское слово - перевод" в строке
+"""
+    IMPORT_TOO_LARGE = """
+Файл слишком большой😔 Пришлите список слов размером до {} МБ или разбейте его на несколько файлов
+"""
+    IMPORT_DONE = """
+Импорт завершен!📚 Прочитано строк: {}, добавлено пар: {}, пропущено некорректных строк: {}
+"""
+    EXPORT_DONE = """
+Ваш словарь: {} пар слов📚
+"""
+    STATS = """
+Ваша статистика📊
+
+Ответов: {}, правильных: {} ({:.0%})
+Правильных ответов подряд: {}, лучшая серия: {}
+{}
+"""
+    HARDEST_WORDS = """
+Самые трудные слова:
+{}
+"""
+    REMINDER = """
+Пора потренироваться!📚 Слов ждут повторения: {}. Нажмите "Тренироваться", и начнем💪
+"""
+    NO_STATS = """
+Вы еще не тренировались! Нажмите "Тренироваться", и здесь появится ваша статистика💪
+"""
+
+MARKUP_DEFAULT = ReplyKeyboardMarkup(resize_keyboard=True)
+DEFAULT_BUTTONS = [
+    KeyboardButton(Commands.ADD),
+    KeyboardButton(Commands.DELETE),
+    KeyboardButton(Commands.TRAIN),
+    KeyboardButton(Commands.HELP),
+    KeyboardButton(Commands.MY_DICTIONARY),
+    KeyboardButton(Commands.STATS)
+]
+MARKUP_DEFAULT.add(*DEFAULT_BUTTONS)
+
+def validate_target_word(target):
+    """Проверяет, является ли целевое слово допустимым для записи в бд.
+
+    Параметры:
+        target (str): Слово для проверки.
+
+    Возвращает:
+        bool: True, если слово допустимо, иначе False.
+
+    """
+    allowed_chars = 'abcdefghijklmnopqrstuvwxyz'
+    allowed_chars += allowed_chars.upper() + '- '
+    if not target:
+        return False
+    for char in target:
+        if char not in allowed_chars:
+            return False
+    return True
+
+def validate_translation(translate):
+    """Проверяет, является ли перевод допустимым.
+
+    Параметры:
+        translate (str): Перевод для проверки.
+
+    Возвращает:
+        bool: True, если перевод допустим, иначе False.
+
+    """
+    allowed_chars = 'абвгдеёжзийклмнопрстуфхцчшщъыьэюя'
+    allowed_chars += allowed_chars.upper() + '- '
+    if not translate:
+        return False
+    for char in translate:
+        if char not in allowed_chars:
+            return False
+    return True
+
+DEFAULT_CONFIG = {
+    "TOKEN": None,
+    "DSN": None,  # если не задан, собирается из LOGIN, PASSWORD, HOST, PORT, DATABASE_NAME
+    "LOGIN": None,
+    "PASSWORD": None,
+    "HOST": None,
+    "DATABASE_NAME": None,
+    "PORT": None,
+    "DB_POOL_SIZE": 10,
+    "DB_MAX_OVERFLOW": 5,
+    "DB_POOL_TIMEOUT": 10.0,
+    "DB_POOL_RECYCLE": 1800,
+    "DB_MAX_HOLD": 5.0,  # через сколько секунд удержания соединения писать в журнал
+    "TRANSLATE_TOKEN": None,
+    "TRANSLATE_URL": "https://dictionary.yandex.net/api/v1/dicservice.json/lookup",
+    "TRANSLATE_CACHE_SIZE": 10000,
+    "TRANSLATE_TIMEOUT": 10.0,
+    "IMPORT_MAX_BYTES": 5 << 20,  # наибольший размер файла импорта словаря
+    "TRAINING_INLINE": True,  # тренировка inline-кнопками в одном сообщении
+    "ANSWER_LOG_BATCH": 100,  # сколько ответов записывать в журнал одной пачкой
+    "ANSWER_LOG_INTERVAL": 1.0,  # сколько секунд ответ может ждать записи (0 - сразу)
+    "ANSWER_LOG_MAX_PENDING": 100000,  # сколько ответов хранить, пока база недоступна
+    "REMINDER_HOUR": -1,  # час (UTC) ежедневной рассылки напоминаний (-1 - не рассылать)
+    "REMINDER_IDLE_HOURS": 20.0,  # напоминать тем, кто не писал боту столько часов
+    "REMINDER_MIN_WORDS": 4,
+    "REMINDER_BATCH": 500,
+    "REMINDER_RATE": 20.0,  # напоминаний в секунду (остаток SEND_GLOBAL_RATE - для ответов)
+    "OFFLINE_DICTIONARY": None,  # файл локального словаря (см. offline_dict.py)
+    "STATE_STORAGE": "memory",
+    "VOCABULARY_CACHE_SIZE": 1024,
+    "USER_CACHE_SIZE": 10000,
+    "USER_CACHE_TTL": 600.0,
+    "POLL_TIMEOUT": 20,  # таймаут long polling, секунд
+    "DRAIN_TIMEOUT": 10.0,  # сколько длится остановка: обработка принятых обновлений и буферы
+    "HANDOVER_TIMEOUT": 30.0,  # сколько новый процесс ждет освобождения от предыдущего
+    "LANES": 4,  # потоков обработки обновлений (пользователь всегда на одном потоке)
+    "LANE_QUEUE_SIZE": 100,
+    "SEND_WORKERS": 4,  # 0 - отправлять сообщения сразу, без очереди
+    "SEND_GLOBAL_RATE": 30.0,
+    "SEND_CHAT_RATE": 1.0,
+    "METRICS_PORT": 0,  # 0 - не запускать HTTP-сервер метрик
+    "METRICS_LISTEN": "127.0.0.1",
+    "RECORD_UPDATES": None,  # файл для записи входящих обновлений (см. replay.py)
+    "PROFILE_SLOWEST": 0,  # сколько профилей самых медленных обновлений хранить (0 - выкл.)
+    "WEBHOOK_URL": None,
+    "WEBHOOK_LISTEN": "127.0.0.1",
+    "WEBHOOK_PORT": 8443,
+    "WEBHOOK_SECRET": None,
+}
+
+def _convert(value, default):
+    if isinstance(default, bool):
+        return value.lower() in ("1", "true", "yes", "on")
+    if isinstance(default, int):
+        return int(value)
+    if isinstance(default, float):
+        return float(value)
+    return value
+
+def make_config(**overrides):
+    """Собирает словарь параметров бота из значений по умолчанию.
+
+    Параметры:
+        **overrides: Параметры, отличающиеся от DEFAULT_CONFIG.
+
+    Возвращает:
+        dict: Словарь параметров.
+
+    """
+    config = {**DEFAULT_CONFIG, **overrides}
+    if not config["DSN"]:
+        config["DSN"] = (f'postgresql://{config["LOGIN"]}:{config["PASSWORD"]}'
+                         f'@{config["HOST"]}:{config["PORT"]}/{config["DATABASE_NAME"]}')
+    return config
+
+def load_config(path="config.env"):
+    """Читает параметры бота из env-файла.
+
+    Параметры:
+        path (str): Путь к файлу с параметрами.
+
+    Возвращает:
+        dict: Словарь параметров (значения берутся из переменных окружения,
+              а при их отсутствии - из DEFAULT_CONFIG).
+
+    """
+    if os.path.exists(path):
+        load_dotenv(path)
+    else:
+        raise FileNotFoundError("Файл не был найден")
+
+    return make_config(**{
+        key: _convert(os.getenv(key), default)
+        for key, default in DEFAULT_CONFIG.items() if os.getenv(key)
+    })
+
+def first_translation(tr_json):
+    """Достает первый перевод из ответа API Яндекс для словарей.
+
+    Параметры:
+        tr_json (dict): Разобранный JSON-ответ метода lookup.
+
+    Возвращает:
+        str or None: Первый найденный перевод в нижнем регистре или None.
+
+    """
+    for definition in tr_json['def']:
+        for translation in definition['tr']:
+            return translation['text'].lower()  # первый попавшийся перевод нам подходит
+    return None
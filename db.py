@@ -0,0 +1,220 @@
+"""
+Модуль подключения к базе данных: движок с настроенным пулом соединений,
+сессия на одно обновление (unit of work) и поиск утечек соединений.
+
+Обработчики получают сессию вызовом Session() и не закрывают ее сами:
+SessionMiddleware после обработки обновления фиксирует транзакцию (или
+откатывает ее, если обработчик завершился исключением) и возвращает
+соединение в пул. Обработчики telebot выполняются в пуле потоков, и поток
+обрабатывает одно обновление за раз, поэтому сессия привязана к потоку
+(scoped_session).
+
+PoolMonitor следит за выданными пулом соединениями и сообщает в журнал о
+соединениях, которые не вернулись после обработки обновления (утечка) или
+удерживаются дольше допустимого.
+
+Для тестов предназначен assert_max_queries: он ограничивает количество
+обращений к базе данных внутри блока with.
+"""
+import logging
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+import sqlalchemy as sq
+from sqlalchemy.orm import scoped_session, sessionmaker
+from telebot.handler_backends import BaseMiddleware
+from metrics import Counter, REGISTRY
+
+logger = logging.getLogger(__name__)
+
+CONNECTION_LEAKS = Counter(
+    "bot_db_connection_leaks_total", "Соединения, не возвращенные в пул", ("kind",)
+)
+REGISTRY.append(CONNECTION_LEAKS)
+
+
+def create_db_engine(dsn, pool_size=10, max_overflow=5, pool_timeout=10.0, pool_recycle=1800):
+    """
+    Создает SQLAlchemy engine по строке подключения.
+
+    Для SQLite в памяти используется одно общее соединение, доступное
+    из всех потоков бота (иначе каждое соединение видело бы свою пустую базу).
+    Для остальных баз данных пул соединений настраивается явно.
+
+    Параметры:
+        dsn (str): Строка подключения SQLAlchemy.
+        pool_size (int): Количество постоянных соединений пула.
+        max_overflow (int): Сколько соединений можно открыть сверх pool_size.
+        pool_timeout (float): Сколько секунд ждать свободного соединения.
+        pool_recycle (int): Через сколько секунд пересоздавать соединение.
+
+    Возвращает:
+        sqlalchemy.engine.Engine: Движок базы данных.
+
+    """
+    if dsn.startswith("sqlite") and (dsn in ("sqlite://", "sqlite:///") or ":memory:" in dsn):
+        return sq.create_engine(
+            dsn,
+            connect_args={"check_same_thread": False},
+            poolclass=sq.pool.StaticPool
+        )
+    return sq.create_engine(
+        dsn,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=pool_timeout,
+        pool_recycle=pool_recycle,
+        pool_pre_ping=True
+    )
+
+def create_session(engine):
+    """
+    Создает фабрику сессий, привязанных к текущему потоку.
+
+    Параметры:
+        engine: SQLAlchemy engine.
+
+    Возвращает:
+        sqlalchemy.orm.scoped_session: Session() возвращает сессию текущего
+                                       обновления.
+
+    """
+    return scoped_session(sessionmaker(bind=engine))
+
+
+class PoolMonitor:
+    """
+    Наблюдатель за соединениями, выданными пулом engine.
+
+    Атрибуты:
+        max_hold (float): Сколько секунд соединение может удерживаться,
+                          прежде чем о нем будет сообщено.
+
+    """
+    def __init__(self, engine, max_hold=5.0):
+        self.max_hold = max_hold
+        self._checked_out = {}  # id соединения -> (поток, момент выдачи, стек)
+        self._reported = set()
+        self._lock = threading.Lock()
+        sq.event.listen(engine, "checkout", self._on_checkout)
+        sq.event.listen(engine, "checkin", self._on_checkin)
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        stack = "".join(traceback.format_stack(limit=8)[:-2])
+        with self._lock:
+            self._checked_out[id(dbapi_connection)] = (
+                threading.get_ident(), time.monotonic(), stack
+            )
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        with self._lock:
+            self._checked_out.pop(id(dbapi_connection), None)
+            self._reported.discard(id(dbapi_connection))
+
+    def check_thread(self):
+        """
+        Сообщает о соединениях, которые текущий поток не вернул в пул.
+
+        Возвращает:
+            int: Количество таких соединений.
+
+        """
+        ident = threading.get_ident()
+        with self._lock:
+            leaked = [(key, stack) for key, (owner, _, stack) in self._checked_out.items()
+                      if owner == ident and key not in self._reported]
+            self._reported.update(key for key, _ in leaked)
+        for _, stack in leaked:
+            CONNECTION_LEAKS.inc("leaked")
+            logger.warning("Соединение с базой данных не возвращено в пул после "
+                           "обработки обновления, получено в:\n%s", stack)
+        return len(leaked)
+
+    def check_long_held(self):
+        """
+        Сообщает о соединениях, удерживаемых дольше max_hold секунд.
+
+        Возвращает:
+            int: Количество таких соединений.
+
+        """
+        now = time.monotonic()
+        with self._lock:
+            held = [(key, now - since, stack)
+                    for key, (_, since, stack) in self._checked_out.items()
+                    if now - since > self.max_hold and key not in self._reported]
+            self._reported.update(key for key, _, _ in held)
+        for _, seconds, stack in held:
+            CONNECTION_LEAKS.inc("long_held")
+            logger.warning("Соединение с базой данных удерживается %.1f с, получено в:\n%s",
+                           seconds, stack)
+        return len(held)
+
+
+class SessionMiddleware(BaseMiddleware):
+    """
+    Middleware, завершающее сессию обновления: фиксирует или откатывает
+    транзакцию, возвращает соединение в пул и проверяет утечки.
+
+    Атрибуты:
+        session (scoped_session): Фабрика сессий обработчиков.
+        monitor (PoolMonitor or None): Наблюдатель за пулом.
+
+    """
+    def __init__(self, session, monitor=None):
+        super().__init__()
+        self.update_types = ["message", "callback_query", "inline_query"]
+        self.session = session
+        self.monitor = monitor
+
+    def pre_process(self, message, data):
+        pass
+
+    def post_process(self, message, data, exception):
+        try:
+            if self.session.registry.has():
+                if exception is None:
+                    self.session.commit()
+                else:
+                    self.session.rollback()
+        finally:
+            self.session.remove()
+            if self.monitor is not None:
+                self.monitor.check_thread()
+                self.monitor.check_long_held()
+
+
+@contextmanager
+def assert_max_queries(engine, limit):
+    """
+    Проверяет, что внутри блока with выполнено не более limit SQL-запросов.
+
+    Пример:
+        with assert_max_queries(engine, 3):
+            delete_word_from_db(message)
+
+    Параметры:
+        engine: SQLAlchemy engine.
+        limit (int): Допустимое количество запросов.
+
+    Исключения:
+        AssertionError: Если запросов оказалось больше; в сообщении
+                        перечислены выполненные запросы.
+
+    """
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    sq.event.listen(engine, "before_cursor_execute", count)
+    try:
+        yield statements
+    finally:
+        sq.event.remove(engine, "before_cursor_execute", count)
+    if len(statements) > limit:
+        raise AssertionError(
+            f"Выполнено {len(statements)} SQL-запросов вместо не более {limit}:\n"
+            + "\n".join(statements)
+        )
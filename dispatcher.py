@@ -0,0 +1,64 @@
+"""
+Модуль маршрутизации входящих сообщений тг-бота.
+
+Вместо того чтобы регистрировать каждый обработчик состояния с собственным
+фильтром вида bot.get_state(...) == MyStates.X.name (что дает до шести
+обращений к хранилищу состояний на одно сообщение), состояние пользователя
+читается один раз, а обработчик выбирается по словарям, ключами которых
+служат имена состояний MyStates и тексты команд Commands.
+"""
+
+
+class Router:
+    """
+    Таблица маршрутизации сообщений по состоянию пользователя и тексту команды.
+
+    Обработчики сохраняют приоритет в порядке регистрации: если сообщению
+    подходят и обработчик состояния, и обработчик команды, выбирается тот,
+    что был зарегистрирован раньше (так же, как telebot перебирает
+    обработчики по порядку).
+
+    Атрибуты:
+        by_state (dict): Имя состояния -> (приоритет, обработчик).
+        by_text (dict): Текст команды -> (приоритет, обработчик).
+
+    """
+    def __init__(self):
+        self.by_state = {}
+        self.by_text = {}
+        self._next_priority = 0
+
+    def _register(self, table, key):
+        def decorator(handler):
+            table[key] = (self._next_priority, handler)
+            self._next_priority += 1
+            return handler
+        return decorator
+
+    def state(self, state):
+        """Декоратор: регистрирует обработчик для состояния MyStates."""
+        return self._register(self.by_state, getattr(state, "name", state))
+
+    def command(self, text):
+        """Декоратор: регистрирует обработчик для текста команды Commands."""
+        return self._register(self.by_text, text)
+
+    def resolve(self, state, text):
+        """
+        Выбирает обработчик для сообщения за два обращения к словарям.
+
+        Параметры:
+            state (str or None): Имя текущего состояния пользователя.
+            text (str or None): Текст сообщения.
+
+        Возвращает:
+            callable or None: Обработчик или None, если ни один не подходит.
+
+        """
+        by_state = self.by_state.get(state)
+        by_text = self.by_text.get(text)
+        if by_state is None:
+            return by_text[1] if by_text is not None else None
+        if by_text is None or by_state[0] < by_text[0]:
+            return by_state[1]
+        return by_text[1]
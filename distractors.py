@@ -0,0 +1,299 @@
+"""
+Модуль подбора правдоподобных неправильных вариантов ответа (дистракторов)
+для режима тренировки.
+
+Случайные варианты часто очевидно неверны: к слову "бежать" предлагаются
+"стол" и "зеленый". Индекс дистракторов хранит для каждой пары слов
+признаки перевода - длину, грубую часть речи (по окончанию русского слова)
+и символьные триграммы - и инвертированные списки "признак -> слова".
+Кандидаты набираются случайной выборкой из списков признаков загаданного
+слова, поэтому время подбора не зависит от размера словаря, а лучшими
+считаются кандидаты, похожие на загаданное слово по написанию, части речи
+и длине.
+
+Индексы строятся лениво: один для общих слов (tg_id == 0) и по одному
+для собственных слов каждого пользователя (LRU с ограничением количества).
+При добавлении и удалении слова индекс пользователя обновляется на месте.
+Изменения индекса пользователя выполняются в его дорожке обработки
+(см. lanes.py), поэтому отдельной блокировки индекс не требует.
+"""
+import threading
+from array import array
+from collections import OrderedDict
+from random import randrange, random
+
+GRAM_SIZE = 3
+GROUP_SAMPLES = 8  # кандидатов из слов той же части речи и длины
+GRAM_SAMPLES = 2  # кандидатов из списка каждой триграммы
+MAX_GRAMS = 6  # сколько триграмм загаданного слова просматривать
+
+_POS_ENDINGS = (  # окончания слов длиннее трех букв -> часть речи
+    (("ть", "ти", "чь", "ться", "тись"), "verb"),
+    (("ый", "ий", "ой", "ая", "яя", "ое", "ее"), "adj"),
+    (("о",), "adv"),
+)
+
+
+def part_of_speech(translation):
+    """
+    Грубо определяет часть речи русского перевода по окончанию.
+
+    Параметры:
+        translation (str): Перевод (для словосочетания берется первое слово).
+
+    Возвращает:
+        str: "verb", "adj", "adv" или "noun".
+
+    """
+    head = translation.partition(" ")[0]
+    if len(head) > 3:
+        for endings, pos in _POS_ENDINGS:
+            if head.endswith(endings):
+                return pos
+    return "noun"
+
+
+def features(translation):
+    """
+    Вычисляет признаки перевода.
+
+    Параметры:
+        translation (str): Перевод на русский язык.
+
+    Возвращает:
+        tuple: (часть речи, длина, frozenset триграмм).
+
+    """
+    padded = f" {translation} "
+    grams = frozenset(padded[i:i + GRAM_SIZE] for i in range(len(padded) - GRAM_SIZE + 1))
+    return part_of_speech(translation), len(translation), grams
+
+
+def _length_group(length):
+    return min(length // 3, 6)
+
+
+class DistractorIndex:
+    """
+    Индекс признаков для одного набора пар слов.
+
+    Для каждого слова хранится только перевод, признаки вычисляются заново
+    при построении списков и для немногих кандидатов при подборе.
+    Инвертированные списки - массивы идентификаторов (array('i')). Удаление
+    ленивое: слово удаляется из словаря признаков, а устаревшие
+    идентификаторы пропускаются при выборке и вычищаются перестройкой
+    списков, когда их становится больше, чем живых слов.
+
+    Атрибуты:
+        stale (int): Количество устаревших записей в списках.
+
+    """
+    def __init__(self, rows=()):
+        self._features = {}  # id -> translation
+        self._lists = {}
+        self.stale = 0
+        for word_id, _, translation in rows:
+            self.add(word_id, translation)
+
+    def __len__(self):
+        return len(self._features)
+
+    def __contains__(self, word_id):
+        return word_id in self._features
+
+    def _keys(self, word_id):
+        pos, length, grams = features(self._features[word_id])
+        yield "all"
+        yield (pos, _length_group(length))
+        yield from grams
+
+    def add(self, word_id, translation):
+        """
+        Добавляет пару слов в индекс.
+
+        Параметры:
+            word_id (int): Идентификатор пары слов.
+            translation (str): Перевод на русский язык.
+
+        """
+        if word_id in self._features:
+            return
+        self._features[word_id] = translation
+        for key in self._keys(word_id):
+            self._lists.setdefault(key, array("i")).append(word_id)
+
+    def remove(self, word_id):
+        """
+        Удаляет пару слов из индекса.
+
+        Параметры:
+            word_id (int): Идентификатор пары слов.
+
+        """
+        if self._features.pop(word_id, None) is None:
+            return
+        self.stale += 1
+        if self.stale > len(self._features):
+            self._rebuild()
+
+    def _rebuild(self):
+        self._lists = {}
+        self.stale = 0
+        for word_id in self._features:
+            for key in self._keys(word_id):
+                self._lists.setdefault(key, array("i")).append(word_id)
+
+    def get(self, word_id):
+        """Возвращает перевод пары или None, если ее нет в индексе."""
+        return self._features.get(word_id)
+
+    def sample(self, key, count, into):
+        """
+        Добавляет в множество into до count случайных слов из списка признака.
+
+        Параметры:
+            key: Признак: "all", (часть речи, группа длины) или триграмма.
+            count (int): Сколько слов выбрать.
+            into (set): Множество кандидатов.
+
+        """
+        ids = self._lists.get(key)
+        if not ids:
+            return
+        if len(ids) <= count:
+            into.update(word_id for word_id in ids if word_id in self._features)
+            return
+        for _ in range(count):
+            word_id = ids[randrange(len(ids))]
+            if word_id in self._features:
+                into.add(word_id)
+
+
+class DistractorEngine:
+    """
+    Подбор дистракторов по общим словам и словам пользователя.
+
+    Атрибуты:
+        loader: Функция loader(session, tg_id), возвращающая собственные
+                слова пользователя кортежами (id, target, translation).
+        maxsize (int): Сколько индексов пользователей хранить.
+
+    """
+    SHARED_TG_ID = 0
+
+    def __init__(self, loader, maxsize=1024):
+        self.loader = loader
+        self.maxsize = maxsize
+        self._indexes = OrderedDict()
+        self._shared = None
+        self._lock = threading.Lock()
+
+    def _get_shared(self, session):
+        if self._shared is None:
+            self._shared = DistractorIndex(self.loader(session, self.SHARED_TG_ID))
+        return self._shared
+
+    def _get(self, session, tg_id):
+        with self._lock:
+            index = self._indexes.get(tg_id)
+            if index is not None:
+                self._indexes.move_to_end(tg_id)
+                return index
+        index = DistractorIndex(self.loader(session, tg_id))
+        with self._lock:
+            self._indexes[tg_id] = index
+            while len(self._indexes) > self.maxsize:
+                self._indexes.popitem(last=False)
+        return index
+
+    def pick(self, session, tg_id, target_id, count=3):
+        """
+        Подбирает неправильные варианты ответа для загаданного слова.
+
+        Варианты с тем же переводом, что у загаданного слова, исключаются.
+        Среди кандидатов выбираются count с наибольшей оценкой сходства
+        (общие триграммы, та же часть речи, близкая длина).
+
+        Параметры:
+            session: SQLAlchemy session для построения индексов при промахе.
+            tg_id (int): Идентификатор пользователя в Telegram.
+            target_id (int): Идентификатор загаданной пары слов.
+            count (int): Сколько вариантов нужно.
+
+        Возвращает:
+            list or None: Идентификаторы вариантов или None, если подходящих
+                          слов меньше count.
+
+        """
+        indexes = (self._get_shared(session), self._get(session, tg_id))
+        translation = indexes[1].get(target_id) or indexes[0].get(target_id)
+        if translation is None:
+            return None
+        pos, length, grams = features(translation)
+        gram_keys = list(grams)
+        if len(gram_keys) > MAX_GRAMS:
+            gram_keys = [gram_keys[randrange(len(gram_keys))] for _ in range(MAX_GRAMS)]
+
+        candidates = set()
+        for index in indexes:
+            index.sample((pos, _length_group(length)), GROUP_SAMPLES, candidates)
+            for gram in gram_keys:
+                index.sample(gram, GRAM_SAMPLES, candidates)
+            index.sample("all", count, candidates)  # запас на случай редких признаков
+
+        scored = []
+        for word_id in candidates:
+            other = indexes[1].get(word_id) or indexes[0].get(word_id)
+            if word_id == target_id or other is None or other == translation:
+                continue
+            other_pos, other_length, other_grams = features(other)
+            score = len(grams & other_grams) / len(grams | other_grams)
+            score += 0.5 * (other_pos == pos)
+            score -= 0.05 * abs(other_length - length)
+            scored.append((score + random() * 0.1, word_id))  # разнообразие при равенстве
+        if len(scored) < count:
+            return None
+        scored.sort(reverse=True)
+        return [word_id for _, word_id in scored[:count]]
+
+    def add(self, tg_id, word_id, translation):
+        """
+        Добавляет слово в индекс пользователя, если индекс уже построен.
+
+        Параметры:
+            tg_id (int): Идентификатор пользователя в Telegram.
+            word_id (int): Идентификатор пары слов.
+            translation (str): Перевод на русский язык.
+
+        """
+        with self._lock:
+            index = self._shared if tg_id == self.SHARED_TG_ID else self._indexes.get(tg_id)
+        if index is not None:
+            index.add(word_id, translation)
+
+    def remove(self, tg_id, word_id):
+        """
+        Удаляет слово из индекса пользователя, если индекс уже построен.
+
+        Параметры:
+            tg_id (int): Идентификатор пользователя в Telegram.
+            word_id (int): Идентификатор пары слов.
+
+        """
+        with self._lock:
+            index = self._shared if tg_id == self.SHARED_TG_ID else self._indexes.get(tg_id)
+        if index is not None:
+            index.remove(word_id)
+
+    def invalidate(self, tg_id):
+        """
+        Сбрасывает индекс пользователя (например, после импорта словаря).
+
+        Параметры:
+            tg_id (int): Идентификатор пользователя в Telegram.
+
+        """
+        with self._lock:
+            if tg_id == self.SHARED_TG_ID:
+                self._shared = None
+            self._indexes.pop(tg_id, None)
@@ -0,0 +1,173 @@
+"""
+Модуль упорядоченной обработки обновлений по пользователям.
+
+Стандартный пул потоков telebot раздает обновления из общей очереди любому
+свободному потоку, поэтому два быстрых нажатия одного пользователя (например,
+два ответа в режиме тренировки) могут обрабатываться одновременно и
+перезаписать данные retrieve_data друг друга.
+
+LanePool заменяет пул потоков бота: у каждого потока ("дорожки") своя
+очередь, а обновление попадает на дорожку по from_user.id. Обновления одного
+пользователя обрабатываются строго по порядку, обновления разных
+пользователей - параллельно на разных дорожках. Очереди дорожек ограничены:
+если дорожка не успевает, поток получения обновлений ждет, и новые
+обновления остаются на стороне Telegram (обратное давление).
+
+Для каждой дорожки доступны метрики: длина очереди, время ожидания
+обновления в очереди и количество обработанных обновлений.
+
+При штатной остановке (см. lifecycle.py) пул сообщает о начале и завершении
+каждой задачи через on_start и on_done, а после stop не начинает задачи из
+очередей: такие обновления передаются новому процессу. Задача либо начата
+до stop (и о ней сообщено через on_start), либо не начнется никогда.
+"""
+import queue
+import threading
+import time
+import weakref
+from telebot import util
+from metrics import Counter, Gauge, Histogram, REGISTRY
+
+LANE_WAIT = Histogram(
+    "bot_lane_wait_seconds", "Время ожидания обновления в очереди дорожки", ("lane",)
+)
+LANE_PROCESSED = Counter("bot_lane_processed_total", "Обработанные обновления", ("lane",))
+_pools = weakref.WeakSet()
+LANE_QUEUE = Gauge(
+    "bot_lane_queue_length", "Длина очереди дорожки", ("lane",),
+    lambda: {(str(number),): lane_queue.qsize()
+             for pool in list(_pools) for number, lane_queue in enumerate(pool.queues)}
+)
+REGISTRY.extend([LANE_WAIT, LANE_PROCESSED, LANE_QUEUE])
+
+
+def lane_key(args):
+    """
+    Определяет пользователя, к которому относится задача бота.
+
+    Параметры:
+        args (tuple): Позиционные аргументы задачи; первым telebot передает
+                      сообщение или callback-запрос.
+
+    Возвращает:
+        int: from_user.id или 0, если пользователя нет (например, список
+             сообщений для listener).
+
+    """
+    user = getattr(args[0], "from_user", None) if args else None
+    return getattr(user, "id", None) or 0
+
+
+class LanePool(util.ThreadPool):
+    """
+    Пул потоков бота с отдельной очередью для каждого потока.
+
+    Интерфейс совпадает с telebot.util.ThreadPool (put, raise_exceptions,
+    clear_exceptions, close), поэтому пул подменяет bot.worker_pool.
+
+    Атрибуты:
+        lanes (int): Количество дорожек (потоков).
+        queue_size (int): Максимальная длина очереди дорожки (0 - без ограничения).
+        on_start: Функция on_start(args), вызываемая перед каждой задачей с ее
+                  позиционными аргументами (первый - обновление), или None.
+        on_done: Функция on_done(args), вызываемая после каждой задачи с ее
+                 позиционными аргументами, или None.
+        stopped (bool): Пул остановлен, задачи из очередей не выполняются.
+
+    """
+    def __init__(self, telebot, lanes=4, queue_size=100):
+        super().__init__(telebot, num_threads=0)
+        self.lanes = lanes
+        self.queue_size = queue_size
+        self.queues = [queue.Queue(maxsize=queue_size) for _ in range(lanes)]
+        self.workers = [
+            util.WorkerThread(self.on_exception, lane_queue, name=f"Lane{number}")
+            for number, lane_queue in enumerate(self.queues)
+        ]
+        self.num_threads = lanes
+        self.on_start = None
+        self.on_done = None
+        self.stopped = False
+        self._start_lock = threading.Lock()  # stop и начало задачи не пересекаются
+        self._unfinished = 0  # задачи в очередях и выполняемые
+        self._idle = threading.Condition()
+        _pools.add(self)
+
+    def put(self, func, *args, **kwargs):
+        lane = lane_key(args) % self.lanes
+        with self._idle:
+            self._unfinished += 1
+        self.queues[lane].put((self._run, (str(lane), time.perf_counter(), func) + args, kwargs))
+
+    def _run(self, lane, enqueued, func, *args, **kwargs):
+        try:
+            with self._start_lock:
+                if self.stopped:
+                    return
+                if self.on_start is not None:
+                    self.on_start(args)
+            LANE_WAIT.observe(time.perf_counter() - enqueued, lane)
+            try:
+                func(*args, **kwargs)
+            finally:
+                LANE_PROCESSED.inc(lane)
+                if self.on_done is not None:
+                    self.on_done(args)
+        finally:
+            with self._idle:
+                self._unfinished -= 1
+                self._idle.notify_all()
+
+    def drain(self, timeout=None):
+        """
+        Ждет, пока дорожки выполнят все поставленные задачи.
+
+        Параметры:
+            timeout (float or None): Сколько секунд ждать.
+
+        Возвращает:
+            bool: True, если все задачи выполнены.
+
+        """
+        with self._idle:
+            return self._idle.wait_for(lambda: self._unfinished == 0, timeout)
+
+    def stop(self, timeout=None):
+        """
+        Останавливает дорожки: задачи, ожидающие в очередях, не выполняются,
+        а выполняемые сейчас дорабатывают.
+
+        Параметры:
+            timeout (float or None): Сколько секунд ждать завершения потоков.
+
+        Возвращает:
+            bool: True, если все потоки завершились.
+
+        """
+        with self._start_lock:
+            self.stopped = True
+        for worker in self.workers:
+            worker.stop()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for worker in self.workers:
+            worker.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+        return not any(worker.is_alive() for worker in self.workers)
+
+
+def use_lanes(bot, lanes=4, queue_size=100):
+    """
+    Переводит бота на обработку обновлений по дорожкам пользователей.
+
+    Параметры:
+        bot (telebot.TeleBot): Бот (лучше созданный с num_threads=0, чтобы
+                               не запускать лишние потоки стандартного пула).
+        lanes (int): Количество дорожек.
+        queue_size (int): Максимальная длина очереди дорожки.
+
+    Возвращает:
+        LanePool: Новый пул потоков бота.
+
+    """
+    bot.worker_pool.close()
+    bot.worker_pool = LanePool(bot, lanes, queue_size)
+    return bot.worker_pool
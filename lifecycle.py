@@ -0,0 +1,420 @@
+"""
+Модуль жизненного цикла процесса бота: получение обновлений, штатная
+остановка и передача работы новому процессу без перерыва.
+
+Poller заменяет bot.polling(). Поток получения запрашивает обновления у
+Telegram (getUpdates с long polling) и передает их на дорожки обработки
+(lanes.py), а каждое принятое обновление хранится в памяти, пока дорожка
+не закончит его обработку.
+
+По сигналу SIGTERM (или SIGINT) процесс:
+1. перестает запрашивать обновления; ответ на незавершенный запрос
+   отбрасывается и не подтверждается, поэтому Telegram отдаст эти
+   обновления следующему процессу;
+2. сразу записывает в polling_state номер последнего принятого обновления и
+   отметку released_at: ожидающий этой отметки новый процесс начинает
+   запрашивать обновления, не дожидаясь конца long polling старого;
+3. ждет обработки принятых обновлений, останавливает дорожки и вызывает
+   on_stop (запись буферов, отправка очереди сообщений); на все это
+   отводится drain_timeout секунд с момента сигнала;
+4. записывает обновления, обработка которых не начиналась, в
+   polling_state.pending и ставит отметку drained_at. Обновления, обработка
+   которых началась, но не закончилась к сроку, не передаются: повторная
+   обработка выполнила бы их действия дважды.
+
+Новый процесс при запуске ждет отметки released_at (если предыдущий
+процесс еще работает) и запрашивает обновления после last_update_id, но
+обрабатывать их начинает только после отметки drained_at: сначала
+обновления из pending, затем полученные. Поэтому обновления одного
+пользователя не обрабатываются двумя процессами одновременно, и ни одно
+обновление не теряется и не обрабатывается дважды. Процесс, остановленный
+раньше, чем предыдущий закончил обработку, все равно дожидается его
+pending и передает эти обновления дальше вместе со своими.
+
+Процесс меняет polling_state только пока он записан в ней владельцем: если
+новый процесс забрал получение обновлений по истечении handover_timeout,
+старый ничего в его строку не пишет. Номер последнего принятого обновления
+записывается и во время работы (не чаще раза в CHECKPOINT_INTERVAL секунд),
+поэтому после аварийного завершения новый процесс не запрашивает заново уже
+принятые обновления.
+"""
+import json
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+import requests
+import sqlalchemy as sq
+from telebot import apihelper, types
+from telebot.apihelper import ApiException, ApiTelegramException
+from metrics import Counter, REGISTRY
+from models import PollingState
+from training import utcnow
+
+logger = logging.getLogger(__name__)
+
+ALLOWED_UPDATES = ["message", "callback_query", "inline_query"]
+HANDOVER_POLL = 0.05  # как часто перечитывать polling_state при передаче, секунд
+CHECKPOINT_INTERVAL = 1.0  # как часто записывать last_update_id во время работы, секунд
+MAX_ERROR_INTERVAL = 30.0
+
+UPDATES = Counter("bot_updates_total", "Принятые обновления", ("source",))
+REGISTRY.append(UPDATES)
+
+
+def _is_alive(owner):
+    """Жив ли процесс "хост:pid" (процессы других хостов считаются живыми)."""
+    host, _, pid = owner.rpartition(":")
+    if host != socket.gethostname() or not pid.isdigit():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Poller:
+    """
+    Получение обновлений с штатной остановкой по сигналу.
+
+    Атрибуты:
+        bot (telebot.TeleBot): Бот, обработчики которого вызываются.
+        session_factory: Фабрика SQLAlchemy-сессий для polling_state.
+        pool (lanes.LanePool): Пул дорожек бота.
+        long_poll (int): Таймаут long polling в секундах.
+        drain_timeout (float): Сколько секунд с начала остановки отводится на
+                               обработку принятых обновлений и on_stop.
+        handover_timeout (float): Сколько секунд новый процесс ждет, пока
+                                  предыдущий освободит получение обновлений
+                                  и закончит их обработку.
+        on_stop: Функция on_stop(timeout), вызываемая после остановки дорожек
+                 с оставшимся до срока временем в секундах (запись буферов,
+                 закрытие очередей), или None.
+        owner (str): Имя процесса "хост:pid".
+        last_update_id (int): Последнее принятое обновление.
+        stats (dict): Счетчики fetched, processed, pending_in, pending_out,
+                      unfinished (начатые, но не законченные к остановке).
+
+    """
+    def __init__(self, bot, session_factory, pool, long_poll=20, drain_timeout=10.0,
+                 handover_timeout=30.0, on_stop=None):
+        self.bot = bot
+        self.session_factory = session_factory
+        self.pool = pool
+        self.long_poll = long_poll
+        self.drain_timeout = drain_timeout
+        self.handover_timeout = handover_timeout
+        self.on_stop = on_stop
+        self.bot_id = int(bot.token.split(":")[0])
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.last_update_id = 0
+        self.stats = dict.fromkeys(
+            ("fetched", "processed", "pending_in", "pending_out", "unfinished"), 0
+        )
+        self._inflight = {}  # update_id -> обновление (dict), пока не обработано
+        self._items = {}  # id(сообщения или запроса) -> (update_id, объект) на дорожках
+        self._started = set()  # update_id обновлений, обработка которых началась
+        self._saved_update_id = 0  # last_update_id, записанный в polling_state
+        # RLock: stop() вызывается и из обработчика сигнала в главном потоке
+        self._cond = threading.Condition(threading.RLock())
+        self._stop = threading.Event()
+        self._ready = threading.Event()
+        self._thread = None
+        self.reason = None
+        pool.on_start = self._start
+        pool.on_done = self._done
+
+    def stop(self, reason="stop"):
+        """
+        Запрашивает штатную остановку.
+
+        Параметры:
+            reason (str): Причина остановки для журнала.
+
+        """
+        with self._cond:
+            if not self._stop.is_set():
+                self.reason = reason
+                self._stop.set()
+            self._cond.notify_all()
+
+    def _on_signal(self, signum, frame):  # pylint: disable=unused-argument
+        self.stop(signal.Signals(signum).name)
+
+    def run(self):
+        """
+        Получает и обрабатывает обновления до сигнала остановки, затем
+        останавливается штатно. Вызывается из главного потока.
+        """
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, self._on_signal)
+        previous_draining = self._take_over()
+        self._thread = threading.Thread(target=self._work, name="polling", daemon=True)
+        self._thread.start()
+        pending = self._wait_for_previous(previous_draining)
+        self._accept(pending, force=True)
+        UPDATES.inc("pending", amount=len(pending))
+        self.stats["pending_in"] += len(pending)
+        self._dispatch(pending)
+        self._ready.set()
+        while not self._stop.wait(0.5):
+            pass
+        self._shutdown()
+
+    def _take_over(self):
+        """
+        Становится владельцем получения обновлений.
+
+        Возвращает:
+            bool: True, если предыдущий процесс еще обрабатывает обновления.
+
+        """
+        deadline = time.monotonic() + self.handover_timeout
+        session = self.session_factory()
+        try:
+            while True:
+                state = session.get(PollingState, self.bot_id)
+                if state is None:
+                    session.add(PollingState(bot_id=self.bot_id, owner=self.owner,
+                                             last_update_id=0, drained_at=utcnow()))
+                    session.commit()
+                    return False
+                if state.released_at is not None or state.owner in (None, self.owner) \
+                        or not _is_alive(state.owner):
+                    break
+                if time.monotonic() > deadline:
+                    logger.warning("Процесс %s не освободил получение обновлений за %.0f с",
+                                   state.owner, self.handover_timeout)
+                    break
+                session.rollback()  # следующее чтение - свежие данные
+                time.sleep(HANDOVER_POLL)
+            previous_draining = state.released_at is not None and state.drained_at is None
+            logger.info("Получение обновлений передано от %s, последнее обновление %d",
+                        state.owner, state.last_update_id)
+            self.last_update_id = self._saved_update_id = state.last_update_id
+            state.owner = self.owner
+            state.released_at = None
+            session.commit()
+            return previous_draining
+        finally:
+            session.close()
+
+    def _wait_for_previous(self, previous_draining):
+        """
+        Ждет, пока предыдущий процесс закончит обработку, и забирает
+        обновления, которые он не успел обработать.
+
+        Возвращает:
+            list: Необработанные обновления (dict) по возрастанию update_id.
+
+        """
+        deadline = time.monotonic() + self.handover_timeout
+        session = self.session_factory()
+        try:
+            while True:
+                state = session.get(PollingState, self.bot_id)
+                if not previous_draining or state.drained_at is not None:
+                    break
+                # остановка во время ожидания не прерывает его: обновления
+                # предыдущего процесса должны перейти к следующему
+                if time.monotonic() > deadline:
+                    logger.warning("Предыдущий процесс не закончил обработку за %.0f с",
+                                   self.handover_timeout)
+                    break
+                session.rollback()
+                time.sleep(HANDOVER_POLL)
+            pending = json.loads(state.pending) if state.pending else []
+            state.pending = None
+            session.commit()
+            return pending
+        finally:
+            session.close()
+
+    def _work(self):
+        error_interval = 0.25
+        next_checkpoint = 0.0
+        while not self._stop.is_set():
+            try:
+                updates = apihelper.get_updates(
+                    self.bot.token, offset=self.last_update_id + 1, timeout=self.long_poll,
+                    allowed_updates=ALLOWED_UPDATES, long_polling_timeout=self.long_poll
+                )
+                error_interval = 0.25
+            except Exception as error:  # pylint: disable=broad-except
+                # любая ошибка, в том числе ApiHTTPException (ответ 5xx с HTML
+                # вместо JSON), не должна завершать поток получения обновлений:
+                # run() ждет его и без него процесс зависнет
+                if self._stop.is_set():
+                    break
+                if isinstance(error, ApiTelegramException) and error.error_code == 409:
+                    # обновления запросил другой процесс
+                    logger.error("Обновления получает другой процесс: %s", error.description)
+                    self.stop("conflict")
+                    break
+                if isinstance(error, (ApiException, requests.RequestException)):
+                    logger.error("Ошибка получения обновлений: %s", error)
+                else:
+                    logger.exception("Ошибка получения обновлений")
+                self._stop.wait(error_interval)
+                error_interval = min(MAX_ERROR_INTERVAL, error_interval * 2)
+                continue
+            if not self._accept(updates):
+                break  # остановка: обновления не подтверждены и достанутся новому процессу
+            UPDATES.inc("telegram", amount=len(updates))
+            while not self._ready.wait(0.1):
+                if self._stop.is_set():
+                    return
+            try:
+                self._dispatch(updates)
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Ошибка передачи обновлений на обработку")
+            if self.pool.exception_event.is_set():
+                logger.error("Ошибка обработки обновления: %s", self.pool.exception_info)
+                self.pool.clear_exceptions()
+            if time.monotonic() >= next_checkpoint:
+                next_checkpoint = time.monotonic() + CHECKPOINT_INTERVAL
+                self._checkpoint()
+
+    def _accept(self, updates, force=False):
+        """
+        Запоминает полученные обновления как принятые этим процессом.
+
+        Возвращает:
+            bool: False, если процесс уже останавливается и обновления
+                  не приняты.
+
+        """
+        with self._cond:
+            if self._stop.is_set() and not force:
+                return False
+            for update in updates:
+                self._inflight[update["update_id"]] = update
+                self.last_update_id = max(self.last_update_id, update["update_id"])
+            self.stats["fetched"] += len(updates)
+            return True
+
+    def _dispatch(self, updates):
+        for raw in updates:
+            if self._stop.is_set():
+                return  # остальные обновления будут переданы новому процессу
+            update = types.Update.de_json(raw)
+            item = update.message or update.callback_query or update.inline_query
+            with self._cond:
+                if item is None:  # тип обновления без обработчиков
+                    self._inflight.pop(update.update_id, None)
+                    continue
+                self._items[id(item)] = (update.update_id, item)
+            self.bot.process_new_updates([update])
+
+    def _start(self, args):
+        """Отмечает начало обработки обновления (вызывается дорожкой)."""
+        if not args:
+            return
+        with self._cond:
+            entry = self._items.get(id(args[0]))
+            if entry is not None:
+                self._started.add(entry[0])
+
+    def _done(self, args):
+        """Отмечает обновление обработанным (вызывается дорожкой)."""
+        if not args:
+            return
+        with self._cond:
+            entry = self._items.pop(id(args[0]), None)
+            if entry is not None:
+                self._inflight.pop(entry[0], None)
+                self._started.discard(entry[0])
+                self.stats["processed"] += 1
+                self._cond.notify_all()
+
+    def _update_state(self, session, **values):
+        """
+        Изменяет polling_state, только если получение обновлений все еще
+        принадлежит этому процессу (новый процесс мог забрать его по
+        истечении handover_timeout).
+
+        Возвращает:
+            bool: True, если строка изменена.
+
+        """
+        result = session.execute(
+            sq.update(PollingState)
+            .where(PollingState.bot_id == self.bot_id, PollingState.owner == self.owner)
+            .values(**values)
+        )
+        session.commit()
+        return result.rowcount == 1
+
+    def _checkpoint(self):
+        """Записывает номер последнего принятого обновления, если он изменился."""
+        with self._cond:
+            last_update_id = self.last_update_id
+        if last_update_id == self._saved_update_id:
+            return
+        session = self.session_factory()
+        try:
+            if self._update_state(session, last_update_id=last_update_id):
+                self._saved_update_id = last_update_id
+            else:
+                logger.error("Получение обновлений забрал другой процесс")
+                self.stop("conflict")
+        except Exception:  # pylint: disable=broad-except
+            session.rollback()
+            logger.exception("Не удалось записать номер последнего обновления")
+        finally:
+            session.close()
+
+    def _shutdown(self):
+        logger.info("Остановка (%s): прием обновлений прекращен", self.reason)
+        deadline = time.monotonic() + self.drain_timeout
+        with self._cond:
+            last_update_id = self.last_update_id
+        session = self.session_factory()
+        try:
+            # после отметки released_at строку забирает новый процесс и ждет
+            # drained_at; если же ее забрали раньше (по handover_timeout),
+            # этот процесс в нее больше ничего не пишет
+            released = self._update_state(session, last_update_id=last_update_id,
+                                          released_at=utcnow(), drained_at=None)
+
+            with self._cond:
+                while self._items and deadline > time.monotonic():
+                    self._cond.wait(deadline - time.monotonic())
+            # задачи, которые дорожки еще не начали, уже не начнутся;
+            # выполняемые сейчас дорабатывают до срока
+            if not self.pool.stop(max(0.0, deadline - time.monotonic())):
+                logger.warning("Обработка части обновлений не закончилась к остановке")
+            if self.on_stop is not None:
+                self.on_stop(max(0.0, deadline - time.monotonic()))
+
+            with self._cond:
+                unfinished = sorted(self._started & self._inflight.keys())
+                pending = {update_id: update for update_id, update in self._inflight.items()
+                           if update_id not in self._started}
+            self.stats["unfinished"] = len(unfinished)
+            if unfinished:
+                logger.warning("Обработка обновлений %s не закончилась к остановке, "
+                               "они не передаются новому процессу", unfinished)
+            if not released:
+                logger.error("Получение обновлений забрал другой процесс, обновления %s "
+                             "не переданы", sorted(pending))
+                return
+            # обновления, записанные другим процессом (например, предыдущим,
+            # не уложившимся в handover_timeout), не затираются
+            state = session.get(PollingState, self.bot_id, populate_existing=True)
+            for update in json.loads(state.pending) if state.pending else []:
+                pending.setdefault(update["update_id"], update)
+            pending = [pending[update_id] for update_id in sorted(pending)]
+            state.pending = json.dumps(pending, ensure_ascii=False) if pending else None
+            state.drained_at = utcnow()
+            session.commit()
+            self.stats["pending_out"] = len(pending)
+            logger.info("Остановка закончена: обработано %d, передано новому процессу %d",
+                        self.stats["processed"], len(pending))
+        finally:
+            session.close()
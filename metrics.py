@@ -0,0 +1,376 @@
+"""
+Модуль метрик бота в формате Prometheus.
+
+Собираются:
+- длительность обработчиков по имени обработчика и состоянию MyStates;
+- количество SQL-запросов и строк на одно обновление, длительность запросов
+  (через события SQLAlchemy engine, см. instrument_engine);
+- длительность исходящих HTTP-запросов (API перевода, отправка сообщений);
+- длительность операций долговременного хранилища состояний.
+
+Метрики отдаются HTTP-сервером (start_metrics_server) по адресу /metrics.
+Дополнительно можно включить профилирование: cProfile запускается для
+обновлений (не более одного одновременно), и отчеты о самых медленных
+из них доступны по адресу /profiles.
+
+Модуль не требует сторонних библиотек: формат вывода Prometheus простой,
+а значения хранятся в обычных словарях под блокировкой.
+"""
+import bisect
+import cProfile
+import functools
+import heapq
+import io
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import sqlalchemy as sq
+from telebot.handler_backends import BaseMiddleware
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100, 250, 1000)
+
+
+class Histogram:
+    """
+    Гистограмма Prometheus с метками.
+
+    Атрибуты:
+        name (str): Имя метрики.
+        documentation (str): Описание метрики (строка HELP).
+        labelnames (tuple): Имена меток.
+        buckets (tuple): Верхние границы корзин по возрастанию.
+
+    """
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # значения меток -> [счетчики корзин..., сумма, количество]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        """Добавляет наблюдение value для значений меток labels."""
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def snapshot(self):
+        """
+        Возвращает текущие значения гистограммы.
+
+        Возвращает:
+            dict: Значения меток -> (счетчики корзин, сумма, количество).
+
+        """
+        with self._lock:
+            return {labels: (tuple(values[:-2]), values[-2], values[-1])
+                    for labels, values in self._series.items()}
+
+    def _labels(self, labels, extra=""):
+        pairs = [f'{name}="{value}"' for name, value in zip(self.labelnames, labels)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self):
+        """Возвращает строки метрики в текстовом формате Prometheus."""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        for labels, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                le = self._labels(labels, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            le = self._labels(labels, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {values[-1]}")
+            lines.append(f"{self.name}_sum{self._labels(labels)} {values[-2]}")
+            lines.append(f"{self.name}_count{self._labels(labels)} {values[-1]}")
+        return lines
+
+
+class Counter(Histogram):
+    """Счетчик Prometheus с метками."""
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames, buckets=())
+
+    def inc(self, *labels, amount=1):
+        """Увеличивает счетчик для значений меток labels."""
+        with self._lock:
+            self._series[labels] = self._series.get(labels, 0) + amount
+
+    def snapshot(self):
+        """dict: Текущие значения счетчика по значениям меток."""
+        with self._lock:
+            return dict(self._series)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            series = dict(self._series)
+        for labels, value in sorted(series.items()):
+            lines.append(f"{self.name}{self._labels(labels)} {value}")
+        return lines
+
+
+class Gauge(Histogram):
+    """
+    Показатель Prometheus, значения которого вычисляются при выводе.
+
+    Атрибуты:
+        collect (callable): Функция без аргументов, возвращающая словарь
+                            {значения меток (tuple): значение}.
+
+    """
+    def __init__(self, name, documentation, labelnames, collect):
+        super().__init__(name, documentation, labelnames, buckets=())
+        self.collect = collect
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        for labels, value in sorted(self.collect().items()):
+            lines.append(f"{self.name}{self._labels(labels)} {value}")
+        return lines
+
+
+HANDLER_LATENCY = Histogram(
+    "bot_handler_seconds", "Длительность обработчика", ("handler", "state")
+)
+UPDATE_LATENCY = Histogram(
+    "bot_update_seconds", "Длительность обработки обновления", ("type",)
+)
+UPDATE_QUERIES = Histogram(
+    "bot_update_db_queries", "Количество SQL-запросов на обновление", buckets=COUNT_BUCKETS
+)
+UPDATE_ROWS = Histogram(
+    "bot_update_db_rows", "Количество строк, затронутых SQL-запросами обновления",
+    buckets=COUNT_BUCKETS
+)
+DB_LATENCY = Histogram("bot_db_query_seconds", "Длительность SQL-запроса")
+HTTP_LATENCY = Histogram(
+    "bot_http_request_seconds", "Длительность исходящего HTTP-запроса", ("target", "outcome")
+)
+STATE_STORAGE_LATENCY = Histogram(
+    "bot_state_storage_seconds", "Длительность операции хранилища состояний", ("op",)
+)
+ERRORS = Counter("bot_handler_errors_total", "Исключения в обработчиках", ("type",))
+REGISTRY = [HANDLER_LATENCY, UPDATE_LATENCY, UPDATE_QUERIES, UPDATE_ROWS, DB_LATENCY,
+            HTTP_LATENCY, STATE_STORAGE_LATENCY, ERRORS]
+
+_update = threading.local()  # счетчики запросов обрабатываемого обновления
+
+
+def render():
+    """
+    Возвращает все метрики в текстовом формате Prometheus.
+
+    Возвращает:
+        str: Текст для ответа на запрос /metrics.
+
+    """
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+@contextmanager
+def timed(histogram, *labels):
+    """Измеряет длительность блока with и добавляет ее в гистограмму."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - start, *labels)
+
+def instrumented(handler, state="-"):
+    """
+    Оборачивает обработчик, регистрируемый напрямую в боте, измерением
+    его длительности.
+
+    Параметры:
+        handler (callable): Обработчик обновления.
+        state (str): Значение метки state.
+
+    Возвращает:
+        callable: Обработчик с измерением длительности.
+
+    """
+    @functools.wraps(handler)
+    def wrapper(update):
+        with timed(HANDLER_LATENCY, handler.__name__, state):
+            return handler(update)
+    return wrapper
+
+def instrument_engine(engine):
+    """
+    Подписывается на события engine: считает SQL-запросы, их длительность
+    и количество строк (по cursor.rowcount, если драйвер его сообщает).
+
+    Параметры:
+        engine: SQLAlchemy engine.
+
+    """
+    @sq.event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @sq.event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        DB_LATENCY.observe(time.perf_counter() - conn.info["query_start"].pop())
+        counters = getattr(_update, "counters", None)
+        if counters is not None:
+            counters[0] += 1
+            counters[1] += max(cursor.rowcount, 0)
+
+
+class Profiler:
+    """
+    Профилировщик самых медленных обновлений.
+
+    Одновременно профилируется не более одного обновления (cProfile не
+    поддерживает несколько активных профилировщиков), остальные в это время
+    обрабатываются без профилирования.
+
+    Атрибуты:
+        slowest (int): Сколько отчетов о самых медленных обновлениях хранить.
+
+    """
+    def __init__(self, slowest=10):
+        self.slowest = slowest
+        self._busy = threading.Lock()
+        self._reports = []  # куча (длительность, номер, описание, отчет)
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Возвращает запущенный cProfile.Profile или None, если профилировщик занят."""
+        if not self._busy.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:  # профилирование уже запущено кем-то другим
+            self._busy.release()
+            return None
+        return profile
+
+    def stop(self, profile, seconds, description):
+        """Останавливает профилирование и сохраняет отчет, если обновление среди самых медленных."""
+        profile.disable()
+        self._busy.release()
+        with self._lock:
+            if len(self._reports) >= self.slowest and seconds <= self._reports[0][0]:
+                return
+        out = io.StringIO()
+        pstats.Stats(profile, stream=out).sort_stats("cumulative").print_stats(30)
+        with self._lock:
+            self._seq += 1
+            heapq.heappush(self._reports, (seconds, self._seq, description, out.getvalue()))
+            if len(self._reports) > self.slowest:
+                heapq.heappop(self._reports)
+
+    def render(self):
+        """Возвращает отчеты от самого медленного обновления к самому быстрому."""
+        with self._lock:
+            reports = sorted(self._reports, reverse=True)
+        return "\n".join(f"=== {seconds:.3f} s: {description}\n{report}"
+                         for seconds, _, description, report in reports)
+
+
+def update_kind(update):
+    """Возвращает тип обновления: message, callback_query или inline_query."""
+    if hasattr(update, "query"):
+        return "inline_query"
+    return "callback_query" if hasattr(update, "data") else "message"
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """
+    Middleware, измеряющее обработку каждого обновления: длительность,
+    количество SQL-запросов и строк, а также (если задан profiler)
+    профилирующее самые медленные обновления.
+
+    Атрибуты:
+        profiler (Profiler or None): Профилировщик обновлений.
+
+    """
+    def __init__(self, profiler=None):
+        super().__init__()
+        self.update_types = ["message", "callback_query", "inline_query"]
+        self.profiler = profiler
+
+    def pre_process(self, message, data):
+        _update.counters = [0, 0]
+        data["metrics_profile"] = self.profiler.start() if self.profiler else None
+        data["metrics_start"] = time.perf_counter()
+
+    def post_process(self, message, data, exception):
+        seconds = time.perf_counter() - data["metrics_start"]
+        kind = update_kind(message)
+        UPDATE_LATENCY.observe(seconds, kind)
+        queries, rows = _update.counters
+        _update.counters = None
+        UPDATE_QUERIES.observe(queries)
+        UPDATE_ROWS.observe(rows)
+        if exception is not None:
+            ERRORS.inc(type(exception).__name__)
+        profile = data["metrics_profile"]
+        if profile is not None:
+            text = getattr(message, "text", None) or getattr(message, "data", None) \
+                or getattr(message, "query", None)
+            self.profiler.stop(profile, seconds, f"{kind} {text!r}, SQL-запросов: {queries}")
+
+
+class _MetricsServer(ThreadingHTTPServer):
+    # при перезапуске (lifecycle.py) новый процесс открывает порт, пока
+    # старый заканчивает работу
+    allow_reuse_port = True
+
+
+def start_metrics_server(port, host="127.0.0.1", profiler=None):
+    """
+    Запускает HTTP-сервер метрик в фоновом потоке.
+
+    Параметры:
+        port (int): Порт сервера.
+        host (str): Адрес, на котором слушает сервер.
+        profiler (Profiler or None): Профилировщик, отчеты которого отдаются
+                                     по адресу /profiles.
+
+    Возвращает:
+        ThreadingHTTPServer: Запущенный сервер (остановка - shutdown()).
+
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):  # pylint: disable=invalid-name
+            if self.path == "/metrics":
+                body, content_type = render(), "text/plain; version=0.0.4; charset=utf-8"
+            elif self.path == "/profiles" and profiler is not None:
+                body, content_type = profiler.render(), "text/plain; charset=utf-8"
+            else:
+                self.send_error(404)
+                return
+            payload = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+            pass
+
+    server = _MetricsServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
@@ -0,0 +1,343 @@
+"""
+Модуль версионированных миграций схемы базы данных.
+
+Раньше при каждом запуске бота таблицы удалялись и создавались заново
+(drop_all), а начальные данные заполнялись повторно. Теперь номер версии
+схемы хранится в таблице schema_version, и при запуске применяются только
+недостающие шаги. Если база данных уже актуальна, запуск ограничивается
+одним чтением версии: никаких DDL-запросов и потери данных.
+
+Новый шаг добавляется в конец списка MIGRATIONS со следующим номером.
+Примененные шаги не изменяются: каждый шаг описывает свои таблицы и
+изменения явно, а не через текущие модели models.py. Шаг 1 - схема бота
+до появления миграций, поэтому база данных, созданная прежней версией,
+обновляется теми же шагами, что и новая.
+"""
+import sqlalchemy as sq
+from training import utcnow
+
+# общие слова, доступные всем пользователям (tg_id == 0)
+DEFAULT_WORDS = [
+    ("vitamin", "витамин"),
+    ("oven", "духовка"),
+    ("silk", "шелк"),
+    ("jacket", "куртка"),
+    ("soda", "газировка"),
+    ("shower", "душ"),
+    ("sword", "меч"),
+    ("vampire", "вампир"),
+    ("widow", "вдова"),
+    ("stick", "палка"),
+]
+
+schema_version = sq.Table(
+    "schema_version",
+    sq.MetaData(),
+    sq.Column("version", sq.Integer, primary_key=True),
+    sq.Column("description", sq.String(length=200), nullable=False),
+    sq.Column("applied_at", sq.DateTime, server_default=sq.func.now(), nullable=False),
+)
+
+# Таблицы в том виде, в каком их создает каждый шаг. Шаги не используют
+# модели из models.py: модели описывают схему последней версии, и их
+# изменение не должно менять то, что делают уже примененные шаги.
+_schema = sq.MetaData()
+
+_users = sq.Table(
+    "users", _schema,
+    sq.Column("id", sq.Integer, primary_key=True),
+    sq.Column("tg_id", sq.BigInteger, unique=True, nullable=False),
+    sq.Column("name", sq.String(length=75), nullable=True),
+)
+_words = sq.Table(
+    "words", _schema,
+    sq.Column("id", sq.Integer, primary_key=True),
+    sq.Column("target", sq.String(length=120), nullable=False),
+    sq.Column("translation", sq.String(length=120), nullable=False),
+)
+_vocabulary = sq.Table(
+    "vocabulary", _schema,
+    sq.Column("id", sq.Integer, primary_key=True),
+    sq.Column("user_id", sq.Integer, sq.ForeignKey("users.id"), nullable=False),
+    sq.Column("word_id", sq.Integer, sq.ForeignKey("words.id"), nullable=False),
+)
+_bot_states = sq.Table(
+    "bot_states", _schema,
+    sq.Column("chat_id", sq.BigInteger, primary_key=True),
+    sq.Column("user_id", sq.BigInteger, primary_key=True),
+    sq.Column("state", sq.String(length=100), nullable=True),
+    sq.Column("data", sq.LargeBinary, nullable=True),
+)
+_translations = sq.Table(
+    "translations", _schema,
+    sq.Column("word", sq.String(length=120), primary_key=True),
+    sq.Column("translation", sq.String(length=120), nullable=False),
+)
+_reviews = sq.Table(
+    "reviews", _schema,
+    sq.Column("user_id", sq.Integer, sq.ForeignKey("users.id"), primary_key=True),
+    sq.Column("word_id", sq.Integer, sq.ForeignKey("words.id"), primary_key=True),
+    sq.Column("due_at", sq.DateTime, nullable=False),
+    sq.Column("interval_days", sq.Float, nullable=False),
+    sq.Column("ease", sq.Float, nullable=False),
+    sq.Column("repetitions", sq.Integer, nullable=False),
+    sq.Column("lapses", sq.Integer, nullable=False),
+    sq.Index("ix_reviews_user_due", "user_id", "due_at"),
+)
+_answer_events = sq.Table(
+    "answer_events", _schema,
+    sq.Column("id", sq.BigInteger().with_variant(sq.Integer, "sqlite"), primary_key=True),
+    sq.Column("user_id", sq.Integer, sq.ForeignKey("users.id"), nullable=False),
+    sq.Column("word_id", sq.Integer, nullable=False),
+    sq.Column("correct", sq.Boolean, nullable=False),
+    sq.Column("answered_at", sq.DateTime, nullable=False),
+)
+_user_stats = sq.Table(
+    "user_stats", _schema,
+    sq.Column("user_id", sq.Integer, sq.ForeignKey("users.id"), primary_key=True),
+    sq.Column("answers", sq.Integer, nullable=False),
+    sq.Column("correct", sq.Integer, nullable=False),
+    sq.Column("streak", sq.Integer, nullable=False),
+    sq.Column("best_streak", sq.Integer, nullable=False),
+    sq.Column("last_answer_at", sq.DateTime, nullable=True),
+)
+_word_stats = sq.Table(
+    "word_stats", _schema,
+    sq.Column("user_id", sq.Integer, sq.ForeignKey("users.id"), primary_key=True),
+    sq.Column("word_id", sq.Integer, primary_key=True),
+    sq.Column("answers", sq.Integer, nullable=False),
+    sq.Column("mistakes", sq.Integer, nullable=False),
+    sq.Index("ix_word_stats_user_mistakes", "user_id", "mistakes"),
+)
+_reminder_runs = sq.Table(
+    "reminder_runs", _schema,
+    sq.Column("day", sq.Date, primary_key=True),
+    sq.Column("last_user_id", sq.Integer, nullable=False),
+    sq.Column("sent", sq.Integer, nullable=False),
+    sq.Column("started_at", sq.DateTime, nullable=False),
+    sq.Column("finished_at", sq.DateTime, nullable=True),
+)
+_polling_state = sq.Table(
+    "polling_state", _schema,
+    sq.Column("bot_id", sq.BigInteger, primary_key=True),
+    sq.Column("owner", sq.String(length=100), nullable=True),
+    sq.Column("last_update_id", sq.BigInteger, nullable=False),
+    sq.Column("released_at", sq.DateTime, nullable=True),
+    sq.Column("drained_at", sq.DateTime, nullable=True),
+    sq.Column("pending", sq.Text, nullable=True),
+)
+
+# bot_states с данными состояния в JSON вместо pickle (шаг 13)
+_bot_states_json = sq.Table(
+    "bot_states", sq.MetaData(),
+    sq.Column("chat_id", sq.BigInteger, primary_key=True),
+    sq.Column("user_id", sq.BigInteger, primary_key=True),
+    sq.Column("state", sq.String(length=100), nullable=True),
+    sq.Column("data", sq.Text, nullable=True),
+)
+
+# соответствие "дубликат пары слов -> оставляемая пара" на время шага 11
+_word_merge = sq.Table(
+    "word_merge", sq.MetaData(),
+    sq.Column("old_id", sq.Integer, primary_key=True),
+    sq.Column("new_id", sq.Integer, nullable=False, index=True),
+    prefixes=["TEMPORARY"],
+)
+
+
+def _create(conn, *tables):
+    # checkfirst: база, созданная до появления миграций, уже содержит
+    # таблицы шага 1 (и, возможно, bot_states из хранилища состояний)
+    _schema.create_all(conn, tables=list(tables), checkfirst=True)
+
+def _v1_initial_schema(conn):
+    _create(conn, _users, _words, _vocabulary)
+
+def _v2_default_data(conn):
+    if conn.scalar(sq.select(_users.c.id).where(_users.c.tg_id == 0)) is not None:
+        return  # база создана до миграций и уже заполнена
+    conn.execute(_users.insert().values(tg_id=0, name="everybody"))
+    everybody = conn.scalar(sq.select(_users.c.id).where(_users.c.tg_id == 0))
+    for target, translation in DEFAULT_WORDS:
+        word_id = conn.execute(
+            _words.insert().values(target=target, translation=translation)
+        ).inserted_primary_key[0]
+        conn.execute(_vocabulary.insert().values(user_id=everybody, word_id=word_id))
+
+def _v3_bot_states(conn):
+    _create(conn, _bot_states)
+
+def _v4_translations_cache(conn):
+    _create(conn, _translations)
+
+def _v5_reviews(conn):
+    _create(conn, _reviews)
+
+def _v6_words_keyset_index(conn):
+    conn.execute(sq.text("CREATE INDEX ix_words_target_id ON words (target, id)"))
+
+def _v7_answer_stats(conn):
+    _create(conn, _answer_events, _user_stats, _word_stats)
+
+def _v8_users_last_active_at(conn):
+    column_type = sq.DateTime().compile(dialect=conn.dialect)
+    conn.execute(sq.text(f"ALTER TABLE users ADD COLUMN last_active_at {column_type}"))
+    # существующие пользователи считаются активными на момент миграции,
+    # чтобы первая рассылка не ушла всем сразу
+    conn.execute(sq.text("UPDATE users SET last_active_at = :now"), {"now": utcnow()})
+
+def _v9_reminder_runs(conn):
+    _create(conn, _reminder_runs)
+
+def _v10_polling_state(conn):
+    _create(conn, _polling_state)
+
+def _repoint(conn, table):
+    """Переводит ссылки table на дубликаты пар слов на оставляемые пары."""
+    conn.execute(sq.text(f"""
+        UPDATE {table} SET word_id = (
+            SELECT new_id FROM word_merge WHERE old_id = {table}.word_id)
+        WHERE word_id IN (SELECT old_id FROM word_merge)
+    """))
+
+def _merge_user_rows(conn, table):
+    """
+    Переводит строки table с ключом (user_id, word_id) на оставляемые пары.
+    Если у пользователя уже есть строка для оставляемой пары (или для
+    другого дубликата той же пары с меньшим id), строка дубликата удаляется:
+    остается одна строка на пользователя и пару.
+    """
+    conn.execute(sq.text(f"""
+        DELETE FROM {table} WHERE word_id IN (SELECT old_id FROM word_merge) AND (
+            EXISTS (
+                SELECT 1 FROM word_merge m JOIN {table} t
+                ON t.user_id = {table}.user_id AND t.word_id = m.new_id
+                WHERE m.old_id = {table}.word_id)
+            OR EXISTS (
+                SELECT 1 FROM word_merge m1
+                JOIN word_merge m2 ON m2.new_id = m1.new_id AND m2.old_id < m1.old_id
+                JOIN {table} t ON t.user_id = {table}.user_id AND t.word_id = m2.old_id
+                WHERE m1.old_id = {table}.word_id))
+    """))
+    _repoint(conn, table)
+
+def _v11_unique_words(conn):
+    # До этого шага каждое добавление слова создавало новую строку words,
+    # даже если такая пара уже была. Дубликаты пар сливаются в пару с
+    # наименьшим id, ссылки на них переводятся на нее, после чего создаются
+    # уникальные индексы. Уникальность задается индексом, а не ограничением
+    # таблицы: SQLite не умеет добавлять ограничения в существующую таблицу,
+    # а ON CONFLICT (target, translation) одинаково работает с обоими.
+    _word_merge.create(conn)
+    conn.execute(sq.text("""
+        INSERT INTO word_merge (old_id, new_id)
+        SELECT w.id, k.keep_id FROM words w JOIN (
+            SELECT target, translation, min(id) AS keep_id FROM words
+            GROUP BY target, translation HAVING count(*) > 1
+        ) k ON w.target = k.target AND w.translation = k.translation
+        WHERE w.id <> k.keep_id
+    """))
+    if conn.scalar(sq.text("SELECT count(*) FROM word_merge")):
+        # повторы в vocabulary удаляются ниже вместе с прочими
+        _repoint(conn, "vocabulary")
+        _merge_user_rows(conn, "reviews")
+        _merge_user_rows(conn, "word_stats")
+        _repoint(conn, "answer_events")
+        conn.execute(sq.text("DELETE FROM words WHERE id IN (SELECT old_id FROM word_merge)"))
+    _word_merge.drop(conn)
+    # одну пару пользователь мог добавить несколько раз
+    conn.execute(sq.text("""
+        DELETE FROM vocabulary WHERE id NOT IN (
+            SELECT min(id) FROM vocabulary GROUP BY user_id, word_id)
+    """))
+    conn.execute(sq.text(
+        "CREATE UNIQUE INDEX uq_words_target_translation ON words (target, translation)"
+    ))
+    conn.execute(sq.text("CREATE INDEX ix_words_translation ON words (translation)"))
+    conn.execute(sq.text(
+        "CREATE UNIQUE INDEX uq_vocabulary_user_word ON vocabulary (user_id, word_id)"
+    ))
+    conn.execute(sq.text("CREATE INDEX ix_vocabulary_word_id ON vocabulary (word_id)"))
+
+def _v12_backfill_reviews(conn):
+    # Карточки повторения раньше создавались в начале каждой тренировки,
+    # теперь - при добавлении слова и регистрации пользователя. Шаг один раз
+    # создает недостающие карточки собственных и общих слов пользователей.
+    conn.execute(sq.text("""
+        INSERT INTO reviews (user_id, word_id, due_at, interval_days, ease, repetitions, lapses)
+        SELECT DISTINCT u.id, v.word_id, :now, 0.0, 2.5, 0, 0
+        FROM users u JOIN vocabulary v ON v.user_id = u.id
+            OR v.user_id = (SELECT id FROM users WHERE tg_id = 0)
+        WHERE u.tg_id <> 0 AND NOT EXISTS (
+            SELECT 1 FROM reviews r WHERE r.user_id = u.id AND r.word_id = v.word_id)
+    """), {"now": utcnow()})
+
+def _v13_bot_states_json(conn):
+    # Данные состояния хранились в pickle: запись в таблицу давала
+    # выполнение кода в процессе бота. Незаконченные диалоги не переносятся,
+    # чтобы не распаковывать их pickle: таблица создается заново.
+    _bot_states.drop(conn, checkfirst=True)
+    _bot_states_json.create(conn)
+
+MIGRATIONS = [
+    (1, "initial schema: users, words, vocabulary", _v1_initial_schema),
+    (2, "default words shared by everybody", _v2_default_data),
+    (3, "bot states", _v3_bot_states),
+    (4, "translations cache", _v4_translations_cache),
+    (5, "spaced repetition reviews", _v5_reviews),
+    (6, "words (target, id) index for dictionary pages", _v6_words_keyset_index),
+    (7, "answer events log and per-user answer stats", _v7_answer_stats),
+    (8, "users.last_active_at", _v8_users_last_active_at),
+    (9, "reminder checkpoints", _v9_reminder_runs),
+    (10, "polling state for graceful restarts", _v10_polling_state),
+    (11, "unique word pairs and vocabulary indexes", _v11_unique_words),
+    (12, "review cards for existing vocabulary", _v12_backfill_reviews),
+    (13, "bot states data as JSON", _v13_bot_states_json),
+]
+
+# шаги для отдельной базы данных хранилища состояний (STATE_STORAGE=URL)
+STATE_MIGRATIONS = [migration for migration in MIGRATIONS if migration[0] in (3, 13)]
+
+
+def current_version(conn):
+    """
+    Возвращает текущую версию схемы.
+
+    Параметры:
+        conn: SQLAlchemy connection.
+
+    Возвращает:
+        int: Номер последней примененной миграции (0 для пустой базы).
+
+    """
+    if not sq.inspect(conn).has_table(schema_version.name):
+        return 0
+    return conn.scalar(sq.select(sq.func.max(schema_version.c.version))) or 0
+
+def migrate(bind, migrations=MIGRATIONS):
+    """
+    Применяет недостающие миграции в одной транзакции.
+
+    Параметры:
+        bind: SQLAlchemy engine или connection.
+        migrations (list): Список шагов (MIGRATIONS или STATE_MIGRATIONS).
+
+    Возвращает:
+        list: Номера примененных миграций (пустой, если схема актуальна).
+
+    """
+    if isinstance(bind, sq.Engine):
+        with bind.begin() as conn:
+            return migrate(conn, migrations)
+
+    version = current_version(bind)
+    pending = [migration for migration in migrations if migration[0] > version]
+    if not pending:
+        return []
+
+    schema_version.create(bind, checkfirst=True)
+    for number, description, step in pending:
+        step(bind)
+        bind.execute(schema_version.insert().values(version=number,
+                                                    description=description))
+    return [number for number, _, _ in pending]
@@ -5,9 +5,17 @@
 работе с ней.
 """
 
+from array import array
+from collections import OrderedDict
+from itertools import chain
+import threading
+import time
 import sqlalchemy as sq
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import declarative_base, relationship
 from sqlalchemy.sql import or_
+from training import schedule_review, utcnow
 
 Base = declarative_base()
 
@@ -15,6 +23,9 @@ class Words(Base):
     """
     Определяет модель для хранения слов в базе данных.
 
+    Пара (target, translation) уникальна: пользователи, добавившие одну
+    и ту же пару, ссылаются на одну запись через Vocabulary.
+
     Атрибуты:
         id (int): Уникальный идентификатор записи.
         target (str): Слово на иностранном (английском) языке.
@@ -25,6 +36,15 @@ class Words(Base):
 
     """
     __tablename__ = "words"
+    __table_args__ = (
+        # одинаковые пары хранятся один раз и разделяются через vocabulary;
+        # индекс по (target, translation) обслуживает и поиск по target
+        # (уникальный индекс, а не ограничение: см. миграцию 11)
+        sq.Index("uq_words_target_translation", "target", "translation", unique=True),
+        sq.Index("ix_words_translation", "translation"),
+        # постраничный просмотр словаря по ключу (target, id)
+        sq.Index("ix_words_target_id", "target", "id"),
+    )
 
     id = sq.Column(sq.Integer, primary_key=True)
     target = sq.Column(sq.String(length=120), nullable=False)
@@ -44,6 +64,9 @@ class Users(Base):
         id (int): Уникальный идентификатор пользователя.
         tg_id (int): Уникальный идентификатор пользователя в Telegram.
         name (str): Имя пользователя.
+        last_active_at (datetime): Когда пользователь последний раз писал
+                                   боту (UTC, с точностью до интервала
+                                   записи reminders.ActivityTracker).
 
     Связи:
         vocabulary: Связь с моделью Vocabulary.
@@ -54,6 +77,7 @@ class Users(Base):
     id = sq.Column(sq.Integer, primary_key=True)
     tg_id = sq.Column(sq.BigInteger, unique=True, nullable=False)
     name = sq.Column(sq.String(length=75), nullable=True)
+    last_active_at = sq.Column(sq.DateTime, nullable=True, default=utcnow)
 
     vocabulary = relationship("Vocabulary", back_populates="user")
 
@@ -76,6 +100,12 @@ class Vocabulary(Base):
 
     """
     __tablename__ = "vocabulary"
+    __table_args__ = (
+        # обслуживает выборку словаря пользователя (user_id -> word_id)
+        sq.Index("uq_vocabulary_user_word", "user_id", "word_id", unique=True),
+        # обслуживает подсчет ссылок на пару слов при удалении
+        sq.Index("ix_vocabulary_word_id", "word_id"),
+    )
 
     id = sq.Column(sq.Integer, primary_key=True)
     user_id = sq.Column(sq.Integer, sq.ForeignKey("users.id"), nullable=False)
@@ -85,47 +115,859 @@ class Vocabulary(Base):
     user = relationship("Users", back_populates="vocabulary")
 
 
-def create_tables(engine):
+class BotStates(Base):
+    """
+    Определяет модель для хранения состояний пользователей бота (MyStates)
+    и связанных с ними данных (retrieve_data), чтобы они переживали
+    перезапуск и были общими для нескольких процессов.
+
+    Атрибуты:
+        chat_id (int): Идентификатор чата в Telegram.
+        user_id (int): Идентификатор пользователя в Telegram.
+        state (str): Имя текущего состояния.
+        data (str): Словарь данных состояния в JSON (см. state_storage.py).
+
+    """
+    __tablename__ = "bot_states"
+
+    chat_id = sq.Column(sq.BigInteger, primary_key=True)
+    user_id = sq.Column(sq.BigInteger, primary_key=True)
+    state = sq.Column(sq.String(length=100), nullable=True)
+    data = sq.Column(sq.Text, nullable=True)
+
+    def __str__(self):
+        return f"State of user {self.user_id} in chat {self.chat_id}: {self.state}"
+
+
+class Translations(Base):
+    """
+    Определяет модель для долговременного кэша переводов API Яндекс
+    для словарей, чтобы популярные слова не запрашивались повторно.
+
+    Атрибуты:
+        word (str): Английское слово (в нижнем регистре).
+        translation (str): Первый найденный перевод на русский язык.
+
+    """
+    __tablename__ = "translations"
+
+    word = sq.Column(sq.String(length=120), primary_key=True)
+    translation = sq.Column(sq.String(length=120), nullable=False)
+
+    def __str__(self):
+        return f"Translation {self.word} - {self.translation}"
+
+
+class Reviews(Base):
+    """
+    Определяет модель для хранения истории повторений слова пользователем
+    (интервальное повторение по алгоритму SM-2).
+
+    Атрибуты:
+        user_id (int): Идентификатор пользователя из таблицы users.
+        word_id (int): Идентификатор пары слов из таблицы words.
+        due_at (datetime): Момент (UTC), когда слово нужно повторить.
+        interval_days (float): Текущий интервал повторения в днях.
+        ease (float): Коэффициент легкости слова.
+        repetitions (int): Количество успешных повторений подряд.
+        lapses (int): Количество ошибок в слове.
+
+    """
+    __tablename__ = "reviews"
+    __table_args__ = (
+        # выбор следующей карточки: WHERE user_id = ? AND due_at <= ? ORDER BY due_at LIMIT 1
+        sq.Index("ix_reviews_user_due", "user_id", "due_at"),
+    )
+
+    user_id = sq.Column(sq.Integer, sq.ForeignKey("users.id"), primary_key=True)
+    word_id = sq.Column(sq.Integer, sq.ForeignKey("words.id"), primary_key=True)
+    due_at = sq.Column(sq.DateTime, nullable=False)
+    interval_days = sq.Column(sq.Float, nullable=False, default=0.0)
+    ease = sq.Column(sq.Float, nullable=False, default=2.5)
+    repetitions = sq.Column(sq.Integer, nullable=False, default=0)
+    lapses = sq.Column(sq.Integer, nullable=False, default=0)
+
+    def __str__(self):
+        return f"Review of word {self.word_id} by user {self.user_id}: due {self.due_at}"
+
+
+class AnswerEvents(Base):
+    """
+    Определяет модель для журнала ответов в режиме тренировки (только
+    добавление записей). Строки пишутся пачками (см. answers.AnswerLog).
+
+    Атрибуты:
+        id (int): Уникальный идентификатор записи.
+        user_id (int): Идентификатор пользователя из таблицы users.
+        word_id (int): Идентификатор пары слов (без внешнего ключа: пара
+                       может быть удалена, а история ответов остается).
+        correct (bool): Правильный ли ответ.
+        answered_at (datetime): Момент ответа (UTC).
+
+    """
+    __tablename__ = "answer_events"
+
+    id = sq.Column(sq.BigInteger().with_variant(sq.Integer, "sqlite"), primary_key=True)
+    user_id = sq.Column(sq.Integer, sq.ForeignKey("users.id"), nullable=False)
+    word_id = sq.Column(sq.Integer, nullable=False)
+    correct = sq.Column(sq.Boolean, nullable=False)
+    answered_at = sq.Column(sq.DateTime, nullable=False)
+
+    def __str__(self):
+        return f"Answer of user {self.user_id} to word {self.word_id}: {self.correct}"
+
+
+class UserStats(Base):
+    """
+    Определяет модель для сводной статистики ответов пользователя, которая
+    обновляется при записи каждой пачки ответов, а не считается по журналу.
+
+    Атрибуты:
+        user_id (int): Идентификатор пользователя из таблицы users.
+        answers (int): Количество ответов.
+        correct (int): Количество правильных ответов.
+        streak (int): Текущая серия правильных ответов подряд.
+        best_streak (int): Самая длинная серия правильных ответов.
+        last_answer_at (datetime): Момент последнего ответа (UTC).
+
+    """
+    __tablename__ = "user_stats"
+
+    user_id = sq.Column(sq.Integer, sq.ForeignKey("users.id"), primary_key=True)
+    answers = sq.Column(sq.Integer, nullable=False, default=0)
+    correct = sq.Column(sq.Integer, nullable=False, default=0)
+    streak = sq.Column(sq.Integer, nullable=False, default=0)
+    best_streak = sq.Column(sq.Integer, nullable=False, default=0)
+    last_answer_at = sq.Column(sq.DateTime, nullable=True)
+
+    def __str__(self):
+        return f"Stats of user {self.user_id}: {self.correct}/{self.answers}"
+
+
+class WordStats(Base):
+    """
+    Определяет модель для счетчиков ответов пользователя по слову
+    (для списка самых трудных слов).
+
+    Атрибуты:
+        user_id (int): Идентификатор пользователя из таблицы users.
+        word_id (int): Идентификатор пары слов из таблицы words.
+        answers (int): Количество ответов.
+        mistakes (int): Количество неправильных ответов.
+
+    """
+    __tablename__ = "word_stats"
+    __table_args__ = (
+        # самые трудные слова: WHERE user_id = ? ORDER BY mistakes DESC LIMIT 5
+        sq.Index("ix_word_stats_user_mistakes", "user_id", "mistakes"),
+    )
+
+    user_id = sq.Column(sq.Integer, sq.ForeignKey("users.id"), primary_key=True)
+    word_id = sq.Column(sq.Integer, primary_key=True)
+    answers = sq.Column(sq.Integer, nullable=False, default=0)
+    mistakes = sq.Column(sq.Integer, nullable=False, default=0)
+
+    def __str__(self):
+        return f"Stats of word {self.word_id} by user {self.user_id}: {self.mistakes} mistakes"
+
+
+class ReminderRuns(Base):
+    """
+    Определяет модель для контрольных точек ежедневной рассылки напоминаний:
+    после перезапуска бота рассылка продолжается с last_user_id и не
+    отправляет напоминания повторно.
+
+    Атрибуты:
+        day (date): День рассылки (UTC).
+        last_user_id (int): Последний обработанный users.id.
+        sent (int): Сколько напоминаний отправлено.
+        started_at (datetime): Начало рассылки (UTC).
+        finished_at (datetime): Окончание рассылки (None - не закончена).
+
+    """
+    __tablename__ = "reminder_runs"
+
+    day = sq.Column(sq.Date, primary_key=True)
+    last_user_id = sq.Column(sq.Integer, nullable=False, default=0)
+    sent = sq.Column(sq.Integer, nullable=False, default=0)
+    started_at = sq.Column(sq.DateTime, nullable=False)
+    finished_at = sq.Column(sq.DateTime, nullable=True)
+
+    def __str__(self):
+        return f"Reminders of {self.day}: {self.sent} sent, last user {self.last_user_id}"
+
+
+class PollingState(Base):
+    """
+    Определяет модель для передачи получения обновлений от останавливаемого
+    процесса бота новому (см. lifecycle.py).
+
+    Атрибуты:
+        bot_id (int): Идентификатор бота (число перед ":" в токене).
+        owner (str): Процесс, получающий обновления ("хост:pid").
+        last_update_id (int): Последнее принятое обновление; следующий
+                              процесс запрашивает обновления после него.
+        released_at (datetime): Когда процесс перестал получать обновления
+                                (None - процесс работает).
+        drained_at (datetime): Когда процесс закончил обработку принятых
+                               обновлений (None - еще не закончил).
+        pending (str): JSON-список обновлений, не обработанных до остановки.
+
+    """
+    __tablename__ = "polling_state"
+
+    bot_id = sq.Column(sq.BigInteger, primary_key=True)
+    owner = sq.Column(sq.String(length=100), nullable=True)
+    last_update_id = sq.Column(sq.BigInteger, nullable=False, default=0)
+    released_at = sq.Column(sq.DateTime, nullable=True)
+    drained_at = sq.Column(sq.DateTime, nullable=True)
+    pending = sq.Column(sq.Text, nullable=True)
+
+    def __str__(self):
+        return f"Polling of bot {self.bot_id} by {self.owner}: last update {self.last_update_id}"
+
+
+def dialect_insert(bind, model):
+    """
+    Возвращает INSERT с поддержкой ON CONFLICT для диалекта базы данных.
+
+    Параметры:
+        bind: SQLAlchemy engine или connection.
+        model: Модель, в таблицу которой выполняется вставка.
+
+    Возвращает:
+        Insert or None: Диалектный INSERT (Postgres, SQLite) или None,
+                        если СУБД не поддерживает ON CONFLICT.
+
+    """
+    dialect = bind.dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(model)
+    if dialect == "sqlite":
+        return sqlite.insert(model)
+    return None
+
+def add_word_to_vocabulary(session, user_id, target, translation):
+    """
+    Добавляет пару слов в словарь пользователя, переиспользуя уже
+    существующую запись Words с такой же парой, и создает для нее
+    карточку повторения, сразу готовую к повторению. Фиксирует транзакцию.
+
+    Параметры:
+        session: SQLAlchemy session для выполнения операций с базой данных.
+        user_id (int): Идентификатор пользователя из таблицы users.
+        target (str): Слово на английском языке.
+        translation (str): Перевод слова на русский язык.
+
+    Возвращает:
+        int: Идентификатор пары слов в таблице words.
+
+    """
+    def find_word():
+        return session.scalar(
+            sq.select(Words.id).\
+                where(Words.target == target).\
+                where(Words.translation == translation)
+        )
+
+    word_id = find_word()
+    if word_id is None:
+        try:
+            with session.begin_nested():
+                word = Words(target=target, translation=translation)
+                session.add(word)
+                session.flush()
+                word_id = word.id
+        except IntegrityError:  # пару успели добавить параллельно
+            word_id = find_word()
+
+    exists = session.scalar(
+        sq.select(Vocabulary.id).\
+            where(Vocabulary.user_id == user_id).\
+            where(Vocabulary.word_id == word_id)
+    )
+    if exists is None:
+        session.add(Vocabulary(user_id=user_id, word_id=word_id))
+    if session.get(Reviews, (user_id, word_id)) is None:  # общее слово уже в тренировке
+        session.add(Reviews(user_id=user_id, word_id=word_id, due_at=utcnow()))
+    session.commit()
+    return word_id
+
+def remove_word_from_vocabulary(session, vocabulary_id, word_id, user_id):
+    """
+    Удаляет запись словаря пользователя вместе с историей повторений,
+    а саму пару слов - только если на нее больше никто не ссылается.
+    Фиксирует транзакцию.
+
+    Параметры:
+        session: SQLAlchemy session для выполнения операций с базой данных.
+        vocabulary_id (int): Идентификатор записи в таблице vocabulary.
+        word_id (int): Идентификатор пары слов в таблице words.
+        user_id (int): Идентификатор пользователя из таблицы users.
+
+    """
+    session.execute(sq.delete(Vocabulary).where(Vocabulary.id == vocabulary_id))
+    session.execute(sq.delete(Reviews).\
+        where(Reviews.user_id == user_id).\
+        where(Reviews.word_id == word_id))
+    session.execute(sq.delete(WordStats).\
+        where(WordStats.user_id == user_id).\
+        where(WordStats.word_id == word_id))
+    still_used = session.scalar(
+        sq.select(Vocabulary.id).where(Vocabulary.word_id == word_id).limit(1)
+    )
+    if still_used is None:
+        session.execute(sq.delete(Words).where(Words.id == word_id))
+    session.commit()
+
+def add_shared_reviews(session, user_id, now):
+    """
+    Создает карточки повторения общих слов для нового пользователя.
+    Карточки собственных слов создаются при их добавлении, поэтому
+    начало тренировки не проверяет словарь целиком. Фиксирует транзакцию.
+
+    Параметры:
+        session: SQLAlchemy session для выполнения операций с базой данных.
+        user_id (int): Идентификатор пользователя из таблицы users.
+        now (datetime): Текущий момент (UTC).
+
+    """
+    everybody = get_user_id(session, 0)
+    missing = sq.select(sq.literal(user_id), Vocabulary.word_id, sq.literal(now),
+                        sq.literal(0.0), sq.literal(2.5), sq.literal(0), sq.literal(0)).\
+        where(Vocabulary.user_id == everybody).\
+        where(~sq.exists().where(Reviews.user_id == user_id).\
+                           where(Reviews.word_id == Vocabulary.word_id))
+    session.execute(sq.insert(Reviews).from_select(
+        ["user_id", "word_id", "due_at", "interval_days", "ease", "repetitions", "lapses"],
+        missing
+    ))
+    session.commit()
+
+def next_due_word(session, user_id, now, exclude=None):
+    """
+    Выбирает слово, повторение которого подошло раньше всех.
+
+    Запрос обслуживается индексом (user_id, due_at) и читает одну строку,
+    поэтому его стоимость не зависит от размера словаря линейно.
+
+    Параметры:
+        session: SQLAlchemy session для выполнения операций с базой данных.
+        user_id (int): Идентификатор пользователя из таблицы users.
+        now (datetime): Текущий момент (UTC).
+        exclude (int or None): Слово, которое не нужно выбирать.
+
+    Возвращает:
+        int or None: Идентификатор пары слов или None, если повторять нечего.
+
+    """
+    query = sq.select(Reviews.word_id).\
+        where(Reviews.user_id == user_id).\
+        where(Reviews.due_at <= now).\
+        order_by(Reviews.due_at).\
+        limit(1)
+    if exclude is not None:
+        query = query.where(Reviews.word_id != exclude)
+    return session.scalar(query)
+
+def record_review(session, user_id, word_id, quality, now):
+    """
+    Сохраняет результат ответа и планирует следующее повторение слова.
+    Фиксирует транзакцию.
+
+    Параметры:
+        session: SQLAlchemy session для выполнения операций с базой данных.
+        user_id (int): Идентификатор пользователя из таблицы users.
+        word_id (int): Идентификатор пары слов из таблицы words.
+        quality (int): Оценка ответа от 0 до 5 (см. training.answer_quality).
+        now (datetime): Текущий момент (UTC).
+
+    """
+    review = session.get(Reviews, (user_id, word_id))
+    if review is None:
+        return
+    repetitions, interval_days, ease, due_at = schedule_review(
+        review.repetitions, review.interval_days, review.ease, quality, now
+    )
+    if repetitions == 0:
+        review.lapses += 1
+    review.repetitions = repetitions
+    review.interval_days = interval_days
+    review.ease = ease
+    review.due_at = due_at
+    session.commit()
+
+def write_answer_events(session, events, chunk_size=500):
+    """
+    Записывает пачку ответов в журнал и обновляет сводную статистику.
+    Фиксирует транзакцию.
+
+    Журнал пополняется многострочными INSERT, а сводные строки пользователей
+    и слов из пачки читаются одним запросом на таблицу и обновляются с
+    учетом порядка ответов (серии правильных ответов).
+
+    Параметры:
+        session: SQLAlchemy session для выполнения операций с базой данных.
+        events (list): Кортежи (user_id, word_id, correct, answered_at)
+                       в порядке ответов.
+        chunk_size (int): Сколько строк журнала вставлять одним запросом.
+
+    """
+    if not events:
+        return
+    rows = [
+        {"user_id": user_id, "word_id": word_id, "correct": correct, "answered_at": answered_at}
+        for user_id, word_id, correct, answered_at in events
+    ]
+    for start in range(0, len(rows), chunk_size):
+        session.execute(sq.insert(AnswerEvents).values(rows[start:start + chunk_size]))
+
+    user_ids = {event[0] for event in events}
+    users = {
+        stats.user_id: stats for stats in session.scalars(
+            sq.select(UserStats).where(UserStats.user_id.in_(user_ids))
+        )
+    }
+    keys = {(event[0], event[1]) for event in events}
+    words = {
+        (stats.user_id, stats.word_id): stats for stats in session.scalars(
+            sq.select(WordStats).\
+                where(WordStats.user_id.in_(user_ids)).\
+                where(sq.tuple_(WordStats.user_id, WordStats.word_id).in_(keys))
+        )
+    }
+    for user_id, word_id, correct, answered_at in events:
+        user = users.get(user_id)
+        if user is None:
+            user = users[user_id] = UserStats(
+                user_id=user_id, answers=0, correct=0, streak=0, best_streak=0
+            )
+            session.add(user)
+        user.answers += 1
+        user.correct += int(correct)
+        user.streak = user.streak + 1 if correct else 0
+        user.best_streak = max(user.best_streak, user.streak)
+        user.last_answer_at = answered_at
+
+        word = words.get((user_id, word_id))
+        if word is None:
+            word = words[user_id, word_id] = WordStats(
+                user_id=user_id, word_id=word_id, answers=0, mistakes=0
+            )
+            session.add(word)
+        word.answers += 1
+        word.mistakes += int(not correct)
+    session.commit()
+
+def user_answer_stats(session, user_id, hardest=5):
+    """
+    Возвращает сводную статистику ответов пользователя. Читает одну строку
+    user_stats и не более hardest строк word_stats (по индексу), не
+    обращаясь к журналу ответов.
+
+    Параметры:
+        session: SQLAlchemy session для выполнения операций с базой данных.
+        user_id (int): Идентификатор пользователя из таблицы users.
+        hardest (int): Сколько самых трудных слов вернуть.
+
+    Возвращает:
+        tuple: (UserStats или None, список (target, translation, mistakes, answers)).
+
+    """
+    stats = session.get(UserStats, user_id)
+    if stats is None:
+        return None, []
+    words = session.execute(
+        sq.select(Words.target, Words.translation, WordStats.mistakes, WordStats.answers).\
+            join(Words, Words.id == WordStats.word_id).\
+                where(WordStats.user_id == user_id).\
+                    where(WordStats.mistakes > 0).\
+                        order_by(WordStats.mistakes.desc()).\
+                            limit(hardest)
+    ).all()
+    return stats, [tuple(row) for row in words]
+
+def reminder_candidates(session, after_id, idle_before, now, limit=500, min_words=4):
+    """
+    Выбирает очередную пачку пользователей для напоминаний (постранично
+    по users.id, без OFFSET).
+
+    Пользователь получает напоминание, если он не писал боту с момента
+    idle_before и у него есть слова к повторению: наступившие повторения
+    в reviews, а если он еще не тренировался - не менее min_words
+    собственных слов.
+
+    Параметры:
+        session: SQLAlchemy session для выполнения операций с базой данных.
+        after_id (int): users.id, после которого продолжать.
+        idle_before (datetime): Граница неактивности (UTC).
+        now (datetime): Текущий момент (UTC).
+        limit (int): Сколько неактивных пользователей просматривать за раз.
+        min_words (int): Минимум слов для пользователя без повторений.
+
+    Возвращает:
+        tuple: (последний просмотренный users.id или None, если пользователи
+                закончились; список (users.id, tg_id, количество слов)).
+
+    """
+    users = session.execute(
+        sq.select(Users.id, Users.tg_id).\
+            where(Users.id > after_id).\
+                where(Users.tg_id != 0).\
+                    where(or_(Users.last_active_at.is_(None), Users.last_active_at < idle_before)).\
+                        order_by(Users.id).\
+                            limit(limit)
+    ).all()
+    if not users:
+        return None, []
+    ids = [user_id for user_id, _ in users]
+    reviews = {
+        user_id: (due, total) for user_id, due, total in session.execute(
+            sq.select(
+                Reviews.user_id,
+                sq.func.sum(sq.case((Reviews.due_at <= now, 1), else_=0)),
+                sq.func.count()
+            ).where(Reviews.user_id.in_(ids)).group_by(Reviews.user_id)
+        )
+    }
+    words = dict(session.execute(
+        sq.select(Vocabulary.user_id, sq.func.count()).\
+            where(Vocabulary.user_id.in_(ids)).\
+                group_by(Vocabulary.user_id)
+    ).all())
+    due = []
+    for user_id, tg_id in users:
+        if user_id in reviews:
+            count = reviews[user_id][0]
+        else:
+            count = words.get(user_id, 0) if words.get(user_id, 0) >= min_words else 0
+        if count:
+            due.append((user_id, tg_id, count))
+    return ids[-1], due
+
+def dictionary_page(session, tg_id, anchor_id=None, backwards=False, limit=30):
+    """
+    Возвращает страницу словаря пользователя (вместе с общими словами),
+    упорядоченного по (target, id), методом keyset-пагинации.
+
+    Страница начинается сразу после слова anchor_id (или перед ним, если
+    backwards), поэтому запрос любой страницы стоит столько же, сколько
+    запрос первой: слова читаются по индексу (target, id) начиная с ключа,
+    а принадлежность словарю проверяется по индексу (user_id, word_id).
+
+    Параметры:
+        session: SQLAlchemy session для выполнения операций с базой данных.
+        tg_id (int): Идентификатор пользователя в Telegram.
+        anchor_id (int or None): Слово-граница страницы (None - с начала).
+        backwards (bool): Листать назад (слова перед anchor_id).
+        limit (int): Максимальное количество строк.
+
+    Возвращает:
+        list: Строки (id, target, translation) в порядке (target, id).
+
     """
-    Создает таблицы в базе данных, если они не существуют.
+    owners = [user_id for user_id in (get_user_id(session, tg_id), get_user_id(session, 0))
+              if user_id is not None]
+    query = sq.select(Words.id, Words.target, Words.translation).\
+        where(sq.exists().where(Vocabulary.word_id == Words.id).\
+                          where(Vocabulary.user_id.in_(owners)))
+    if anchor_id is not None:
+        anchor = sq.select(Words.target).where(Words.id == anchor_id).scalar_subquery()
+        key = sq.tuple_(Words.target, Words.id)
+        query = query.where(key < sq.tuple_(anchor, anchor_id) if backwards
+                            else key > sq.tuple_(anchor, anchor_id))
+    if backwards:
+        query = query.order_by(Words.target.desc(), Words.id.desc())
+    else:
+        query = query.order_by(Words.target, Words.id)
+    rows = list(session.execute(query.limit(limit)))
+    if backwards:
+        rows.reverse()
+    return rows
+
+def words_by_ids_query(word_ids):
+    """
+    Строит запрос на выборку текста только указанных пар слов.
 
     Параметры:
-        engine: SQLAlchemy engine, который используется для подключения
-                к базе данных.
+        word_ids (list): Идентификаторы пар слов.
+
+    Возвращает:
+        sqlalchemy.sql.Select: Запрос, возвращающий (id, target, translation).
 
     """
-    Base.metadata.drop_all(engine)
-    Base.metadata.create_all(engine)
+    return sq.select(Words.id, Words.target, Words.translation).\
+                where(Words.id.in_(list(word_ids)))
 
-def fill_db_with_default_data(session):
+class UserCache:
     """
-    Заполняет базу данных начальными данными.
+    Кэш соответствия tg_id -> (users.id, name) с ограничением по размеру
+    и времени жизни записей.
+
+    Записи заполняются при первом обращении и при регистрации пользователя
+    (put). Отсутствие пользователя не кэшируется: он может зарегистрироваться
+    в любой момент. При удалении пользователя запись нужно сбросить
+    методом invalidate.
+
+    Атрибуты:
+        maxsize (int): Максимальное количество записей.
+        ttl (float): Время жизни записи в секундах.
+        hits (int): Количество обращений, обслуженных из кэша.
+        misses (int): Количество обращений, потребовавших запроса к базе.
+
+    """
+    def __init__(self, maxsize=10000, ttl=600.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # tg_id -> (users.id, name, момент истечения)
+        self._lock = threading.Lock()
+
+    def put(self, tg_id, user_id, name):
+        """
+        Запоминает пользователя.
+
+        Параметры:
+            tg_id (int): Идентификатор пользователя в Telegram.
+            user_id (int): Идентификатор пользователя из таблицы users.
+            name (str): Имя пользователя.
+
+        """
+        with self._lock:
+            self._entries[tg_id] = (user_id, name, time.monotonic() + self.ttl)
+            self._entries.move_to_end(tg_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get(self, session, tg_id):
+        """
+        Возвращает идентификатор и имя пользователя.
+
+        Параметры:
+            session: SQLAlchemy session для запроса при промахе кэша.
+            tg_id (int): Идентификатор пользователя в Telegram.
+
+        Возвращает:
+            tuple or None: (users.id, name) или None, если пользователь
+                           не зарегистрирован.
+
+        """
+        with self._lock:
+            entry = self._entries.get(tg_id)
+            if entry is not None and entry[2] > time.monotonic():
+                self._entries.move_to_end(tg_id)
+                self.hits += 1
+                return entry[0], entry[1]
+            self.misses += 1
+        row = session.execute(
+            sq.select(Users.id, Users.name).where(Users.tg_id == tg_id)
+        ).first()
+        if row is None:
+            self.invalidate(tg_id)
+            return None
+        self.put(tg_id, row.id, row.name)
+        return row.id, row.name
+
+    def invalidate(self, tg_id):
+        """
+        Сбрасывает запись пользователя (например, после его удаления).
+
+        Параметры:
+            tg_id (int): Идентификатор пользователя в Telegram.
+
+        """
+        with self._lock:
+            self._entries.pop(tg_id, None)
+
+    def clear(self):
+        """Полностью очищает кэш (счетчики сохраняются)."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Возвращает счетчики кэша.
+
+        Возвращает:
+            dict: hits, misses и текущий размер size.
+
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+user_cache = UserCache()
+
+def get_user_id(session, tg_id):
+    """
+    Возвращает идентификатор пользователя из таблицы users по tg_id (через кэш).
+
+    Параметры:
+        session: SQLAlchemy session для запроса при промахе кэша.
+        tg_id (int): Идентификатор пользователя в Telegram.
+
+    Возвращает:
+        int or None: users.id или None, если пользователь не зарегистрирован.
+
+    """
+    user = user_cache.get(session, tg_id)
+    return None if user is None else user[0]
+
+def load_own_words(session, tg_id):
+    """
+    Загружает собственные слова пользователя без общих слов.
+
+    Параметры:
+        session: SQLAlchemy session для выполнения операций с базой данных.
+        tg_id (int): Идентификатор пользователя в Telegram (0 - общие слова).
+
+    Возвращает:
+        tuple: Кортежи (id, target, translation).
+
+    """
+    user_id = get_user_id(session, tg_id)
+    if user_id is None:
+        return ()
+    return tuple(
+        tuple(row) for row in session.execute(
+            sq.select(Words.id, Words.target, Words.translation).\
+                select_from(Words).\
+                    join(Vocabulary, Words.id == Vocabulary.word_id).\
+                        where(Vocabulary.user_id == user_id)
+        )
+    )
+
+class VocabularyCache:
+    """
+    LRU-кэш словарей пользователей с ограничением по количеству записей.
+
+    Для каждого пользователя (ключ - tg_id) хранятся только его собственные
+    слова в виде кортежа (id, target, translation); общие слова (tg_id == 0)
+    кэшируются один раз и подмешиваются при чтении, а не копируются в запись
+    каждого пользователя. Запись пользователя нужно сбрасывать методом
+    invalidate при добавлении и удалении его слов.
+
+    Атрибуты:
+        maxsize (int): Максимальное количество записей пользователей.
+        hits (int): Количество обращений, обслуженных из кэша.
+        misses (int): Количество обращений, потребовавших запроса к базе.
+        evictions (int): Количество записей, вытесненных по размеру.
+
+    """
+    SHARED_TG_ID = 0
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._shared = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _load(session, tg_id):
+        return load_own_words(session, tg_id)
+
+    def _get_shared(self, session):
+        if self._shared is None:
+            self._shared = self._load(session, self.SHARED_TG_ID)
+        return self._shared
+
+    def get(self, session, tg_id):
+        """
+        Возвращает слова пользователя вместе с общими словами.
+
+        Параметры:
+            session: SQLAlchemy session для запроса при промахе кэша.
+            tg_id (int): Идентификатор пользователя в Telegram.
+
+        Возвращает:
+            itertools.chain: Кортежи (id, target, translation): сначала общие
+                             слова, затем слова пользователя.
+
+        """
+        with self._lock:
+            own = self._entries.get(tg_id)
+            if own is not None:
+                self._entries.move_to_end(tg_id)
+                self.hits += 1
+        if own is None:
+            own = self._load(session, tg_id)
+            with self._lock:
+                self.misses += 1
+                self._entries[tg_id] = own
+                self._entries.move_to_end(tg_id)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return chain(self._get_shared(session), own)
+
+    def invalidate(self, tg_id):
+        """
+        Сбрасывает запись пользователя после изменения его словаря.
+
+        Параметры:
+            tg_id (int): Идентификатор пользователя в Telegram.
+
+        """
+        with self._lock:
+            if tg_id == self.SHARED_TG_ID:
+                self._shared = None
+            self._entries.pop(tg_id, None)
+
+    def clear(self):
+        """Полностью очищает кэш (счетчики сохраняются)."""
+        with self._lock:
+            self._entries.clear()
+            self._shared = None
+
+    def stats(self):
+        """
+        Возвращает счетчики кэша.
+
+        Возвращает:
+            dict: hits, misses, evictions и текущий размер size.
+
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+            }
+
+vocabulary_cache = VocabularyCache()
+
+def get_word_ids(session, user_id):
+    """
+    Возвращает идентификаторы слов пользователя в компактном массиве.
 
     Параметры:
         session: SQLAlchemy session для выполнения операций с базой данных.
+        user_id (int): Идентификатор пользователя в Telegram.
+
+    Возвращает:
+        array.array: Массив идентификаторов пар слов (тип 'i').
+
+    """
+    return array('i', (word_id for word_id, _, _ in vocabulary_cache.get(session, user_id)))
+
+def get_words_by_ids(session, word_ids):
+    """
+    Загружает текст указанных пар слов.
+
+    Параметры:
+        session: SQLAlchemy session для выполнения операций с базой данных.
+        word_ids (list): Идентификаторы пар слов.
+
+    Возвращает:
+        dict: Словарь id -> (target, translation).
 
     """
-    if len(list(session.query(Users).filter(Users.tg_id==0).all())) == 0:
-        everybody = Users(tg_id=0, name="everybody")
-        session.add(everybody)
-        session.commit()
-        words = [
-            ("vitamin", "витамин"),
-            ("oven", "духовка"),
-            ("silk", "шелк"),
-            ("jacket", "куртка"),
-            ("soda", "газировка"),
-            ("shower", "душ"),
-            ("sword", "меч"),
-            ("vampire", "вампир"),
-            ("widow", "вдова"),
-            ("stick", "палка"),
-        ]
-        for target, translate in words:
-            word = Words(target=target, translation=translate)
-            vocabulary = Vocabulary(word=word, user=everybody)
-            session.add_all([word, vocabulary])
-        session.commit()
+    return {row.id: (row.target, row.translation)
+            for row in session.execute(words_by_ids_query(word_ids))}
 
 def get_words_list(session, user_id):
     """
@@ -139,9 +981,5 @@ def get_words_list(session, user_id):
         list: Список кортежей, содержащих целевые слова и их переводы.
 
     """
-    return list(session.query(Words.target, Words.translation).\
-                    select_from(Words).\
-                        join(Vocabulary, Words.id == Vocabulary.word_id).\
-                        join(Users, Vocabulary.user_id == Users.id).\
-                            filter(or_(Users.tg_id == user_id,
-                                       Users.tg_id == 0)))
+    return [(target, translation)
+            for _, target, translation in vocabulary_cache.get(session, user_id)]
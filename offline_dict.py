@@ -0,0 +1,158 @@
+"""
+Модуль локального англо-русского словаря для перевода без обращения к сети.
+
+Список пар слов компилируется в бинарный файл, который при работе бота
+отображается в память (mmap): файл не читается целиком при запуске, а
+поиск слова - двоичный поиск по отсортированному массиву смещений - читает
+только несколько страниц файла и занимает микросекунды. Сервис перевода
+(translation.py) обращается к словарю первым и идет в API Яндекс только при
+промахе.
+
+Формат файла (все числа - uint32, little-endian):
+    MAGIC (8 байт), количество записей N,
+    N + 1 смещений начала записей (последнее - конец данных),
+    записи "слово\\0перевод" в UTF-8, упорядоченные по байтам слова.
+
+Использование из командной строки:
+    python offline_dict.py build words.csv -o enru.dict
+    python offline_dict.py lookup enru.dict apple
+"""
+import argparse
+import mmap
+import os
+import struct
+import sys
+from bulk import clean_pair, detect_format, iter_pairs
+
+MAGIC = b"ENRUDIC1"
+_HEADER = struct.Struct("<8sI")
+_OFFSET = struct.Struct("<I")
+
+
+def build(pairs, path):
+    """
+    Компилирует пары слов в файл словаря.
+
+    Для повторяющегося слова сохраняется первый перевод. Файл записывается
+    во временный файл и затем атомарно заменяет существующий.
+
+    Параметры:
+        pairs: Итерируемый объект пар (слово, перевод); слова приводятся к
+               нижнему регистру.
+        path (str): Путь к файлу словаря.
+
+    Возвращает:
+        int: Количество записей в словаре.
+
+    """
+    entries = {}
+    for word, translation in pairs:
+        key = word.strip().lower().encode("utf-8")
+        if key and b"\0" not in key:
+            entries.setdefault(key, translation.strip().lower().encode("utf-8"))
+    keys = sorted(entries)
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as out:
+        out.write(_HEADER.pack(MAGIC, len(keys)))
+        offset = 0
+        for key in keys:
+            out.write(_OFFSET.pack(offset))
+            offset += len(key) + 1 + len(entries[key])
+        out.write(_OFFSET.pack(offset))
+        for key in keys:
+            out.write(key + b"\0" + entries[key])
+    os.replace(tmp_path, path)
+    return len(keys)
+
+
+class OfflineDictionary:
+    """
+    Словарь, отображенный в память.
+
+    Атрибуты:
+        path (str): Путь к файлу словаря.
+
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as file:
+            self._mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self._count = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            self._mm.close()
+            raise ValueError(f"{path}: не файл словаря")
+        self._data = _HEADER.size + _OFFSET.size * (self._count + 1)
+        # массив смещений читается прямо из отображения, без копирования
+        self._offsets = memoryview(self._mm)[_HEADER.size:self._data]
+        if sys.byteorder == "little":
+            self._offsets = self._offsets.cast("I")
+        else:
+            self._offsets = [value for value, in _OFFSET.iter_unpack(self._offsets)]
+
+    def __len__(self):
+        return self._count
+
+    def lookup(self, word):
+        """
+        Ищет перевод слова.
+
+        Параметры:
+            word (str): Английское слово.
+
+        Возвращает:
+            str or None: Перевод или None, если слова нет в словаре.
+
+        """
+        key = word.strip().lower().encode("utf-8")
+        mm, offsets, data = self._mm, self._offsets, self._data
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            start, end = data + offsets[middle], data + offsets[middle + 1]
+            separator = mm.find(b"\0", start, end)
+            current = mm[start:separator]
+            if current < key:
+                low = middle + 1
+            elif current > key:
+                high = middle
+            else:
+                return mm[separator + 1:end].decode("utf-8")
+        return None
+
+    def close(self):
+        """Освобождает отображение файла."""
+        if isinstance(self._offsets, memoryview):
+            self._offsets.release()
+        self._mm.close()
+
+
+def main(argv=None):
+    """Точка входа командной строки: сборка словаря и поиск слова."""
+    parser = argparse.ArgumentParser(description="Локальный англо-русский словарь")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="скомпилировать словарь из файла пар")
+    build_parser.add_argument("source", help="файл пар слов (CSV/TSV/JSON/JSON Lines)")
+    build_parser.add_argument("--format", help="формат файла пар")
+    build_parser.add_argument("-o", "--output", required=True, help="файл словаря")
+    lookup_parser = commands.add_parser("lookup", help="найти перевод слова")
+    lookup_parser.add_argument("dictionary", help="файл словаря")
+    lookup_parser.add_argument("word")
+    args = parser.parse_args(argv)
+
+    if args.command == "lookup":
+        dictionary = OfflineDictionary(args.dictionary)
+        print(dictionary.lookup(args.word) or "")
+        dictionary.close()
+        return
+
+    fmt = args.format or detect_format(args.source)
+    if fmt is None:
+        parser.error("не удалось определить формат файла, укажите --format")
+    with open(args.source, newline="", encoding="utf-8-sig") as stream:
+        pairs = (pair for pair in (clean_pair(*raw) for raw in iter_pairs(stream, fmt)) if pair)
+        count = build(pairs, args.output)
+    print(f"Записей в словаре: {count}", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
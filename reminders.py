@@ -0,0 +1,298 @@
+"""
+Модуль ежедневных напоминаний о тренировке.
+
+ActivityTracker (middleware) запоминает в памяти, когда пользователь
+последний раз писал боту, и раз в минуту записывает накопленное одним
+пакетным UPDATE в users.last_active_at, а не обращается к базе на каждое
+обновление.
+
+ReminderScheduler работает в фоновом потоке процесса бота. Раз в день,
+начиная с REMINDER_HOUR (UTC), он обходит таблицу users пачками по
+users.id (keyset-пагинация, см. models.reminder_candidates), выбирает
+неактивных пользователей со словами к повторению и ставит напоминания в
+очередь исходящих сообщений (sender.SendQueue), которая соблюдает общее
+ограничение Telegram и ограничение на чат. Сама рассылка дополнительно
+ограничена частотой rate, чтобы ответы пользователям не ждали за ней в
+очереди, а в очереди одновременно находится не больше max_pending
+сообщений.
+
+Прогресс рассылки сохраняется в reminder_runs по мере отправки: очередь
+сообщает о завершении каждого напоминания (on_done), и контрольная точка
+last_user_id продвигается до последнего пользователя, все напоминания до
+которого отправлены (или отвергнуты Telegram, например, если пользователь
+заблокировал бота). Напоминания, поставленные в очередь, но не
+отправленные к остановке или сбою, отправляются после перезапуска; при
+этом напоминания, отправленные позже первого неотправленного, могут прийти
+повторно. Рассылка считается законченной, когда отправлены все напоминания.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from datetime import timedelta
+from functools import partial
+import sqlalchemy as sq
+from telebot.handler_backends import BaseMiddleware
+from common import BotMessages, MARKUP_DEFAULT
+from metrics import Counter, REGISTRY
+from models import Users, ReminderRuns, reminder_candidates
+from sender import TokenBucket
+from training import utcnow
+
+logger = logging.getLogger(__name__)
+
+REMINDERS = Counter("bot_reminders_total", "Напоминания о тренировке", ("result",))
+REGISTRY.append(REMINDERS)
+
+
+class ActivityTracker(BaseMiddleware):
+    """
+    Middleware, запоминающее момент последнего обновления пользователя.
+
+    Атрибуты:
+        session_factory: Фабрика SQLAlchemy-сессий для записи.
+
+    """
+    def __init__(self, session_factory):
+        super().__init__()
+        self.update_types = ["message", "callback_query", "inline_query"]
+        self.session_factory = session_factory
+        self._seen = {}  # tg_id -> момент последнего обновления
+        self._lock = threading.Lock()
+
+    def pre_process(self, message, data):
+        user = getattr(message, "from_user", None)
+        if user is not None:
+            with self._lock:
+                self._seen[user.id] = utcnow()
+
+    def post_process(self, message, data, exception):
+        pass
+
+    def flush(self):
+        """
+        Записывает накопленные моменты активности в users.last_active_at.
+
+        Возвращает:
+            int: Сколько пользователей обновлено.
+
+        """
+        with self._lock:
+            seen, self._seen = self._seen, {}
+        if not seen:
+            return 0
+        session = self.session_factory()
+        try:
+            session.connection().execute(
+                Users.__table__.update().\
+                    where(Users.__table__.c.tg_id == sq.bindparam("tg")).\
+                        values(last_active_at=sq.bindparam("at")),
+                [{"tg": tg_id, "at": at} for tg_id, at in seen.items()]
+            )
+            session.commit()
+        except Exception:  # pylint: disable=broad-except
+            session.rollback()
+            logger.exception("Не удалось записать активность %d пользователей", len(seen))
+            with self._lock:
+                for tg_id, at in seen.items():
+                    self._seen.setdefault(tg_id, at)
+            return 0
+        finally:
+            session.close()
+        return len(seen)
+
+
+class ReminderScheduler:
+    """
+    Фоновая ежедневная рассылка напоминаний.
+
+    Атрибуты:
+        session_factory: Фабрика SQLAlchemy-сессий.
+        outbox (sender.SendQueue): Очередь исходящих сообщений.
+        hour (int): Час (UTC), начиная с которого выполняется рассылка
+                    (отрицательный - рассылка выключена, работает только
+                    запись активности).
+        idle (timedelta): Сколько пользователь должен быть неактивен.
+        batch_size (int): Сколько пользователей читать за один запрос.
+        min_words (int): Минимум слов для пользователя без повторений.
+        rate (float): Максимальная частота напоминаний в секунду.
+        max_pending (int): Предел очереди исходящих сообщений, выше которого
+                           рассылка ждет.
+        tracker (ActivityTracker or None): Middleware активности, которое
+                                           сбрасывается на каждом такте.
+        tick (float): Период проверки расписания в секундах.
+
+    """
+    def __init__(self, session_factory, outbox, hour=18, idle=timedelta(hours=20),
+                 batch_size=500, min_words=4, rate=20.0, max_pending=1000,
+                 tracker=None, tick=60.0):
+        self.session_factory = session_factory
+        self.outbox = outbox
+        self.hour = hour
+        self.idle = idle
+        self.batch_size = batch_size
+        self.min_words = min_words
+        self.rate = rate
+        self.max_pending = max_pending
+        self.tracker = tracker
+        self.tick = tick
+        self._stop = threading.Event()
+        self._thread = None
+        # [день, users.id, результат] в порядке постановки в очередь;
+        # результат None - напоминание еще не отправлено
+        self._outstanding = deque()
+        self._progress = threading.Condition()
+
+    def start(self):
+        """Запускает фоновый поток расписания."""
+        self._thread = threading.Thread(target=self._work, name="reminders", daemon=True)
+        self._thread.start()
+
+    def _work(self):
+        while not self._stop.wait(self.tick):
+            try:
+                if self.tracker is not None:
+                    self.tracker.flush()
+                now = utcnow()
+                if 0 <= self.hour <= now.hour:
+                    self.run(now)
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Ошибка рассылки напоминаний")
+
+    def _wait_for_outbox(self):
+        while self.outbox.pending() > self.max_pending and not self._stop.is_set():
+            time.sleep(0.05)
+
+    def run(self, now=None):
+        """
+        Выполняет (или продолжает) рассылку за текущий день.
+
+        Параметры:
+            now (datetime or None): Текущий момент (UTC).
+
+        Возвращает:
+            ReminderRuns: Контрольная точка рассылки за день.
+
+        """
+        now = now or utcnow()
+        day = now.date()
+        session = self.session_factory()
+        try:
+            checkpoint = session.get(ReminderRuns, day)
+            if checkpoint is None:
+                checkpoint = ReminderRuns(day=day, last_user_id=0, sent=0, started_at=now)
+                session.add(checkpoint)
+                session.commit()
+            elif checkpoint.finished_at is None and checkpoint.last_user_id:
+                logger.info("Продолжение рассылки напоминаний с users.id > %d",
+                            checkpoint.last_user_id)
+            if checkpoint.finished_at is not None:
+                return checkpoint
+            bucket = TokenBucket(self.rate, max(self.rate, 1))
+            after_id = checkpoint.last_user_id
+            # транзакции чтения не держатся открытыми: контрольную точку
+            # записывает _advance из потоков очереди сообщений
+            session.commit()
+            while not self._stop.is_set():
+                last_id, due = reminder_candidates(
+                    session, after_id, now - self.idle, now, self.batch_size, self.min_words
+                )
+                session.commit()
+                if last_id is None:
+                    if self._wait_for_sent():
+                        session.execute(
+                            sq.update(ReminderRuns).where(ReminderRuns.day == day).\
+                                values(finished_at=utcnow())
+                        )
+                        session.commit()
+                    break
+                self._send(day, due, last_id, bucket)
+                after_id = last_id
+            checkpoint = session.get(ReminderRuns, day, populate_existing=True)
+            if checkpoint.finished_at is not None:
+                logger.info("Рассылка напоминаний закончена: %d", checkpoint.sent)
+            return checkpoint
+        finally:
+            session.close()
+
+    def _send(self, day, due, last_id, bucket):
+        for user_id, tg_id, count in due:
+            if self._stop.is_set():
+                return  # оставшиеся напоминания пачки будут отправлены после перезапуска
+            self._wait_for_outbox()
+            while (delay := bucket.delay(time.monotonic())) > 0:
+                time.sleep(delay)
+            bucket.consume(time.monotonic())
+            entry = [day, user_id, None]
+            with self._progress:
+                self._outstanding.append(entry)
+            self.outbox.send_message(
+                tg_id, BotMessages.REMINDER.format(count), reply_markup=MARKUP_DEFAULT,
+                on_done=partial(self._complete, entry)
+            )
+            REMINDERS.inc("queued")
+        # пользователи пачки без напоминаний не задерживают контрольную точку
+        with self._progress:
+            self._outstanding.append([day, last_id, False])
+        self._advance()
+
+    def _complete(self, entry, sent):
+        """Отмечает напоминание отправленным (вызывается очередью сообщений)."""
+        REMINDERS.inc("sent" if sent else "failed")
+        with self._progress:
+            entry[2] = sent
+        self._advance()
+
+    def _advance(self):
+        """Продвигает контрольные точки до первого неотправленного напоминания."""
+        with self._progress:
+            progress = {}  # день -> [последний users.id, отправлено]
+            while self._outstanding and self._outstanding[0][2] is not None:
+                day, user_id, sent = self._outstanding.popleft()
+                entry = progress.setdefault(day, [user_id, 0])
+                entry[0] = user_id
+                entry[1] += sent is True
+            if not progress:
+                return
+            # запись под блокировкой: контрольная точка не откатывается назад
+            session = self.session_factory()
+            try:
+                for day, (last_id, sent) in progress.items():
+                    session.execute(
+                        sq.update(ReminderRuns).where(ReminderRuns.day == day).\
+                            values(last_user_id=last_id, sent=ReminderRuns.sent + sent)
+                    )
+                session.commit()
+            except Exception:  # pylint: disable=broad-except
+                session.rollback()
+                logger.exception("Не удалось записать прогресс рассылки напоминаний")
+            finally:
+                session.close()
+            self._progress.notify_all()
+
+    def _wait_for_sent(self):
+        """
+        Ждет отправки всех поставленных напоминаний.
+
+        Возвращает:
+            bool: True, если все отправлены, False - если рассылка остановлена.
+
+        """
+        with self._progress:
+            while self._outstanding and not self._stop.is_set():
+                self._progress.wait(0.1)
+            return not self._outstanding
+
+    def close(self, timeout=None):
+        """
+        Останавливает рассылку (прогресс сохраняется) и записывает активность.
+
+        Параметры:
+            timeout (float or None): Сколько секунд ждать завершения потока.
+
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self.tracker is not None:
+            self.tracker.flush()
@@ -0,0 +1,577 @@
+"""
+Модуль записи и воспроизведения обновлений Telegram для нагрузочной проверки.
+
+Запись: если в config.env задан параметр RECORD_UPDATES (путь к файлу),
+бот дописывает каждое входящее сообщение и нажатие кнопки в файл JSON Lines
+в формате обновления Bot API с дополнительным полем recorded_at.
+
+Воспроизведение: обновления из файла подаются в настоящий стек
+обработчиков tg_bot (create_app, middleware, маршрутизация, база данных
+SQLite) с заданной скоростью: напрямую, как их передает lifecycle.Poller
+при long polling, или POST-запросами на локальный вебхук async_bot. Telegram Bot API и API Яндекс для словарей
+заменяются локальным HTTP-сервером-заглушкой. По итогам выводятся
+пропускная способность, распределение задержек (по обновлениям и по
+обработчикам), количество SQL-запросов и пиковое потребление памяти.
+
+Генератор создает синтетическую запись: N пользователей, каждый
+регистрируется и затем выполняет случайную смесь добавлений, тренировок,
+удалений и просмотров словаря.
+
+Использование из командной строки:
+    python replay.py generate --users 100 --actions 20 -o trace.jsonl
+    python replay.py run trace.jsonl --speed 0 --lanes 4
+    python replay.py run trace.jsonl --webhook
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+import requests
+from aiohttp import web
+from telebot import apihelper, types
+from telebot.handler_backends import BaseMiddleware
+from common import Commands
+from metrics import HANDLER_LATENCY, LATENCY_BUCKETS, UPDATE_QUERIES, update_kind
+
+STUB_TRANSLATION = "перевод"
+_ENGLISH = "abcdefghijklmnopqrstuvwxyz"
+_RUSSIAN = "абвгдежзиклмнопрстуфхцчшэюя"
+_DEFAULT_TRANSLATIONS = ("вдова", "витамин", "вампир", "меч", "палка", "газировка",
+                         "шелк", "душ", "духовка", "куртка")
+
+
+def _to_json(obj):
+    """
+    Преобразует объект telebot в словарь в формате Bot API.
+
+    Message и CallbackQuery хранят исходный JSON, а у InlineQuery и
+    вложенных объектов его нет: они собираются из атрибутов (from_user
+    становится полем from, пустые поля пропускаются).
+
+    Параметры:
+        obj: Объект telebot, список или простое значение.
+
+    Возвращает:
+        Значение, которое можно записать в JSON.
+
+    """
+    payload = getattr(obj, "json", None)
+    if payload is not None:
+        return json.loads(payload) if isinstance(payload, str) else payload
+    if isinstance(obj, (list, tuple)):
+        return [_to_json(item) for item in obj]
+    if not hasattr(obj, "__dict__"):
+        return obj
+    return {("from" if key == "from_user" else key): _to_json(value)
+            for key, value in vars(obj).items() if value is not None}
+
+
+class UpdateRecorder(BaseMiddleware):
+    """
+    Middleware, записывающее входящие обновления в файл JSON Lines.
+
+    Атрибуты:
+        path (str): Путь к файлу записи (дописывается).
+
+    """
+    def __init__(self, path):
+        super().__init__()
+        self.update_types = ["message", "callback_query", "inline_query"]
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")  # pylint: disable=consider-using-with
+        self._lock = threading.Lock()
+        self._update_id = 0
+
+    def pre_process(self, message, data):
+        kind = update_kind(message)
+        payload = _to_json(message)
+        with self._lock:
+            self._update_id += 1
+            self._file.write(json.dumps(
+                {"update_id": self._update_id, "recorded_at": time.time(), kind: payload},
+                ensure_ascii=False
+            ) + "\n")
+            self._file.flush()
+
+    def post_process(self, message, data, exception):
+        pass
+
+    def close(self):
+        """Закрывает файл записи."""
+        with self._lock:
+            self._file.close()
+
+
+def _message(update_id, user_id, text, recorded_at):
+    return {
+        "update_id": update_id,
+        "recorded_at": recorded_at,
+        "message": {
+            "message_id": update_id,
+            "date": int(recorded_at),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"},
+            "text": text,
+        },
+    }
+
+def _user_script(rng, actions):
+    """Возвращает последовательность текстов сообщений одного пользователя."""
+    texts = ["/start", rng.choice(["Вася", Commands.REFUSE_NAME_ENTER])]
+    own = []
+    for _ in range(actions):
+        action = rng.choices(("add", "train", "delete", "dictionary"), (4, 4, 1, 1))[0]
+        if action == "add":
+            target = "".join(rng.choice(_ENGLISH) for _ in range(rng.randint(3, 9)))
+            if rng.random() < 0.3:
+                translation, reply = STUB_TRANSLATION, Commands.LET_TRANSLATE
+            else:
+                translation = "".join(rng.choice(_RUSSIAN) for _ in range(rng.randint(3, 9)))
+                reply = translation
+            own.append((target, translation))
+            texts += [Commands.ADD, target, reply]
+        elif action == "train":
+            texts += [Commands.TRAIN, Commands.YES]
+            known = list(_DEFAULT_TRANSLATIONS) + [translation for _, translation in own]
+            texts += [rng.choice(known) for _ in range(rng.randint(1, 6))]
+            texts.append(Commands.STOP_TRAINING)
+        elif action == "delete" and own:
+            target, _ = own.pop(rng.randrange(len(own)))
+            texts += [Commands.DELETE, target]
+        else:
+            texts.append(Commands.MY_DICTIONARY)
+    return texts
+
+def generate_trace(users, actions, rate=50.0, seed=None, first_user_id=100000):
+    """
+    Создает синтетическую запись обновлений.
+
+    Сообщения разных пользователей перемешаны случайно, порядок сообщений
+    каждого пользователя сохраняется. Моменты прихода образуют пуассоновский
+    поток с интенсивностью rate сообщений в секунду.
+
+    Параметры:
+        users (int): Количество пользователей.
+        actions (int): Количество действий каждого пользователя.
+        rate (float): Средняя интенсивность потока (сообщений в секунду).
+        seed (int or None): Начальное значение генератора случайных чисел.
+        first_user_id (int): Идентификатор Telegram первого пользователя.
+
+    Возвращает:
+        generator: Обновления в формате Bot API с полем recorded_at.
+
+    """
+    rng = random.Random(seed)
+    scripts = {first_user_id + number: _user_script(rng, actions) for number in range(users)}
+    cursors = dict.fromkeys(scripts, 0)
+    active = list(scripts)
+    moment, update_id = 0.0, 0
+    while active:
+        index = rng.randrange(len(active))
+        user_id = active[index]
+        update_id += 1
+        moment += rng.expovariate(rate)
+        yield _message(update_id, user_id, scripts[user_id][cursors[user_id]], moment)
+        cursors[user_id] += 1
+        if cursors[user_id] == len(scripts[user_id]):
+            active[index] = active[-1]
+            active.pop()
+
+def read_trace(path):
+    """
+    Читает запись обновлений.
+
+    Параметры:
+        path (str): Путь к файлу JSON Lines.
+
+    Возвращает:
+        list: Обновления (словари) в порядке записи.
+
+    """
+    with open(path, encoding="utf-8") as stream:
+        return [json.loads(line) for line in stream if line.strip()]
+
+
+class StubServer:
+    """
+    Локальная заглушка Telegram Bot API и API Яндекс для словарей.
+
+    Любой метод Bot API отвечает успешно (для отправки сообщений -
+    объектом Message), метод lookup возвращает перевод STUB_TRANSLATION.
+    Чтобы проверить повторы отправки, заглушка может отвечать ошибкой
+    429 Too Many Requests на каждый too_many_requests-й запрос к Bot API
+    и HTML-страницей 502 Bad Gateway (как балансировщик перед Bot API)
+    на каждый bad_gateway-й.
+
+    Параметры:
+        latency (float): Задержка каждого ответа, с.
+        too_many_requests (int): Каждый какой запрос к Bot API отклоняется
+                                 ответом 429 (0 - не отклонять).
+        retry_after (float): Значение retry_after в ответе 429, с.
+        bad_gateway (int): Каждый какой запрос к Bot API отклоняется
+                           ответом 502 без JSON (0 - не отклонять).
+
+    Атрибуты:
+        api_url (str): Шаблон адреса для telebot.apihelper.API_URL.
+        translate_url (str): Адрес для параметра TRANSLATE_URL.
+        calls (dict): Количество вызовов по методам (вместе с отклоненными).
+        messages (list): Принятые sendMessage в порядке прихода: (chat_id, text).
+        rejected (int): Сколько запросов отклонено ответом 429.
+        bad_gateways (int): Сколько запросов отклонено ответом 502.
+
+    """
+    def __init__(self, latency=0.0, too_many_requests=0, retry_after=1.0, bad_gateway=0):
+        self.calls = {}
+        self.messages = []
+        self.rejected = 0
+        self.bad_gateways = 0
+        self._lock = threading.Lock()
+        requests_seen = [0]
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _reply(self):
+                url = urlsplit(self.path)
+                method = url.path.rsplit("/", 1)[-1]
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length).decode("utf-8", "replace") if length else ""
+                params = {key: values[0] for key, values in
+                          parse_qs(url.query or body).items()}
+                telegram = not url.path.startswith("/yandex")
+                with stub._lock:  # pylint: disable=protected-access
+                    stub.calls[method] = stub.calls.get(method, 0) + 1
+                    if telegram:
+                        requests_seen[0] += 1
+                    throttled = (telegram and too_many_requests
+                                 and requests_seen[0] % too_many_requests == 0)
+                    broken = (telegram and not throttled and bad_gateway
+                              and requests_seen[0] % bad_gateway == 0)
+                    if throttled:
+                        stub.rejected += 1
+                    elif broken:
+                        stub.bad_gateways += 1
+                    elif method == "sendMessage":
+                        stub.messages.append((int(params.get("chat_id", 0) or 0),
+                                              params.get("text", "")))
+                if latency:
+                    time.sleep(latency)
+                if throttled:
+                    self._send(429, {"ok": False, "error_code": 429,
+                                     "description": "Too Many Requests: retry later",
+                                     "parameters": {"retry_after": retry_after}})
+                    return
+                if broken:
+                    self._send(502, b"<html><body><h1>502 Bad Gateway</h1></body></html>",
+                               "text/html")
+                    return
+                if not telegram:
+                    result = {"def": [{"tr": [{"text": STUB_TRANSLATION}]}]}
+                else:
+                    chat_id = int(params.get("chat_id", 0) or 0)
+                    result = {"ok": True, "result": {
+                        "message_id": stub.calls[method], "date": int(time.time()),
+                        "chat": {"id": chat_id, "type": "private"},
+                        "text": params.get("text", ""),
+                    }}
+                self._send(200, result)
+
+            def _send(self, status, result, content_type="application/json"):
+                payload = result if isinstance(result, bytes) else json.dumps(result).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = do_POST = _reply  # pylint: disable=invalid-name
+
+            def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        host, port = self._server.server_address
+        self.api_url = f"http://{host}:{port}/bot{{0}}/{{1}}"
+        self.translate_url = f"http://{host}:{port}/yandex/lookup"
+        threading.Thread(target=self._server.serve_forever, name="stub", daemon=True).start()
+
+    def close(self):
+        """Останавливает сервер."""
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def _key(item):
+    chat = getattr(item, "chat", None)
+    if chat is not None:
+        return chat.id, item.message_id
+    return item.from_user.id, item.id
+
+
+class _Probe(BaseMiddleware):
+    """Считает обработанные обновления и их задержку от подачи до завершения."""
+    def __init__(self):
+        super().__init__()
+        self.update_types = ["message", "callback_query", "inline_query"]
+        self.latencies = []
+        self.submitted = {}
+        self._lock = threading.Lock()
+        self._done = threading.Condition(self._lock)
+
+    def pre_process(self, message, data):
+        pass
+
+    def post_process(self, message, data, exception):
+        finished = time.perf_counter()
+        with self._lock:
+            started = self.submitted.pop(_key(message), finished)
+            self.latencies.append(finished - started)
+            self._done.notify_all()
+
+    def wait(self, count, timeout):
+        with self._lock:
+            return self._done.wait_for(lambda: len(self.latencies) >= count, timeout)
+
+
+def _percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def _bucket_percentile(buckets, counts, total, fraction):
+    seen = 0
+    for bound, count in zip(buckets, counts):
+        seen += count
+        if seen >= fraction * total:
+            return bound
+    return float("inf")
+
+class WebhookServer:
+    """Вебхук-сервер async_bot в отдельном потоке со своим циклом событий."""
+    def __init__(self, bot):
+        # циклический импорт: async_bot импортирует tg_bot, а tg_bot - replay
+        import async_bot  # pylint: disable=import-outside-toplevel
+
+        self._loop = asyncio.new_event_loop()
+        self._runner = web.AppRunner(async_bot.create_webhook_app(bot))
+        self._loop.run_until_complete(self._runner.setup())
+        self._loop.run_until_complete(web.TCPSite(self._runner, "127.0.0.1", 0).start())
+        host, port = self._runner.addresses[0][:2]
+        self.url = f"http://{host}:{port}{async_bot.WEBHOOK_PATH}"
+        self._thread = threading.Thread(target=self._loop.run_forever, name="webhook",
+                                        daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Останавливает сервер, дождавшись обработки принятых обновлений."""
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+
+def _sender_id(update):
+    item = update.get("message") or update.get("callback_query") or update.get("inline_query")
+    return item["from"]["id"]
+
+def replay(updates, speed=0.0, lanes=4, dsn=None, stub_latency=0.0, timeout=600.0,
+           webhook=False, clients=8):
+    """
+    Воспроизводит обновления через обработчики tg_bot.
+
+    Параметры:
+        updates (list): Обновления в формате Bot API (см. read_trace).
+        speed (float): Множитель скорости относительно записи
+                       (1.0 - как записано, 0 - без пауз, как можно быстрее).
+        lanes (int): Количество потоков обработки обновлений.
+        dsn (str or None): База данных (по умолчанию новый файл SQLite).
+        stub_latency (float): Задержка ответов заглушки в секундах.
+        timeout (float): Максимальное время ожидания обработки.
+        webhook (bool): Подавать обновления POST-запросами на вебхук
+                        async_bot, а не напрямую.
+        clients (int): Сколько одновременных HTTP-клиентов отправляют
+                       обновления на вебхук (как соединения Telegram,
+                       max_connections). Обновления одного пользователя
+                       отправляет один клиент по порядку.
+
+    Возвращает:
+        dict: Итоги воспроизведения (см. format_report).
+
+    """
+    # циклический импорт: tg_bot импортирует replay (UpdateRecorder)
+    import tg_bot  # pylint: disable=import-outside-toplevel
+
+    stub = StubServer(stub_latency)
+    apihelper.API_URL = stub.api_url
+    workdir = tempfile.mkdtemp(prefix="replay-")
+    bot = tg_bot.create_app({
+        "TOKEN": "0:replay",
+        "DSN": dsn or f"sqlite:///{os.path.join(workdir, 'replay.db')}",
+        "TRANSLATE_TOKEN": "replay",
+        "TRANSLATE_URL": stub.translate_url,
+        "LANES": lanes,
+        "SEND_GLOBAL_RATE": 1e9,
+        "SEND_CHAT_RATE": 1e9,
+        "TRAINING_INLINE": False,  # синтетическая запись отвечает текстом
+    })
+    probe = _Probe()
+    bot.setup_middleware(probe)
+    if webhook:
+        server = WebhookServer(bot)
+
+    started = time.perf_counter()
+    first_at = updates[0].get("recorded_at", 0.0) if updates else 0.0
+
+    def submit(update, http=None):
+        if speed:
+            delay = (update.get("recorded_at", first_at) - first_at) / speed \
+                - (time.perf_counter() - started)
+            if delay > 0:
+                time.sleep(delay)
+        raw = {key: value for key, value in update.items() if key != "recorded_at"}
+        parsed = types.Update.de_json(raw)
+        item = parsed.message or parsed.callback_query or parsed.inline_query
+        with probe._lock:  # pylint: disable=protected-access
+            probe.submitted[_key(item)] = time.perf_counter()
+        if http is not None:
+            http.post(server.url, json=raw, timeout=timeout).raise_for_status()
+        else:
+            bot.process_new_updates([parsed])
+
+    def post_all(part):
+        with requests.Session() as http:
+            for update in part:
+                submit(update, http)
+
+    if webhook:
+        parts = [[] for _ in range(clients)]
+        for update in updates:
+            parts[_sender_id(update) % clients].append(update)
+        with ThreadPoolExecutor(clients, thread_name_prefix="client") as executor:
+            list(executor.map(post_all, parts))  # исключения клиентов - здесь
+    else:
+        for update in updates:
+            submit(update)
+    completed = probe.wait(len(updates), timeout)
+    elapsed = time.perf_counter() - started
+    if webhook:
+        server.close()
+    tg_bot.reminders.close(timeout=30)
+    tg_bot.answer_log.close(timeout=30)
+    tg_bot.outbox.close(timeout=30)
+    stub.close()
+
+    handlers = {}
+    for (handler, _), (counts, total_time, count) in \
+            HANDLER_LATENCY.snapshot().items():
+        entry = handlers.setdefault(handler, [[0] * len(counts), 0.0, 0])
+        entry[0] = [a + b for a, b in zip(entry[0], counts)]
+        entry[1] += total_time
+        entry[2] += count
+    queries = UPDATE_QUERIES.snapshot().get((), ((), 0, 0))
+    return {
+        "mode": f"webhook, {clients} клиентов" if webhook else "polling",
+        "updates": len(updates),
+        "completed": completed,
+        "seconds": elapsed,
+        "throughput": len(probe.latencies) / elapsed if elapsed else 0.0,
+        "latency": {
+            "p50": _percentile(probe.latencies, 0.50),
+            "p95": _percentile(probe.latencies, 0.95),
+            "p99": _percentile(probe.latencies, 0.99),
+            "max": max(probe.latencies, default=0.0),
+        },
+        "handlers": {
+            name: {
+                "count": count,
+                "mean": total_time / count if count else 0.0,
+                "p95_le": _bucket_percentile(LATENCY_BUCKETS, counts, count, 0.95),
+            }
+            for name, (counts, total_time, count) in sorted(handlers.items())
+        },
+        "db_queries": queries[1],
+        "db_queries_per_update": queries[1] / queries[2] if queries[2] else 0.0,
+        "api_calls": dict(stub.calls),
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+def format_report(result):
+    """Возвращает итоги воспроизведения в виде текста."""
+    latency = result["latency"]
+    lines = [
+        f"Обновлений ({result['mode']}): {result['updates']} за {result['seconds']:.2f} с"
+        + ("" if result["completed"] else " (не все обработаны за отведенное время)"),
+        f"Пропускная способность: {result['throughput']:.1f} обновлений/с",
+        f"Задержка обновления: p50 {latency['p50'] * 1000:.1f} мс, "
+        f"p95 {latency['p95'] * 1000:.1f} мс, p99 {latency['p99'] * 1000:.1f} мс, "
+        f"max {latency['max'] * 1000:.1f} мс",
+        f"SQL-запросов: {result['db_queries']:.0f} "
+        f"({result['db_queries_per_update']:.2f} на обновление)",
+        f"Пиковая память (RSS): {result['peak_rss_mb']:.1f} МБ",
+        "Обработчики (количество, среднее, p95 не выше):",
+    ]
+    for name, stats in result["handlers"].items():
+        lines.append(f"  {name}: {stats['count']}, {stats['mean'] * 1000:.2f} мс, "
+                     f"{stats['p95_le'] * 1000:g} мс")
+    lines.append("Вызовы заглушек API: " + ", ".join(
+        f"{method} {count}" for method, count in sorted(result["api_calls"].items())
+    ))
+    return "\n".join(lines)
+
+def main(argv=None):
+    """Точка входа командной строки: генерация и воспроизведение записей."""
+    parser = argparse.ArgumentParser(description="Запись и воспроизведение обновлений бота")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    generate = commands.add_parser("generate", help="создать синтетическую запись")
+    generate.add_argument("--users", type=int, default=100)
+    generate.add_argument("--actions", type=int, default=20,
+                          help="действий (добавление, тренировка, ...) на пользователя")
+    generate.add_argument("--rate", type=float, default=50.0,
+                          help="средняя интенсивность, сообщений в секунду")
+    generate.add_argument("--seed", type=int)
+    generate.add_argument("-o", "--output", help="файл записи (по умолчанию stdout)")
+
+    run = commands.add_parser("run", help="воспроизвести запись")
+    run.add_argument("trace", help="файл записи JSON Lines")
+    run.add_argument("--speed", type=float, default=0.0,
+                     help="множитель скорости (0 - как можно быстрее)")
+    run.add_argument("--lanes", type=int, default=4)
+    run.add_argument("--dsn", help="база данных (по умолчанию временный файл SQLite)")
+    run.add_argument("--stub-latency", type=float, default=0.0,
+                     help="задержка ответов заглушек API, с")
+    run.add_argument("--webhook", action="store_true",
+                     help="подавать обновления через вебхук async_bot")
+    run.add_argument("--clients", type=int, default=8,
+                     help="одновременных HTTP-клиентов вебхука")
+    run.add_argument("--json", help="сохранить итоги в файл JSON")
+    args = parser.parse_args(argv)
+
+    if args.command == "generate":
+        out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+        try:
+            for update in generate_trace(args.users, args.actions, args.rate, args.seed):
+                out.write(json.dumps(update, ensure_ascii=False) + "\n")
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        return
+
+    result = replay(read_trace(args.trace), args.speed, args.lanes, args.dsn, args.stub_latency,
+                    webhook=args.webhook, clients=args.clients)
+    print(format_report(result))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as out:
+            json.dump(result, out, ensure_ascii=False, indent=2)
+
+if __name__ == '__main__':
+    main()
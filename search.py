@@ -0,0 +1,297 @@
+"""
+Модуль поиска слов по началу слова с учетом опечаток.
+
+Индекс хранит отсортированный массив уникальных терминов (английских слов
+и переводов в нижнем регистре) и соответствие "термин -> пары слов".
+Слова, начинающиеся с запроса, находятся двоичным поиском (bisect) за
+O(log n). Для запросов с опечаткой перебираются варианты запроса на
+расстоянии одной правки (лишняя, пропущенная или замененная буква,
+перестановка соседних букв), причем вставляемые и заменяющие буквы берутся
+не из алфавита, а только те, что действительно встречаются в индексе после
+общего начала: отсортированный массив обходится как префиксное дерево,
+без дополнительной памяти.
+
+Индексы строятся лениво, как индексы дистракторов (см. distractors.py):
+один для общих слов (tg_id == 0) и по одному для собственных слов каждого
+пользователя (LRU с ограничением количества). При добавлении и удалении
+слова индекс пользователя обновляется на месте; изменения выполняются в
+дорожке обработки пользователя (см. lanes.py).
+"""
+import threading
+from bisect import bisect_left, insort
+from collections import OrderedDict
+
+MIN_FUZZY_LENGTH = 3  # более короткие запросы ищутся только по началу слова
+_CYRILLIC = "\u0400"  # буквы не меньше этой - кириллица
+
+
+def normalize(text):
+    """Приводит запрос или термин к виду, в котором он хранится в индексе."""
+    return " ".join(text.lower().split())
+
+
+class SearchIndex:
+    """
+    Индекс поиска для одного набора пар слов.
+
+    Для каждого термина хранится идентификатор пары (int) или кортеж
+    идентификаторов, если термин встречается в нескольких парах.
+
+    Атрибуты:
+        words (dict): Пары слов: id -> (target, translation).
+
+    """
+    def __init__(self, rows=()):
+        self.words = {}
+        self._terms = []
+        self._ids = {}
+        for word_id, target, translation in rows:
+            self._add(word_id, target, translation)
+        self._terms.sort()  # при построении - одна сортировка вместо вставок
+
+    def __len__(self):
+        return len(self.words)
+
+    def _add(self, word_id, target, translation, insert=False):
+        if word_id in self.words:
+            return
+        self.words[word_id] = (target, translation)
+        for term in {normalize(target), normalize(translation)}:
+            ids = self._ids.get(term)
+            if ids is None:
+                self._ids[term] = word_id
+                if insert:
+                    insort(self._terms, term)
+                else:
+                    self._terms.append(term)
+            elif isinstance(ids, int):
+                self._ids[term] = (ids, word_id)
+            else:
+                self._ids[term] = ids + (word_id,)
+
+    def add(self, word_id, target, translation):
+        """
+        Добавляет пару слов в индекс.
+
+        Параметры:
+            word_id (int): Идентификатор пары слов.
+            target (str): Английское слово.
+            translation (str): Перевод на русский язык.
+
+        """
+        self._add(word_id, target, translation, insert=True)
+
+    def remove(self, word_id):
+        """
+        Удаляет пару слов из индекса.
+
+        Параметры:
+            word_id (int): Идентификатор пары слов.
+
+        """
+        pair = self.words.pop(word_id, None)
+        if pair is None:
+            return
+        for term in {normalize(pair[0]), normalize(pair[1])}:
+            ids = self._ids[term]
+            if ids == word_id:
+                del self._ids[term]
+                del self._terms[bisect_left(self._terms, term)]
+            else:
+                ids = tuple(other for other in ids if other != word_id)
+                self._ids[term] = ids[0] if len(ids) == 1 else ids
+
+    def _collect(self, prefix, limit, found, low=0, high=None):
+        """Добавляет в found пары терминов, начинающихся с prefix."""
+        terms = self._terms
+        high = len(terms) if high is None else high
+        position = bisect_left(terms, prefix, low, high)
+        while position < high and len(found) < limit:
+            term = terms[position]
+            if not term.startswith(prefix):
+                break
+            ids = self._ids[term]
+            if isinstance(ids, int):
+                found.setdefault(ids)
+            else:
+                for word_id in ids:
+                    found.setdefault(word_id)
+            position += 1
+
+    def _next_chars(self, prefix, scripts):
+        """
+        Перебирает буквы, которые встречаются в терминах сразу после prefix,
+        вместе с границами диапазона терминов prefix + буква. Пропускаются
+        буквы алфавитов, которых нет в scripts (True - кириллица, False -
+        латиница и прочие символы).
+        """
+        terms, size = self._terms, len(prefix)
+        position = bisect_left(terms, prefix)
+        while position < len(terms):
+            term = terms[position]
+            if not term.startswith(prefix):
+                return
+            if len(term) == size:
+                position += 1
+                continue
+            char = term[size]
+            end = bisect_left(terms, prefix + chr(ord(char) + 1), position)
+            if (char >= _CYRILLIC) in scripts:
+                yield char, position, end
+            position = end
+
+    def _variants(self, query):
+        """
+        Перебирает варианты начала слова на расстоянии одной правки от
+        query вместе с диапазоном терминов, в котором их искать.
+        """
+        size = len(query)
+        for i in range(size - 1):
+            yield query[:i] + query[i + 1] + query[i] + query[i + 2:], 0, None  # перестановка
+        for i in range(size - 1, -1, -1):
+            head, tail = query[:i], query[i + 1:]
+            if i < size - 1:
+                yield head + tail, 0, None  # лишняя буква
+            # буква того же алфавита, что и соседние буквы запроса
+            scripts = {query[i] >= _CYRILLIC, (head or query)[-1] >= _CYRILLIC}
+            for char, low, high in self._next_chars(head, scripts):
+                yield head + char + query[i:], low, high  # пропущенная буква
+                if char != query[i]:
+                    yield head + char + tail, low, high  # замененная буква
+
+    def search(self, query, limit=10):
+        """
+        Ищет пары слов, английское слово или перевод которых начинается с
+        запроса, а если таких меньше limit - начинается с запроса с одной
+        опечаткой.
+
+        Параметры:
+            query (str): Запрос (начало слова).
+            limit (int): Максимальное количество результатов.
+
+        Возвращает:
+            list: Идентификаторы пар: сначала точные совпадения начала слова
+                  (по алфавиту), затем найденные с опечаткой.
+
+        """
+        query = normalize(query)
+        found = {}
+        self._collect(query, limit, found)
+        if len(found) < limit and len(query) >= MIN_FUZZY_LENGTH:
+            for variant, low, high in self._variants(query):
+                self._collect(variant, limit, found, low, high)
+                if len(found) >= limit:
+                    break
+        return list(found)
+
+
+class SearchEngine:
+    """
+    Поиск по общим словам и словам пользователя.
+
+    Атрибуты:
+        loader: Функция loader(session, tg_id), возвращающая собственные
+                слова пользователя кортежами (id, target, translation).
+        maxsize (int): Сколько индексов пользователей хранить.
+
+    """
+    SHARED_TG_ID = 0
+
+    def __init__(self, loader, maxsize=1024):
+        self.loader = loader
+        self.maxsize = maxsize
+        self._indexes = OrderedDict()
+        self._shared = None
+        self._lock = threading.Lock()
+
+    def _get_shared(self, session):
+        if self._shared is None:
+            self._shared = SearchIndex(self.loader(session, self.SHARED_TG_ID))
+        return self._shared
+
+    def _get(self, session, tg_id):
+        with self._lock:
+            index = self._indexes.get(tg_id)
+            if index is not None:
+                self._indexes.move_to_end(tg_id)
+                return index
+        index = SearchIndex(self.loader(session, tg_id))
+        with self._lock:
+            self._indexes[tg_id] = index
+            while len(self._indexes) > self.maxsize:
+                self._indexes.popitem(last=False)
+        return index
+
+    def search(self, session, tg_id, query, limit=10, own_only=False):
+        """
+        Ищет слова пользователя (и общие слова) по началу слова.
+
+        Параметры:
+            session: SQLAlchemy session для построения индексов при промахе.
+            tg_id (int): Идентификатор пользователя в Telegram.
+            query (str): Запрос.
+            limit (int): Максимальное количество результатов.
+            own_only (bool): Искать только собственные слова пользователя.
+
+        Возвращает:
+            list: Кортежи (id, target, translation), сначала слова
+                  пользователя.
+
+        """
+        indexes = [self._get(session, tg_id)]
+        if not own_only:
+            indexes.append(self._get_shared(session))
+        results, seen = [], set()
+        for index in indexes:
+            # слова пользователя могут быть и среди общих: просим полный limit,
+            # чтобы повторы не сократили выдачу
+            for word_id in index.search(query, limit):
+                if word_id not in seen:
+                    seen.add(word_id)
+                    results.append((word_id, *index.words[word_id]))
+                    if len(results) >= limit:
+                        return results
+        return results
+
+    def add(self, tg_id, word_id, target, translation):
+        """
+        Добавляет слово в индекс пользователя, если индекс уже построен.
+
+        Параметры:
+            tg_id (int): Идентификатор пользователя в Telegram.
+            word_id (int): Идентификатор пары слов.
+            target (str): Английское слово.
+            translation (str): Перевод на русский язык.
+
+        """
+        with self._lock:
+            index = self._shared if tg_id == self.SHARED_TG_ID else self._indexes.get(tg_id)
+        if index is not None:
+            index.add(word_id, target, translation)
+
+    def remove(self, tg_id, word_id):
+        """
+        Удаляет слово из индекса пользователя, если индекс уже построен.
+
+        Параметры:
+            tg_id (int): Идентификатор пользователя в Telegram.
+            word_id (int): Идентификатор пары слов.
+
+        """
+        with self._lock:
+            index = self._shared if tg_id == self.SHARED_TG_ID else self._indexes.get(tg_id)
+        if index is not None:
+            index.remove(word_id)
+
+    def invalidate(self, tg_id):
+        """
+        Сбрасывает индекс пользователя (например, после импорта словаря).
+
+        Параметры:
+            tg_id (int): Идентификатор пользователя в Telegram.
+
+        """
+        with self._lock:
+            if tg_id == self.SHARED_TG_ID:
+                self._shared = None
+            self._indexes.pop(tg_id, None)
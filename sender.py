@@ -0,0 +1,405 @@
+"""
+Модуль очереди исходящих сообщений бота.
+
+Обработчики не отправляют сообщения сами, а ставят их в очередь, которую
+разбирают фоновые потоки. Очередь:
+- соблюдает ограничения Telegram: общее (GLOBAL_RATE сообщений в секунду)
+  и для каждого чата (CHAT_RATE в секунду с небольшим запасом CHAT_BURST),
+  через алгоритм token bucket;
+- сохраняет порядок сообщений внутри одного чата (чат обслуживается не
+  более чем одним потоком одновременно);
+- изменяет отправленные сообщения (edit_message_text,
+  edit_message_reply_markup) и отправляет файлы (send_document) в той же
+  очереди чата, после его сообщений;
+- склеивает подряд идущие сообщения в один чат, если первое из них - простой
+  текст без клавиатуры (например, "Это правильный ответ" и следующий вопрос);
+- повторяет отправку при ответах 429 (с учетом retry_after) и 5xx
+  (с экспоненциальной задержкой);
+- сообщает о завершении отправки через on_done(sent): True - сообщение
+  отправлено, False - отвергнуто Telegram или исчерпаны попытки.
+  Сообщения, отброшенные при закрытии очереди, on_done не вызывают.
+"""
+import heapq
+import logging
+import threading
+import time
+from collections import deque
+import requests
+from telebot.apihelper import ApiException
+from telebot.types import InputFile
+from metrics import HTTP_LATENCY
+
+logger = logging.getLogger(__name__)
+
+GLOBAL_RATE = 30.0
+CHAT_RATE = 1.0
+CHAT_BURST = 3
+MAX_MESSAGE_LENGTH = 4096
+MAX_ATTEMPTS = 5
+MAX_IDLE_CHATS = 10000  # после этого простаивающие чаты забываются
+
+
+class TokenBucket:
+    """
+    Ограничитель частоты по алгоритму token bucket.
+
+    Атрибуты:
+        rate (float): Скорость пополнения (токенов в секунду).
+        capacity (float): Максимальный запас токенов.
+
+    """
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now):
+        """Возвращает, сколько секунд ждать до появления токена (0 - можно сейчас)."""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def consume(self, now):
+        """Забирает один токен."""
+        self._refill(now)
+        self.tokens -= 1
+
+    def is_full(self, now):
+        """bool: True, если запас полон (ограничитель можно забыть)."""
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class _Outgoing:
+    __slots__ = ("method", "chat_id", "text", "kwargs", "attempts", "sent", "callbacks")
+
+    def __init__(self, method, chat_id, text, kwargs, on_done=None):
+        self.method = method
+        self.chat_id = chat_id
+        self.text = text
+        self.kwargs = kwargs
+        self.attempts = 0
+        self.sent = False
+        self.callbacks = [on_done] if on_done is not None else []
+
+    def can_absorb(self, other):
+        """Можно ли дописать к этому сообщению следующее сообщение other."""
+        return (self.method == other.method == "send_message"
+                and not self.kwargs
+                and not other.kwargs.get("parse_mode")
+                and len(self.text) + len(other.text) + 1 <= MAX_MESSAGE_LENGTH)
+
+    def absorb(self, other):
+        self.text = self.text.rstrip("\n") + "\n" + other.text
+        self.kwargs = other.kwargs
+        self.callbacks += other.callbacks
+
+
+class _Chat:
+    __slots__ = ("queue", "bucket", "scheduled", "busy")
+
+    def __init__(self, rate, burst):
+        self.queue = deque()
+        self.bucket = TokenBucket(rate, burst)
+        self.scheduled = False
+        self.busy = False
+
+
+class SendQueue:
+    """
+    Очередь исходящих сообщений с ограничением частоты и повторами.
+
+    Интерфейс повторяет методы бота send_message, reply_to и методы
+    изменения сообщений, поэтому
+    обработчики могут вызывать outbox.send_message(...) вместо
+    bot.send_message(...). При workers=0 сообщения отправляются сразу,
+    в вызывающем потоке (удобно для тестов и отладки).
+
+    Атрибуты:
+        bot (telebot.TeleBot): Бот, через который отправляются сообщения.
+        stats (dict): Счетчики sent, coalesced, retried, failed, dropped.
+
+    """
+    def __init__(self, bot, workers=4, global_rate=GLOBAL_RATE, chat_rate=CHAT_RATE,
+                 chat_burst=CHAT_BURST, max_attempts=MAX_ATTEMPTS, coalesce=True):
+        self.bot = bot
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_attempts = max_attempts
+        self.coalesce = coalesce
+        self.stats = dict.fromkeys(("sent", "coalesced", "retried", "failed", "dropped"), 0)
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats = {}
+        self._sweep_at = MAX_IDLE_CHATS
+        self._heap = []
+        self._seq = 0
+        self._pending = 0
+        self._stopped = False
+        self._cond = threading.Condition()
+        self._threads = [
+            threading.Thread(target=self._work, name=f"sender-{number}", daemon=True)
+            for number in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def send_message(self, chat_id, text, on_done=None, **kwargs):
+        """
+        Ставит в очередь отправку сообщения (аргументы как у bot.send_message).
+
+        Параметры:
+            on_done: Функция on_done(sent), вызываемая после отправки (True)
+                     или отказа от нее (False), или None.
+
+        """
+        self._put(_Outgoing("send_message", chat_id, text, kwargs, on_done))
+
+    def reply_to(self, message, text, **kwargs):
+        """Ставит в очередь ответ на сообщение (аргументы как у bot.reply_to)."""
+        kwargs["reply_to_message_id"] = message.message_id
+        self._put(_Outgoing("send_message", message.chat.id, text, kwargs))
+
+    def edit_message_text(self, text, chat_id, message_id, **kwargs):
+        """Ставит в очередь изменение текста сообщения (как bot.edit_message_text)."""
+        kwargs.update(text=text, message_id=message_id)
+        self._put(_Outgoing("edit_message_text", chat_id, None, kwargs))
+
+    def edit_message_reply_markup(self, chat_id, message_id, reply_markup=None):
+        """Ставит в очередь изменение клавиатуры (как bot.edit_message_reply_markup)."""
+        self._put(_Outgoing("edit_message_reply_markup", chat_id, None,
+                            {"message_id": message_id, "reply_markup": reply_markup}))
+
+    def send_document(self, chat_id, document, file_name, on_done=None, **kwargs):
+        """
+        Ставит в очередь отправку файла (аргументы как у bot.send_document).
+
+        Параметры:
+            document: Двоичный файловый объект; очередь перематывает его
+                      перед каждой попыткой, закрывать его после отправки
+                      (например, в on_done) должен вызывающий.
+            file_name (str): Имя файла для пользователя.
+            on_done: Функция on_done(sent) или None (см. send_message).
+
+        """
+        kwargs.update(document=document, file_name=file_name)
+        self._put(_Outgoing("send_document", chat_id, None, kwargs, on_done))
+
+    def _put(self, item):
+        if not self._threads:
+            self._deliver_now(item)
+            return
+        with self._cond:
+            chat = self._chats.get(item.chat_id)
+            if chat is None:
+                if len(self._chats) > self._sweep_at:
+                    self._sweep(time.monotonic())
+                chat = self._chats[item.chat_id] = _Chat(self.chat_rate, self.chat_burst)
+            chat.queue.append(item)
+            self._pending += 1
+            if not chat.scheduled and not chat.busy:
+                self._schedule(item.chat_id, chat, time.monotonic())
+
+    def _sweep(self, now):
+        # рассылка по многим чатам оставляет их с неполным запасом токенов,
+        # и при завершении отправки они не удаляются; забываем их здесь
+        idle = [chat_id for chat_id, chat in self._chats.items()
+                if not (chat.queue or chat.scheduled or chat.busy) and chat.bucket.is_full(now)]
+        for chat_id in idle:
+            del self._chats[chat_id]
+        self._sweep_at = max(MAX_IDLE_CHATS, 2 * len(self._chats))
+
+    def _schedule(self, chat_id, chat, ready_at):
+        chat.scheduled = True
+        self._seq += 1
+        heapq.heappush(self._heap, (ready_at, self._seq, chat_id))
+        self._cond.notify()
+
+    def _next_item(self):
+        """Ждет чат, которому можно отправить сообщение, и забирает сообщение."""
+        with self._cond:
+            while True:
+                if self._stopped and self._pending == 0:
+                    return None, None
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                now = time.monotonic()
+                ready_at, _, chat_id = self._heap[0]
+                if ready_at > now:
+                    self._cond.wait(ready_at - now)
+                    continue
+                heapq.heappop(self._heap)
+                chat = self._chats[chat_id]
+                chat.scheduled = False
+                delay = max(chat.bucket.delay(now), self._global.delay(now))
+                if delay > 0:
+                    self._schedule(chat_id, chat, now + delay)
+                    continue
+                chat.bucket.consume(now)
+                self._global.consume(now)
+                item = chat.queue.popleft()
+                while self.coalesce and chat.queue and item.can_absorb(chat.queue[0]):
+                    item.absorb(chat.queue.popleft())
+                    self._pending -= 1
+                    self.stats["coalesced"] += 1
+                chat.busy = True
+                return chat_id, item
+
+    def _work(self):
+        while True:
+            chat_id, item = self._next_item()
+            if item is None:
+                return
+            retry_after = self._deliver(item)
+            with self._cond:
+                chat = self._chats[chat_id]
+                chat.busy = False
+                now = time.monotonic()
+                if retry_after is not None:
+                    chat.queue.appendleft(item)
+                    self._schedule(chat_id, chat, now + retry_after)
+                else:
+                    self._pending -= 1
+                    if chat.queue:
+                        self._schedule(chat_id, chat, now)
+                    elif len(self._chats) > MAX_IDLE_CHATS and chat.bucket.is_full(now):
+                        del self._chats[chat_id]
+                self._cond.notify_all()
+            if retry_after is None:
+                self._finish(item)
+
+    def _call(self, item):
+        if item.method == "send_document":
+            kwargs = dict(item.kwargs)
+            document = kwargs.pop("document")
+            document.seek(0)
+            return self.bot.send_document(
+                item.chat_id, InputFile(document, file_name=kwargs.pop("file_name")), **kwargs
+            )
+        if item.text is None:  # изменение сообщения: все аргументы именованные
+            return getattr(self.bot, item.method)(chat_id=item.chat_id, **item.kwargs)
+        return getattr(self.bot, item.method)(item.chat_id, item.text, **item.kwargs)
+
+    def _deliver(self, item):
+        """
+        Отправляет сообщение.
+
+        Возвращает:
+            float or None: Через сколько секунд повторить или None, если
+                           сообщение отправлено либо отброшено.
+
+        """
+        item.attempts += 1
+        start = time.perf_counter()
+        try:
+            self._call(item)
+        except ApiException as error:
+            HTTP_LATENCY.observe(time.perf_counter() - start, "telegram", "error")
+            # ответ без JSON (например, HTML-страница 502 от балансировщика)
+            # приходит как ApiHTTPException без error_code
+            status = getattr(error, "error_code", None) or getattr(error.result, "status_code", 0)
+            if status == 429:
+                parameters = (getattr(error, "result_json", None) or {}).get("parameters", {})
+                return self._retry(item, float(parameters.get("retry_after", 1)), error)
+            if status >= 500:
+                return self._retry(item, self._backoff(item), error)
+            self._fail(item, error)  # 4xx: пользователь заблокировал бота и т.п.
+            return None
+        except requests.RequestException as error:
+            HTTP_LATENCY.observe(time.perf_counter() - start, "telegram", "error")
+            return self._retry(item, self._backoff(item), error)
+        HTTP_LATENCY.observe(time.perf_counter() - start, "telegram", "ok")
+        item.sent = True
+        with self._cond:
+            self.stats["sent"] += 1
+        return None
+
+    @staticmethod
+    def _finish(item):
+        for callback in item.callbacks:
+            try:
+                callback(item.sent)
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Ошибка обработчика завершения отправки")
+
+    @staticmethod
+    def _backoff(item):
+        return min(30.0, 0.5 * 2 ** (item.attempts - 1))
+
+    def _retry(self, item, delay, error):
+        if item.attempts >= self.max_attempts:
+            self._fail(item, error)
+            return None
+        with self._cond:
+            self.stats["retried"] += 1
+        return delay
+
+    def _fail(self, item, error):
+        with self._cond:
+            self.stats["failed"] += 1
+        logger.warning("Не удалось отправить сообщение в чат %s: %s", item.chat_id, error)
+
+    def _deliver_now(self, item):
+        while True:
+            retry_after = self._deliver(item)
+            if retry_after is None:
+                self._finish(item)
+                return
+            time.sleep(retry_after)
+
+    def pending(self):
+        """Возвращает количество сообщений, ожидающих отправки."""
+        with self._cond:
+            return self._pending
+
+    def drain(self, timeout=None):
+        """
+        Ждет отправки всех сообщений из очереди.
+
+        Параметры:
+            timeout (float or None): Максимальное время ожидания в секундах.
+
+        Возвращает:
+            bool: True, если очередь опустела.
+
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._pending:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout=None):
+        """
+        Дожидается отправки сообщений (не дольше timeout) и останавливает потоки.
+
+        Возвращает:
+            bool: True, если все сообщения были отправлены.
+
+        """
+        drained = self.drain(timeout)
+        with self._cond:
+            self._stopped = True
+            if not drained:
+                # сообщения из очередей отбрасываются без вызова on_done;
+                # отправляемые сейчас дорабатывают
+                busy = sum(chat.busy for chat in self._chats.values())
+                dropped = self._pending - busy
+                for chat in self._chats.values():
+                    chat.queue.clear()
+                    chat.scheduled = False
+                self._heap.clear()
+                self._pending = busy
+                self.stats["dropped"] += dropped
+                logger.warning("Очередь закрыта, не отправлено сообщений: %d", dropped)
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=1)
+        return drained
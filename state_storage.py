@@ -0,0 +1,266 @@
+"""
+Модуль хранилищ состояний бота.
+
+Стандартное хранилище telebot держит состояния MyStates и данные
+retrieve_data в памяти процесса: перезапуск обрывает все незаконченные
+добавления слов и тренировки, а запустить несколько процессов бота нельзя.
+Здесь представлено долговременное хранилище поверх SQLAlchemy (таблица
+bot_states в основной базе данных Postgres или в отдельном файле SQLite)
+с кэшем отложенной записи: в пределах одного обновления состояние читается
+из базы один раз, а все изменения (set_state, retrieve_data) записываются
+одним запросом после завершения обработчика.
+
+Данные состояния хранятся в JSON, а не в pickle: распаковка pickle из базы
+позволила бы любому, кто может писать в таблицу, выполнить код в процессе
+бота. Кроме типов JSON поддерживаются массивы array (идентификаторы слов
+тренировки); прочие значения - ошибка при записи. Таблицу bot_states
+создают миграции (migrations.py), в отдельной базе - STATE_MIGRATIONS.
+"""
+import json
+import threading
+from array import array
+import sqlalchemy as sq
+from telebot.handler_backends import BaseMiddleware
+from telebot.storage import StateStorageBase, StateMemoryStorage
+from telebot.storage.base_storage import StateDataContext
+from models import BotStates, dialect_insert
+from metrics import STATE_STORAGE_LATENCY, timed
+from migrations import STATE_MIGRATIONS, migrate
+
+_ARRAY = "__array__"
+
+
+def _encode(value):
+    if isinstance(value, array):
+        return {_ARRAY: value.typecode, "items": value.tolist()}
+    raise TypeError(f"Значение типа {type(value).__name__} нельзя сохранить в состоянии")
+
+def _decode(obj):
+    if _ARRAY in obj:
+        return array(obj[_ARRAY], obj["items"])
+    return obj
+
+def dump_data(data):
+    """
+    Сериализует данные состояния в JSON.
+
+    Параметры:
+        data (dict): Данные состояния (retrieve_data).
+
+    Возвращает:
+        str: JSON-строка.
+
+    Исключения:
+        TypeError: В данных есть значение, не представимое в JSON.
+
+    """
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=_encode)
+
+def load_data(text):
+    """
+    Восстанавливает данные состояния из JSON.
+
+    Параметры:
+        text (str or None): JSON-строка из bot_states.data.
+
+    Возвращает:
+        dict: Данные состояния.
+
+    """
+    return json.loads(text, object_hook=_decode) if text else {}
+
+
+class SQLStateStorage(StateStorageBase):
+    """
+    Долговременное хранилище состояний с кэшем отложенной записи.
+
+    Кэш живет в пределах обработки одного обновления: первая операция
+    загружает запись пользователя из базы, последующие работают с памятью,
+    а flush() записывает изменения и освобождает запись. Поэтому несколько
+    процессов могут пользоваться одной таблицей, если обновления одного
+    пользователя обрабатываются последовательно.
+
+    Атрибуты:
+        engine: SQLAlchemy engine базы данных с таблицей bot_states
+                (создается миграциями).
+
+    """
+    def __init__(self, engine):
+        super().__init__()
+        self.engine = engine
+        self._cache = {}  # (chat_id, user_id) -> [state, data]
+        self._dirty = set()
+        self._lock = threading.Lock()
+
+    def _entry(self, chat_id, user_id):
+        key = (chat_id, user_id)
+        with self._lock:
+            entry = self._cache.get(key)
+        if entry is not None:
+            return entry
+
+        with timed(STATE_STORAGE_LATENCY, "load"), self.engine.connect() as conn:
+            row = conn.execute(
+                sq.select(BotStates.state, BotStates.data).\
+                    where(BotStates.chat_id == chat_id).\
+                    where(BotStates.user_id == user_id)
+            ).first()
+        if row is None:
+            entry = [None, {}]
+        else:
+            entry = [row.state, load_data(row.data)]
+
+        with self._lock:
+            return self._cache.setdefault(key, entry)
+
+    def _mark_dirty(self, chat_id, user_id):
+        with self._lock:
+            self._dirty.add((chat_id, user_id))
+
+    def set_state(self, chat_id, user_id, state, business_connection_id=None,
+                  message_thread_id=None, bot_id=None):
+        if hasattr(state, "name"):
+            state = state.name
+        self._entry(chat_id, user_id)[0] = state
+        self._mark_dirty(chat_id, user_id)
+        return True
+
+    def get_state(self, chat_id, user_id, business_connection_id=None,
+                  message_thread_id=None, bot_id=None):
+        return self._entry(chat_id, user_id)[0]
+
+    def delete_state(self, chat_id, user_id, business_connection_id=None,
+                     message_thread_id=None, bot_id=None):
+        entry = self._entry(chat_id, user_id)
+        existed = entry[0] is not None or bool(entry[1])
+        entry[0], entry[1] = None, {}
+        self._mark_dirty(chat_id, user_id)
+        return existed
+
+    def set_data(self, chat_id, user_id, key, value, business_connection_id=None,
+                 message_thread_id=None, bot_id=None):
+        self._entry(chat_id, user_id)[1][key] = value
+        self._mark_dirty(chat_id, user_id)
+        return True
+
+    def get_data(self, chat_id, user_id, business_connection_id=None,
+                 message_thread_id=None, bot_id=None):
+        return self._entry(chat_id, user_id)[1]
+
+    def reset_data(self, chat_id, user_id, business_connection_id=None,
+                   message_thread_id=None, bot_id=None):
+        self._entry(chat_id, user_id)[1] = {}
+        self._mark_dirty(chat_id, user_id)
+        return True
+
+    def get_interactive_data(self, chat_id, user_id, business_connection_id=None,
+                             message_thread_id=None, bot_id=None):
+        return StateDataContext(
+            self, chat_id=chat_id, user_id=user_id,
+            business_connection_id=business_connection_id,
+            message_thread_id=message_thread_id, bot_id=bot_id
+        )
+
+    def save(self, chat_id, user_id, data, business_connection_id=None,
+             message_thread_id=None, bot_id=None):
+        self._entry(chat_id, user_id)[1] = data
+        self._mark_dirty(chat_id, user_id)
+        return True
+
+    def _upsert_statement(self):
+        stmt = dialect_insert(self.engine, BotStates)
+        if stmt is None:
+            return None
+        return stmt.on_conflict_do_update(
+            index_elements=[BotStates.chat_id, BotStates.user_id],
+            set_={"state": stmt.excluded.state, "data": stmt.excluded.data}
+        )
+
+    def flush(self, user_id=None):
+        """
+        Записывает накопленные изменения одной транзакцией и очищает кэш.
+
+        Параметры:
+            user_id (int or None): Пользователь, чьи записи нужно сбросить
+                                   (None - сбросить все).
+
+        """
+        with self._lock:
+            keys = [key for key in self._cache
+                    if user_id is None or key[1] == user_id]
+            entries = {key: self._cache.pop(key) for key in keys}
+            dirty = [key for key in keys if key in self._dirty]
+            self._dirty.difference_update(dirty)
+        if not dirty:
+            return
+
+        to_delete, to_write = [], []
+        for chat_id, uid in dirty:
+            state, data = entries[(chat_id, uid)]
+            if state is None and not data:
+                to_delete.append((chat_id, uid))
+            else:
+                to_write.append({"chat_id": chat_id, "user_id": uid, "state": state,
+                                 "data": dump_data(data)})
+
+        with timed(STATE_STORAGE_LATENCY, "flush"), self.engine.begin() as conn:
+            for chat_id, uid in to_delete:
+                conn.execute(sq.delete(BotStates).\
+                    where(BotStates.chat_id == chat_id).\
+                    where(BotStates.user_id == uid))
+            if to_write:
+                upsert = self._upsert_statement()
+                if upsert is not None:
+                    conn.execute(upsert, to_write)
+                else:  # прочие СУБД: удаляем и вставляем заново
+                    for row in to_write:
+                        conn.execute(sq.delete(BotStates).\
+                            where(BotStates.chat_id == row["chat_id"]).\
+                            where(BotStates.user_id == row["user_id"]))
+                    conn.execute(sq.insert(BotStates), to_write)
+
+
+class StateFlushMiddleware(BaseMiddleware):
+    """
+    Middleware, записывающее изменения состояния пользователя в хранилище
+    после обработки каждого обновления: сообщения или нажатия inline-кнопки
+    (inline-запросы состояние не меняют).
+
+    Атрибуты:
+        storage (SQLStateStorage): Хранилище с кэшем отложенной записи.
+
+    """
+    def __init__(self, storage):
+        super().__init__()
+        self.update_types = ["message", "callback_query"]
+        self.storage = storage
+
+    def pre_process(self, message, data):
+        pass
+
+    def post_process(self, message, data, exception):
+        self.storage.flush(message.from_user.id)
+
+
+def create_state_storage(kind, engine):
+    """
+    Создает хранилище состояний по значению параметра STATE_STORAGE.
+
+    Параметры:
+        kind (str or None): "memory" (по умолчанию) - хранилище telebot в памяти;
+                            "db" - таблица bot_states в основной базе данных;
+                            иначе - URL SQLAlchemy отдельной базы
+                            (например, sqlite:///states.db).
+        engine: SQLAlchemy engine основной базы данных.
+
+    Возвращает:
+        StateStorageBase: Хранилище состояний для telebot.TeleBot.
+
+    """
+    if not kind or kind == "memory":
+        return StateMemoryStorage()
+    if kind == "db":
+        return SQLStateStorage(engine)  # таблицу создали миграции основной базы
+    states_engine = sq.create_engine(kind)
+    migrate(states_engine, STATE_MIGRATIONS)
+    return SQLStateStorage(states_engine)
@@ -0,0 +1,83 @@
+"""Тесты журнала ответов тренировки (answers.py)."""
+import threading
+from datetime import datetime
+import pytest
+import sqlalchemy as sq
+from sqlalchemy.orm import sessionmaker
+from answers import AnswerLog
+from migrations import migrate
+from models import AnswerEvents, UserStats, Users
+
+ANSWERED_AT = datetime(2024, 1, 1)
+USERS = range(101, 111)
+
+
+@pytest.fixture(name="engine")
+def fixture_engine(tmp_path):
+    engine = sq.create_engine(f"sqlite:///{tmp_path / 'bot.db'}")
+    migrate(engine)
+    with engine.begin() as conn:
+        conn.execute(sq.insert(Users), [{"id": user_id, "tg_id": user_id, "name": "u"}
+                                        for user_id in USERS])
+    yield engine
+    engine.dispose()
+
+
+def logged(engine):
+    with engine.connect() as conn:
+        return conn.execute(
+            sq.select(AnswerEvents.user_id, AnswerEvents.word_id).order_by(AnswerEvents.id)
+        ).all()
+
+
+def test_close_writes_every_buffered_event(engine):
+    # пачка и интервал больше теста: все события остаются в буфере до close
+    answer_log = AnswerLog(sessionmaker(bind=engine), batch_size=10_000, interval=60)
+
+    def answer(user_id):
+        for word_id in range(100):
+            answer_log.record(user_id, word_id, word_id % 3 == 0, ANSWERED_AT)
+
+    threads = [threading.Thread(target=answer, args=(user_id,)) for user_id in USERS]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert answer_log.pending() == 1000
+    assert answer_log.close(timeout=10)
+
+    events = logged(engine)
+    assert len(events) == 1000
+    for user_id in USERS:  # порядок ответов каждого пользователя сохранен
+        assert [word_id for owner, word_id in events if owner == user_id] == list(range(100))
+    with engine.connect() as conn:
+        assert conn.scalar(sq.select(sq.func.sum(UserStats.answers))) == 1000
+
+
+def test_rejected_event_does_not_block_later_batches(engine):
+    answer_log = AnswerLog(sessionmaker(bind=engine), interval=60)
+    for word_id in range(8):
+        # word_id NOT NULL: база данных никогда не примет это событие
+        answer_log.record(101, None if word_id == 5 else word_id, True, ANSWERED_AT)
+    assert answer_log.flush() == 7
+    answer_log.record(101, 8, True, ANSWERED_AT)
+    assert answer_log.flush() == 1
+    answer_log.close()
+
+    assert [word_id for _, word_id in logged(engine)] == [0, 1, 2, 3, 4, 6, 7, 8]
+    assert answer_log.stats["dropped"] == 1 and answer_log.pending() == 0
+
+
+def test_unavailable_database_keeps_bounded_buffer(engine, tmp_path):
+    unavailable = sq.create_engine(f"sqlite:///{tmp_path / 'missing' / 'bot.db'}")
+    answer_log = AnswerLog(sessionmaker(bind=unavailable), interval=60, max_pending=50)
+    for word_id in range(30):
+        answer_log.record(101, word_id, True, ANSWERED_AT)
+    assert answer_log.flush() == 0 and answer_log.pending() == 30  # события не потеряны
+    for word_id in range(30, 80):
+        answer_log.record(101, word_id, True, ANSWERED_AT)
+    assert answer_log.pending() == 50 and answer_log.stats["dropped"] == 30
+
+    answer_log.session_factory = sessionmaker(bind=engine)  # база снова доступна
+    assert answer_log.close()
+    assert [word_id for _, word_id in logged(engine)] == list(range(30, 80))
@@ -0,0 +1,58 @@
+"""Тесты режима вебхука (async_bot.py)."""
+import pytest
+import requests
+from telebot import apihelper
+from telebot.handler_backends import BaseMiddleware
+from replay import StubServer, WebhookServer, generate_trace, replay
+
+pytest.importorskip("aiohttp")
+
+
+def test_webhook_runs_same_handlers_as_polling():
+    updates = list(generate_trace(20, 5, seed=3))
+    polling = replay(updates, stub_latency=0.0)
+    webhook = replay(updates, stub_latency=0.0, webhook=True)
+
+    assert polling["completed"] and webhook["completed"]
+    # счетчики обработчиков накапливаются за обе прогонки в одном процессе;
+    # число sendMessage зависит от склеивания сообщений очередью и не сравнивается
+    assert {name: stats["count"] for name, stats in webhook["handlers"].items()} == \
+        {name: 2 * stats["count"] for name, stats in polling["handlers"].items()}
+    assert webhook["api_calls"]["lookup"] == polling["api_calls"]["lookup"]
+
+
+def test_webhook_keeps_order_of_user_updates(tmp_path):
+    import tg_bot  # pylint: disable=import-outside-toplevel
+
+    stub = StubServer()
+    apihelper.API_URL = stub.api_url
+    bot = tg_bot.create_app({
+        "TOKEN": "0:test", "DSN": f"sqlite:///{tmp_path / 'bot.db'}",
+        "TRANSLATE_URL": stub.translate_url, "LANES": 2, "SEND_WORKERS": 0,
+    })
+    order = []
+
+    class Order(BaseMiddleware):
+        update_types = ["message"]
+
+        def pre_process(self, message, data):
+            order.append((message.from_user.id, message.message_id))
+
+        def post_process(self, message, data, exception):
+            pass
+
+    bot.setup_middleware(Order())
+    server = WebhookServer(bot)
+    updates = list(generate_trace(5, 10, seed=4))
+    with requests.Session() as http:
+        for update in updates:
+            raw = {key: value for key, value in update.items() if key != "recorded_at"}
+            http.post(server.url, json=raw, timeout=10).raise_for_status()
+    server.close()  # дожидается обработки принятых обновлений
+    tg_bot.shutdown()
+    stub.close()
+
+    assert len(order) == len(updates)
+    for user in {user for user, _ in order}:
+        received = [message_id for owner, message_id in order if owner == user]
+        assert received == sorted(received)
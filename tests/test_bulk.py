@@ -0,0 +1,34 @@
+"""Тесты массового импорта словаря (bulk.py)."""
+import pytest
+import sqlalchemy as sq
+from bulk import import_pairs
+from migrations import migrate
+from models import Reviews, Users, Vocabulary
+
+
+@pytest.fixture(name="engine")
+def fixture_engine(tmp_path):
+    engine = sq.create_engine(f"sqlite:///{tmp_path / 'bot.db'}")
+    migrate(engine)
+    yield engine
+    engine.dispose()
+
+
+def test_imported_counts_only_new_vocabulary_rows(engine):
+    with engine.begin() as conn:
+        user_id = conn.execute(sq.insert(Users).values(tg_id=1000, name="u")).\
+            inserted_primary_key[0]
+
+    pairs = [("cat", "кошка"), ("dog", "собака"), ("Cat", "кошка"), ("1", "2")]
+    result = import_pairs(engine, user_id, pairs, chunk_size=2)
+    assert result == {"rows": 4, "imported": 2, "invalid": 1}
+
+    # повторный импорт и уже существующая общая пара (шаг миграции 2)
+    again = import_pairs(engine, user_id, pairs + [("oven", "духовка"), ("bird", "птица")])
+    assert again == {"rows": 6, "imported": 2, "invalid": 1}
+    with engine.connect() as conn:
+        assert conn.scalar(sq.select(sq.func.count()).select_from(Vocabulary).
+                           where(Vocabulary.user_id == user_id)) == 4
+        # карточки повторения создаются вместе со словами
+        assert conn.scalar(sq.select(sq.func.count()).select_from(Reviews).
+                           where(Reviews.user_id == user_id)) == 4
@@ -0,0 +1,86 @@
+"""Тесты постраничного просмотра словаря (models.dictionary_page) на 50 000 слов."""
+import statistics
+import time
+import tracemalloc
+import pytest
+import sqlalchemy as sq
+from sqlalchemy.orm import Session
+from db import assert_max_queries
+from migrations import DEFAULT_WORDS, migrate
+from models import Users, Vocabulary, Words, dictionary_page, user_cache
+from tg_bot import render_dictionary_page
+
+WORDS = 50_000
+PAGE = 30
+TG_ID = 1000
+
+
+@pytest.fixture(name="session", scope="module")
+def fixture_session(tmp_path_factory):
+    engine = sq.create_engine(f"sqlite:///{tmp_path_factory.mktemp('pages') / 'bot.db'}")
+    migrate(engine)
+    with engine.begin() as conn:
+        user_id = conn.execute(sq.insert(Users).values(tg_id=TG_ID, name="u")).\
+            inserted_primary_key[0]
+        first = conn.scalar(sq.select(sq.func.max(Words.id))) + 1
+        conn.execute(sq.insert(Words), [
+            {"id": first + number, "target": f"word{number:05}", "translation": "слово"}
+            for number in range(WORDS)
+        ])
+        conn.execute(sq.insert(Vocabulary), [
+            {"user_id": user_id, "word_id": first + number} for number in range(WORDS)
+        ])
+    user_cache.clear()
+    with Session(engine) as session:
+        yield session
+    user_cache.clear()
+    engine.dispose()
+
+
+def page_time(session, anchor_id, repeat=20):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        dictionary_page(session, TG_ID, anchor_id, limit=PAGE + 1)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def test_pages_cover_dictionary_in_order(session):
+    seen, anchor_id = [], None
+    while True:
+        rows = dictionary_page(session, TG_ID, anchor_id, limit=PAGE)
+        if not rows:
+            break
+        assert len(render_dictionary_page(rows)) < 4096  # ограничение Telegram
+        seen.extend((target, word_id) for word_id, target, _ in rows)
+        anchor_id = rows[-1][0]
+    assert len(seen) == WORDS + len(DEFAULT_WORDS)
+    assert seen == sorted(seen)
+
+    # назад от последней страницы
+    back = dictionary_page(session, TG_ID, anchor_id, backwards=True, limit=PAGE)
+    assert [(target, word_id) for word_id, target, _ in back] == seen[-PAGE - 1:-1]
+
+
+def test_deep_page_costs_as_much_as_first(session):
+    last = dictionary_page(session, TG_ID, limit=WORDS + len(DEFAULT_WORDS))
+    deep_anchor = last[-PAGE * 2][0]  # предпоследняя страница
+    dictionary_page(session, TG_ID, limit=PAGE + 1)  # пользователи в кэше
+
+    with assert_max_queries(session.get_bind(), 1):
+        dictionary_page(session, TG_ID, deep_anchor, limit=PAGE + 1)
+    first, deep = page_time(session, None), page_time(session, deep_anchor)
+    assert deep < first * 3 + 0.002, (first, deep)
+
+
+def test_page_memory_does_not_grow_with_dictionary(session):
+    anchor_id = dictionary_page(session, TG_ID, limit=WORDS // 2)[-1][0]
+    render_dictionary_page(dictionary_page(session, TG_ID, anchor_id, limit=PAGE + 1))
+
+    tracemalloc.start()
+    render_dictionary_page(dictionary_page(session, TG_ID, anchor_id, limit=PAGE + 1))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    # весь словарь в памяти занял бы несколько мегабайт
+    assert peak < 256 * 1024, peak
@@ -0,0 +1,72 @@
+"""Тесты подбора дистракторов (distractors.py)."""
+from distractors import DistractorEngine, part_of_speech
+
+SHARED = [(1, "run", "бежать"), (2, "lie", "лежать"), (3, "walk", "ходить"),
+          (4, "table", "стол"), (5, "green", "зеленый"), (6, "speak", "говорить")]
+OWN = [(10, "dash", "бежать"), (11, "plant", "сажать"), (12, "hold", "держать")]
+USER = 42
+
+
+def make_engine(words=None):
+    words = {0: SHARED, USER: OWN} if words is None else words
+    loads = []
+
+    def loader(session, tg_id):  # pylint: disable=unused-argument
+        loads.append(tg_id)
+        return words.get(tg_id, ())
+
+    engine = DistractorEngine(loader)
+    engine.loads = loads
+    return engine
+
+
+def test_pick_excludes_target_and_same_translation():
+    engine = make_engine()
+    for _ in range(50):
+        picked = engine.pick(None, USER, 1)
+        assert len(picked) == len(set(picked)) == 3
+        assert 1 not in picked and 10 not in picked  # загаданное слово и "бежать"
+    assert engine.loads == [0, USER]  # индексы строятся один раз
+
+
+def test_pick_prefers_similar_words():
+    engine = make_engine()
+    for _ in range(50):
+        assert sorted(engine.pick(None, USER, 1)) == [2, 11, 12]  # глаголы на "-жать"
+    assert part_of_speech("бежать") == "verb" and part_of_speech("стол") == "noun"
+
+
+def test_pick_returns_none_when_too_few_words():
+    engine = make_engine({0: [(1, "run", "бежать"), (2, "dash", "бежать"), (3, "lie", "лежать")]})
+    assert engine.pick(None, USER, 1, count=1) == [3]
+    assert engine.pick(None, USER, 1, count=2) is None
+    assert engine.pick(None, USER, 99) is None  # слова нет в индексах
+
+
+def test_pick_after_remove_and_rebuild():
+    engine = make_engine()
+    engine.pick(None, USER, 1)
+    index = engine._get(None, USER)  # pylint: disable=protected-access
+    engine.remove(USER, 11)
+    assert index.stale == 1  # удаление ленивое
+    for _ in range(50):
+        assert 11 not in engine.pick(None, USER, 1)
+
+    engine.remove(USER, 12)
+    engine.remove(USER, 10)  # устаревших записей больше, чем живых слов
+    assert index.stale == 0 and len(index) == 0
+    assert not index._lists  # pylint: disable=protected-access
+    for _ in range(50):
+        assert sorted(engine.pick(None, USER, 1)) == [2, 3, 6]  # остались общие глаголы
+
+    engine.add(USER, 13, "пожать")
+    assert 13 in engine.pick(None, USER, 1)
+    assert engine.loads == [0, USER]
+
+
+def test_invalidate_reloads_user_words():
+    engine = make_engine()
+    engine.pick(None, USER, 1)
+    engine.invalidate(USER)
+    engine.pick(None, USER, 1)
+    assert engine.loads == [0, USER, USER]
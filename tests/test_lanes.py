@@ -0,0 +1,92 @@
+"""Нагрузочные тесты обработки обновлений по дорожкам пользователей (lanes.py)."""
+import threading
+import time
+import sqlalchemy as sq
+import telebot
+from telebot import apihelper
+from telebot.types import Update
+import tg_bot
+from common import Commands, MyStates
+from lanes import use_lanes
+from models import AnswerEvents, Users
+from replay import StubServer
+
+USERS = 20
+ANSWERS = 10
+
+
+def message(update_id, user_id, text):
+    return Update.de_json({"update_id": update_id, "message": {
+        "message_id": update_id, "date": 1, "text": text,
+        "chat": {"id": user_id, "type": "private"},
+        "from": {"id": user_id, "is_bot": False, "first_name": "u"},
+        **({"entities": [{"type": "bot_command", "offset": 0, "length": len(text)}]}
+           if text.startswith("/") else {}),
+    }})
+
+
+def test_interleaved_answers_keep_training_state(tmp_path):
+    stub = StubServer(latency=0.002)  # ответы Bot API не мгновенные
+    apihelper.API_URL = stub.api_url
+    bot = tg_bot.create_app({
+        "TOKEN": "0:test", "DSN": f"sqlite:///{tmp_path / 'bot.db'}",
+        "TRANSLATE_URL": stub.translate_url, "LANES": 4, "SEND_WORKERS": 0,
+        "TRAINING_INLINE": False,
+    })
+    users = range(1000, 1000 + USERS)
+    update_id = 0
+    # пользователи начинают тренировку, затем быстро отвечают неправильно;
+    # обновления разных пользователей перемешаны
+    for text in ["/start", "u", Commands.TRAIN, Commands.YES] + ["не перевод"] * ANSWERS:
+        batch = []
+        for user_id in users:
+            update_id += 1
+            batch.append(message(update_id, user_id, text))
+        bot.process_new_updates(batch)
+    assert bot.worker_pool.drain(60)
+    tg_bot.answer_log.flush()
+
+    with tg_bot.engine.connect() as conn:
+        answers = dict(conn.execute(
+            sq.select(Users.tg_id, sq.func.count()).\
+                join(AnswerEvents, AnswerEvents.user_id == Users.id).\
+                    group_by(Users.tg_id)
+        ).all())
+    for user_id in users:
+        assert bot.get_state(user_id, user_id) == MyStates.training_check.name
+        with bot.retrieve_data(user_id, user_id) as data:
+            assert data["wrong_attempts"] == ANSWERS  # ни один ответ не потерян
+    assert answers == dict.fromkeys(users, ANSWERS)
+    tg_bot.shutdown()
+    stub.close()
+
+
+def process_all(lanes, updates, handler_delay):
+    """Обрабатывает обновления на lanes дорожках; возвращает (время, порядок)."""
+    bot = telebot.TeleBot("0:test", num_threads=1)
+    pool = use_lanes(bot, lanes, queue_size=0)
+    order, lock = [], threading.Lock()
+
+    @bot.message_handler(func=lambda msg: True)
+    def handle(msg):
+        time.sleep(handler_delay)  # ожидание внешнего API или базы данных
+        with lock:
+            order.append((msg.from_user.id, msg.message_id))
+
+    started = time.perf_counter()
+    bot.process_new_updates(updates)
+    assert pool.drain(30)
+    elapsed = time.perf_counter() - started
+    pool.stop(5)
+    return elapsed, order
+
+
+def test_throughput_scales_with_lanes():
+    updates = [message(number, 1000 + number % USERS, "ответ") for number in range(200)]
+    one, _ = process_all(1, updates, 0.005)
+    four, order = process_all(4, updates, 0.005)
+
+    assert one / four > 2.5, (one, four)
+    for user_id in {user_id for user_id, _ in order}:
+        received = [message_id for owner, message_id in order if owner == user_id]
+        assert received == sorted(received)
@@ -0,0 +1,203 @@
+"""Тесты штатной остановки и передачи получения обновлений (lifecycle.py)."""
+import json
+import signal
+import threading
+import time
+import pytest
+import requests
+import sqlalchemy as sq
+from sqlalchemy.orm import sessionmaker
+import telebot
+from telebot.apihelper import ApiHTTPException
+import lifecycle
+from lanes import use_lanes
+from lifecycle import Poller
+from migrations import migrate
+from models import PollingState
+
+TOKEN = "1:test"
+
+
+class FakeTelegram:
+    """
+    Источник обновлений для getUpdates: как и Telegram, отдает обновления
+    после offset и забывает подтвержденные (с update_id < offset).
+    """
+    def __init__(self, count, users=5):
+        self.updates = [{
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id, "date": 0, "text": str(update_id),
+                "chat": {"id": update_id % users + 1, "type": "private"},
+                "from": {"id": update_id % users + 1, "is_bot": False, "first_name": "u"},
+            },
+        } for update_id in range(1, count + 1)]
+        self._lock = threading.Lock()
+
+    def get_updates(self, token, offset=None, timeout=None, allowed_updates=None,
+                    long_polling_timeout=None):  # pylint: disable=unused-argument
+        with self._lock:
+            self.updates = [update for update in self.updates if update["update_id"] >= offset]
+            batch = self.updates[:10]
+        if not batch:
+            time.sleep(0.01)
+        return batch
+
+
+@pytest.fixture(name="session_factory")
+def fixture_session_factory(tmp_path):
+    engine = sq.create_engine(f"sqlite:///{tmp_path / 'bot.db'}")
+    migrate(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture(name="telegram")
+def fixture_telegram(monkeypatch):
+    telegram = FakeTelegram(200)
+    monkeypatch.setattr(lifecycle.apihelper, "get_updates", telegram.get_updates)
+    # сигналы в тесте подает сам тест (Poller.run выполняется не в главном потоке)
+    monkeypatch.setattr(lifecycle.signal, "signal", lambda signum, handler: None)
+    return telegram
+
+
+def start_poller(session_factory, handled, owner, handler=None, **kwargs):
+    """
+    Запускает Poller в отдельном потоке.
+
+    Параметры:
+        session_factory: Фабрика сессий.
+        handled (list): Список, в который записываются (owner, update_id)
+                        обработанных сообщений.
+        owner (str): Имя процесса "хост:pid".
+        handler: Дополнительная функция handler(message) или None.
+
+    Возвращает:
+        tuple: (Poller, поток).
+
+    """
+    bot = telebot.TeleBot(TOKEN, num_threads=0)
+    pool = use_lanes(bot, lanes=2)
+
+    @bot.message_handler(func=lambda message: True)
+    def record(message):
+        if handler is not None:
+            handler(message)
+        time.sleep(0.01)
+        handled.append((owner, int(message.text)))
+
+    poller = Poller(bot, session_factory, pool, long_poll=0, **kwargs)
+    poller.owner = owner
+    thread = threading.Thread(target=poller.run, daemon=True)
+    thread.start()
+    return poller, thread
+
+
+def wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "условие не выполнилось"
+        time.sleep(0.01)
+
+
+def test_sigterm_handover_processes_every_update_once(session_factory, telegram):
+    handled = []
+    old, old_thread = start_poller(session_factory, handled, "old:1", drain_timeout=5.0)
+    wait_for(lambda: len(handled) >= 30)
+    new, new_thread = start_poller(session_factory, handled, "new:2", drain_timeout=5.0)
+    old._on_signal(signal.SIGTERM, None)  # pylint: disable=protected-access
+    old_thread.join(10)
+    wait_for(lambda: len(handled) >= 200)
+    new.stop()
+    new_thread.join(10)
+
+    update_ids = [update_id for _, update_id in handled]
+    assert sorted(update_ids) == list(range(1, 201))
+    assert {owner for owner, _ in handled} == {"old:1", "new:2"}
+    assert old.reason == "SIGTERM" and not telegram.updates
+    # обновления одного пользователя обработаны по порядку
+    for user in range(5):
+        own = [update_id for update_id in update_ids if update_id % 5 == user]
+        assert own == sorted(own)
+
+
+def test_started_update_is_not_handed_over(session_factory, telegram):  # pylint: disable=unused-argument
+    handled = []
+    release = threading.Event()
+
+    def block(message):
+        if message.text == "7":
+            release.wait(5)
+
+    old, old_thread = start_poller(session_factory, handled, "old:1", handler=block,
+                                   drain_timeout=0.2)
+    wait_for(lambda: 7 in old._started)  # pylint: disable=protected-access
+    old.stop("SIGTERM")
+    old_thread.join(10)
+    release.set()
+
+    session = session_factory()
+    state = session.get(PollingState, 1)
+    pending = [update["update_id"] for update in json.loads(state.pending or "[]")]
+    session.close()
+    assert old.stats["unfinished"] >= 1  # 7-е и, возможно, выполняемое на другой дорожке
+    assert 7 not in pending
+    # обновления, стоявшие в очереди дорожки за 7-м, переданы
+    assert 9 in pending
+    wait_for(lambda: (old.owner, 7) in handled)
+
+    new, new_thread = start_poller(session_factory, handled, "new:2")
+    wait_for(lambda: len(handled) >= 200)
+    new.stop()
+    new_thread.join(10)
+    assert sorted(update_id for _, update_id in handled) == list(range(1, 201))
+
+
+def test_shutdown_keeps_row_of_new_owner(session_factory, telegram):  # pylint: disable=unused-argument
+    handled = []
+    old, old_thread = start_poller(session_factory, handled, "old:1")
+    wait_for(lambda: len(handled) >= 20)
+    session = session_factory()
+    # новый процесс забрал получение обновлений по истечении handover_timeout
+    session.execute(sq.update(PollingState).values(owner="new:2", last_update_id=5))
+    session.commit()
+    old.stop("SIGTERM")
+    old_thread.join(10)
+
+    state = session.get(PollingState, 1, populate_existing=True)
+    assert (state.owner, state.last_update_id) == ("new:2", 5)
+    assert state.released_at is None and state.pending is None
+    session.close()
+
+
+def test_last_update_id_is_saved_while_running(session_factory, telegram):  # pylint: disable=unused-argument
+    handled = []
+    poller, thread = start_poller(session_factory, handled, "old:1")
+    wait_for(lambda: len(handled) >= 200)
+    session = session_factory()
+    wait_for(lambda: session.get(PollingState, 1, populate_existing=True).last_update_id == 200)
+    assert session.get(PollingState, 1).released_at is None
+    session.close()
+    poller.stop()
+    thread.join(10)
+
+
+def test_polling_survives_html_error_responses(session_factory, telegram, monkeypatch):
+    bad_gateway = requests.Response()
+    bad_gateway.status_code, bad_gateway.reason = 502, "Bad Gateway"
+    bad_gateway._content = b"<html><body>502 Bad Gateway</body></html>"  # pylint: disable=protected-access
+    failures = [ApiHTTPException("getUpdates", bad_gateway), ValueError("неожиданный ответ")]
+
+    def get_updates(*args, **kwargs):
+        if failures:
+            raise failures.pop(0)
+        return telegram.get_updates(*args, **kwargs)
+
+    monkeypatch.setattr(lifecycle.apihelper, "get_updates", get_updates)
+    handled = []
+    poller, thread = start_poller(session_factory, handled, "old:1")
+    wait_for(lambda: len(handled) >= 200)
+    assert thread.is_alive() and not failures
+    poller.stop()
+    thread.join(10)
+    assert sorted(update_id for _, update_id in handled) == list(range(1, 201))
@@ -0,0 +1,95 @@
+"""Тесты метрик Prometheus (metrics.py): формат вывода и HTTP-сервер."""
+import requests
+import sqlalchemy as sq
+from telebot.types import Message
+import metrics
+from metrics import Counter, Gauge, Histogram, MetricsMiddleware, Profiler
+
+
+def test_histogram_renders_cumulative_buckets_per_label():
+    histogram = Histogram("test_seconds", "Тест", ("handler",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, "add")
+    histogram.observe(0.2, "delete")
+
+    assert histogram.render() == [
+        "# HELP test_seconds Тест",
+        "# TYPE test_seconds histogram",
+        'test_seconds_bucket{handler="add",le="0.1"} 2',  # граница включается
+        'test_seconds_bucket{handler="add",le="1.0"} 3',
+        'test_seconds_bucket{handler="add",le="+Inf"} 4',
+        'test_seconds_sum{handler="add"} 3.65',
+        'test_seconds_count{handler="add"} 4',
+        'test_seconds_bucket{handler="delete",le="0.1"} 0',
+        'test_seconds_bucket{handler="delete",le="1.0"} 1',
+        'test_seconds_bucket{handler="delete",le="+Inf"} 1',
+        'test_seconds_sum{handler="delete"} 0.2',
+        'test_seconds_count{handler="delete"} 1',
+    ]
+    assert histogram.snapshot()[("add",)] == ((2, 1), 3.65, 4)
+
+
+def test_counter_and_gauge_render_labels():
+    counter = Counter("test_total", "Счетчик", ("type", "result"))
+    counter.inc("message", "ok")
+    counter.inc("message", "ok", amount=2)
+    counter.inc("callback_query", "error")
+    gauge = Gauge("test_queue", "Очередь", ("lane",), lambda: {("1",): 3, ("0",): 0})
+
+    assert counter.render()[1:] == [
+        "# TYPE test_total counter",
+        'test_total{type="callback_query",result="error"} 1',
+        'test_total{type="message",result="ok"} 3',
+    ]
+    assert gauge.render()[1:] == [
+        "# TYPE test_queue gauge", 'test_queue{lane="0"} 0', 'test_queue{lane="1"} 3',
+    ]
+
+
+def test_update_counts_queries_and_rows():
+    engine = sq.create_engine("sqlite://")
+    metrics.instrument_engine(engine)
+    with engine.begin() as conn:
+        conn.execute(sq.text("CREATE TABLE t (x INTEGER)"))
+    before = metrics.UPDATE_QUERIES.snapshot().get((), ((), 0, 0))
+    middleware = MetricsMiddleware()
+    message = Message.de_json({
+        "message_id": 1, "date": 1, "text": "x", "chat": {"id": 1, "type": "private"},
+        "from": {"id": 1, "is_bot": False, "first_name": "u"},
+    })
+    data = {}
+    middleware.pre_process(message, data)
+    with engine.begin() as conn:
+        conn.execute(sq.text("INSERT INTO t VALUES (1), (2), (3)"))
+        conn.execute(sq.text("SELECT x FROM t")).all()
+    middleware.post_process(message, data, None)
+    engine.dispose()
+
+    after = metrics.UPDATE_QUERIES.snapshot()[()]
+    assert after[2] == before[2] + 1  # одно обновление
+    assert after[1] == before[1] + 2  # с двумя запросами
+
+
+def test_metrics_server_serves_metrics_and_profiles():
+    profiler = Profiler(slowest=1)
+    profile = profiler.start()
+    sum(range(1000))
+    profiler.stop(profile, 0.5, "message 'медленное'")
+    metrics.ERRORS.inc("ValueError")
+    server = metrics.start_metrics_server(0, profiler=profiler)
+    host, port = server.server_address[:2]
+    try:
+        response = requests.get(f"http://{host}:{port}/metrics", timeout=5)
+        profiles = requests.get(f"http://{host}:{port}/profiles", timeout=5)
+        missing = requests.get(f"http://{host}:{port}/other", timeout=5)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert response.status_code == 200
+    assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+    for metric in metrics.REGISTRY:
+        assert f"# TYPE {metric.name} " in response.text
+    assert 'bot_handler_errors_total{type="ValueError"}' in response.text
+    assert profiles.status_code == 200 and "=== 0.500 s: message 'медленное'" in profiles.text
+    assert missing.status_code == 404
@@ -0,0 +1,249 @@
+"""Тесты миграций схемы базы данных (migrations.py)."""
+import sqlalchemy as sq
+from migrations import MIGRATIONS, DEFAULT_WORDS, current_version, migrate
+
+# схема базы данных до появления миграций (models.py исходной версии бота,
+# таблицы создавались create_tables при каждом запуске)
+BASELINE = sq.MetaData()
+sq.Table(
+    "users", BASELINE,
+    sq.Column("id", sq.Integer, primary_key=True),
+    sq.Column("tg_id", sq.BigInteger, unique=True, nullable=False),
+    sq.Column("name", sq.String(length=75), nullable=True),
+)
+sq.Table(
+    "words", BASELINE,
+    sq.Column("id", sq.Integer, primary_key=True),
+    sq.Column("target", sq.String(length=120), nullable=False),
+    sq.Column("translation", sq.String(length=120), nullable=False),
+)
+sq.Table(
+    "vocabulary", BASELINE,
+    sq.Column("id", sq.Integer, primary_key=True),
+    sq.Column("user_id", sq.Integer, sq.ForeignKey("users.id"), nullable=False),
+    sq.Column("word_id", sq.Integer, sq.ForeignKey("words.id"), nullable=False),
+)
+
+
+def create_baseline_database(engine, pairs=()):
+    """
+    Создает базу данных исходной версии бота: общие слова и пользователя
+    с собственными словами (каждое добавление - новая строка words).
+
+    Параметры:
+        engine: SQLAlchemy engine.
+        pairs: Пары (target, translation) пользователя с tg_id 42.
+
+    """
+    users, words, vocabulary = (BASELINE.tables[name] for name in ("users", "words", "vocabulary"))
+    BASELINE.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(users.insert(), [{"id": 1, "tg_id": 0, "name": "everybody"},
+                                      {"id": 2, "tg_id": 42, "name": "Вася"}])
+        rows = [(1, target, translation) for target, translation in DEFAULT_WORDS]
+        rows += [(2, target, translation) for target, translation in pairs]
+        for word_id, (user_id, target, translation) in enumerate(rows, start=1):
+            conn.execute(words.insert().values(id=word_id, target=target,
+                                               translation=translation))
+            conn.execute(vocabulary.insert().values(user_id=user_id, word_id=word_id))
+
+
+def test_migrate_baseline_database_to_head(tmp_path):
+    engine = sq.create_engine(f"sqlite:///{tmp_path / 'baseline.db'}")
+    create_baseline_database(engine, [("apple", "яблоко"), ("pear", "груша")])
+
+    applied = migrate(engine)
+
+    assert applied == [number for number, _, _ in MIGRATIONS]
+    with engine.connect() as conn:
+        assert current_version(conn) == MIGRATIONS[-1][0]
+        assert conn.scalar(sq.text("SELECT count(*) FROM users")) == 2
+        assert conn.scalar(sq.text("SELECT count(*) FROM users WHERE tg_id = 0")) == 1
+        # общие слова не добавлены повторно
+        assert conn.scalar(sq.text("SELECT count(*) FROM words")) == len(DEFAULT_WORDS) + 2
+        assert conn.scalar(sq.text("SELECT count(*) FROM vocabulary")) == len(DEFAULT_WORDS) + 2
+        # столбцы, добавленные миграциями, доступны моделям
+        assert conn.scalar(
+            sq.text("SELECT count(*) FROM users WHERE last_active_at IS NOT NULL")
+        ) == 2
+
+
+def test_migrate_empty_database_seeds_default_words(tmp_path):
+    engine = sq.create_engine(f"sqlite:///{tmp_path / 'new.db'}")
+
+    migrate(engine)
+
+    with engine.connect() as conn:
+        rows = conn.execute(sq.text(
+            "SELECT w.target, w.translation FROM words w "
+            "JOIN vocabulary v ON v.word_id = w.id "
+            "JOIN users u ON u.id = v.user_id WHERE u.tg_id = 0 ORDER BY w.id"
+        )).all()
+    assert [tuple(row) for row in rows] == DEFAULT_WORDS
+
+
+def _startup(path):
+    """Запускает приложение бота на файле SQLite и останавливает его."""
+    import tg_bot
+    tg_bot.create_app({"TOKEN": "0:test", "DSN": f"sqlite:///{path}", "SEND_WORKERS": 0})
+    return tg_bot
+
+
+def test_second_startup_issues_no_ddl_and_keeps_rows(tmp_path):
+    from models import add_word_to_vocabulary
+    path = tmp_path / "bot.db"
+    app = _startup(path)
+    session = app.Session()
+    add_word_to_vocabulary(session, 1, "apple", "яблоко")
+    app.Session.remove()
+    app.shutdown()
+    with app.engine.connect() as conn:
+        before = {table: conn.scalar(sq.text(f"SELECT count(*) FROM {table}"))
+                  for table in ("users", "words", "vocabulary", "schema_version")}
+    app.engine.dispose()
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    sq.event.listen(sq.Engine, "before_cursor_execute", record)
+    try:
+        app = _startup(path)
+    finally:
+        sq.event.remove(sq.Engine, "before_cursor_execute", record)
+    app.shutdown()
+
+    ddl = [statement for statement in statements
+           if statement.lstrip().split(None, 1)[0].upper() in ("CREATE", "ALTER", "DROP")]
+    assert ddl == []
+    assert not any(statement.lstrip().upper().startswith(("INSERT", "UPDATE", "DELETE"))
+                   for statement in statements)
+    with app.engine.connect() as conn:
+        after = {table: conn.scalar(sq.text(f"SELECT count(*) FROM {table}"))
+                 for table in before}
+    assert after == before
+    assert before["words"] == len(DEFAULT_WORDS) + 1
+
+
+def _schema(engine):
+    inspector = sq.inspect(engine)
+    schema = {}
+    for table in inspector.get_table_names():
+        if table == "schema_version":
+            continue
+        schema[table] = (
+            {(column["name"], column["nullable"]) for column in inspector.get_columns(table)},
+            {(index["name"], tuple(index["column_names"]), bool(index["unique"]))
+             for index in inspector.get_indexes(table)},
+            {tuple(constraint["column_names"])
+             for constraint in inspector.get_unique_constraints(table)},
+        )
+    return schema
+
+
+def test_migrations_produce_model_schema(tmp_path):
+    from models import Base
+    migrated = sq.create_engine(f"sqlite:///{tmp_path / 'migrated.db'}")
+    migrate(migrated)
+    declared = sq.create_engine(f"sqlite:///{tmp_path / 'declared.db'}")
+    Base.metadata.create_all(declared)
+
+    assert _schema(migrated) == _schema(declared)
+
+
+def test_migration_merges_duplicate_word_pairs(tmp_path):
+    engine = sq.create_engine(f"sqlite:///{tmp_path / 'baseline.db'}")
+    # до миграций каждое добавление создавало новую строку words, даже для
+    # общего слова и для пары, уже добавленной этим пользователем
+    create_baseline_database(engine, [("apple", "яблоко"), ("oven", "духовка"),
+                                      ("apple", "яблоко"), ("pear", "груша")])
+    with engine.begin() as conn:
+        conn.execute(sq.text("INSERT INTO users (id, tg_id, name) VALUES (3, 43, 'Петя')"))
+        apple = conn.scalar(sq.text("SELECT max(id) FROM words WHERE target = 'apple'"))
+        conn.execute(sq.text("INSERT INTO vocabulary (user_id, word_id) VALUES (3, :id)"),
+                     {"id": apple})
+
+    migrate(engine)
+
+    with engine.connect() as conn:
+        pairs = conn.execute(sq.text(
+            "SELECT target, translation, count(*) FROM words GROUP BY target, translation"
+        )).all()
+        assert all(count == 1 for _, _, count in pairs)
+        assert len(pairs) == len(DEFAULT_WORDS) + 2
+        vocabulary = conn.execute(sq.text(
+            "SELECT u.tg_id, w.target FROM vocabulary v "
+            "JOIN users u ON u.id = v.user_id JOIN words w ON w.id = v.word_id "
+            "WHERE u.tg_id <> 0 ORDER BY u.tg_id, w.target"
+        )).all()
+        assert [tuple(row) for row in vocabulary] == [
+            (42, "apple"), (42, "oven"), (42, "pear"), (43, "apple")
+        ]
+        # общее слово и слово пользователя - одна пара
+        assert conn.scalar(sq.text(
+            "SELECT count(DISTINCT word_id) FROM vocabulary v JOIN words w ON w.id = v.word_id "
+            "WHERE w.target = 'oven'"
+        )) == 1
+        # ни одна запись словаря не ссылается на удаленную пару
+        assert conn.scalar(sq.text(
+            "SELECT count(*) FROM vocabulary WHERE word_id NOT IN (SELECT id FROM words)"
+        )) == 0
+
+
+def test_migration_merges_reviews_of_duplicate_pairs(tmp_path):
+    engine = sq.create_engine(f"sqlite:///{tmp_path / 'bot.db'}")
+    with engine.begin() as conn:
+        for _, _, step in MIGRATIONS[:10]:
+            step(conn)
+        conn.execute(sq.text("INSERT INTO users (id, tg_id, name) VALUES (5, 42, 'Вася')"))
+        conn.execute(sq.text(
+            "INSERT INTO words (id, target, translation) VALUES "
+            "(101, 'apple', 'яблоко'), (102, 'apple', 'яблоко'), (103, 'apple', 'яблоко')"
+        ))
+        conn.execute(sq.text("INSERT INTO vocabulary (user_id, word_id) VALUES "
+                             "(5, 102), (5, 103)"))
+        conn.execute(sq.text(
+            "INSERT INTO reviews (user_id, word_id, due_at, interval_days, ease, repetitions, "
+            "lapses) VALUES (5, 102, '2026-01-01', 1, 2.5, 1, 0), "
+            "(5, 103, '2026-01-02', 6, 2.6, 2, 0)"
+        ))
+        conn.execute(sq.text("INSERT INTO word_stats (user_id, word_id, answers, mistakes) "
+                             "VALUES (5, 101, 3, 1), (5, 103, 2, 0)"))
+        conn.execute(sq.text("INSERT INTO answer_events (user_id, word_id, correct, answered_at) "
+                             "VALUES (5, 103, 1, '2026-01-01')"))
+
+        MIGRATIONS[10][2](conn)
+
+        assert conn.execute(
+            sq.text("SELECT id FROM words WHERE target = 'apple'")
+        ).scalars().all() == [101]
+        assert conn.execute(
+            sq.text("SELECT user_id, word_id FROM vocabulary WHERE user_id = 5")
+        ).all() == [(5, 101)]
+        assert conn.execute(sq.text("SELECT word_id, repetitions FROM reviews")).all() == [(101, 1)]
+        assert conn.execute(sq.text("SELECT word_id, answers FROM word_stats")).all() == [(101, 3)]
+        assert conn.scalar(sq.text("SELECT word_id FROM answer_events")) == 101
+
+
+def test_migration_backfills_review_cards(tmp_path):
+    engine = sq.create_engine(f"sqlite:///{tmp_path / 'baseline.db'}")
+    create_baseline_database(engine, [("apple", "яблоко")])
+    with engine.begin() as conn:
+        for _, _, step in MIGRATIONS[:11]:
+            step(conn)
+        conn.execute(sq.text(
+            "INSERT INTO reviews (user_id, word_id, due_at, interval_days, ease, repetitions, "
+            "lapses) VALUES (2, 1, '2030-01-01', 6, 2.6, 2, 0)"
+        ))
+
+        MIGRATIONS[11][2](conn)
+
+        # общие слова и собственное слово пользователя, у общего пользователя карточек нет
+        assert conn.scalar(sq.text("SELECT count(*) FROM reviews WHERE user_id = 2")) == \
+            len(DEFAULT_WORDS) + 1
+        assert conn.scalar(sq.text("SELECT count(*) FROM reviews WHERE user_id = 1")) == 0
+        # существующая карточка не изменилась
+        assert conn.scalar(sq.text(
+            "SELECT repetitions FROM reviews WHERE user_id = 2 AND word_id = 1"
+        )) == 2
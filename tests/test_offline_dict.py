@@ -0,0 +1,74 @@
+"""Тесты локального словаря (offline_dict.py): сборка файла, поиск и командная строка."""
+import pytest
+import offline_dict
+from offline_dict import OfflineDictionary, build
+from replay import StubServer
+from translation import TranslationService
+
+PAIRS = [("Apple", "Яблоко"), ("app", "приложение"), ("apples", "яблоки"),
+         ("apple", "другое"), ("éclair", "эклер"), ("zoo", "зоопарк"), ("", "пусто")]
+
+
+@pytest.fixture(name="dictionary")
+def fixture_dictionary(tmp_path):
+    path = str(tmp_path / "enru.dict")
+    assert build(PAIRS, path) == 5  # повтор apple и пустое слово пропущены
+    dictionary = OfflineDictionary(path)
+    yield dictionary
+    dictionary.close()
+
+
+def test_lookup_finds_every_word(dictionary):
+    assert len(dictionary) == 5
+    assert dictionary.lookup(" APPLE ") == "яблоко"  # первый перевод повтора
+    assert dictionary.lookup("app") == "приложение"  # префикс другого слова
+    assert dictionary.lookup("apples") == "яблоки"
+    assert dictionary.lookup("éclair") == "эклер"  # порядок байтов UTF-8
+    assert dictionary.lookup("zoo") == "зоопарк"
+    for missing in ("a", "appl", "applesauce", "zzz", ""):
+        assert dictionary.lookup(missing) is None
+
+
+def test_empty_and_foreign_files(tmp_path):
+    path = str(tmp_path / "empty.dict")
+    assert build([], path) == 0
+    empty = OfflineDictionary(path)
+    assert len(empty) == 0 and empty.lookup("apple") is None
+    empty.close()
+
+    foreign = tmp_path / "words.csv"
+    foreign.write_text("target,translation\napple,яблоко\n", encoding="utf-8")
+    with pytest.raises(ValueError):
+        OfflineDictionary(str(foreign))
+
+
+def test_rebuild_replaces_file(tmp_path):
+    path = str(tmp_path / "enru.dict")
+    build([("cat", "кошка")], path)
+    build([("dog", "собака")], path)
+    dictionary = OfflineDictionary(path)
+    assert dictionary.lookup("cat") is None and dictionary.lookup("dog") == "собака"
+    dictionary.close()
+    assert not (tmp_path / "enru.dict.tmp").exists()
+
+
+def test_command_line(tmp_path, capsys):
+    source = tmp_path / "words.csv"
+    source.write_text("target,translation\ncat,кошка\ndog,собака\n", encoding="utf-8")
+    path = str(tmp_path / "enru.dict")
+    offline_dict.main(["build", str(source), "-o", path])
+    assert "Записей в словаре: 2" in capsys.readouterr().err
+    offline_dict.main(["lookup", path, "Dog"])
+    assert capsys.readouterr().out == "собака\n"
+
+
+def test_translation_service_asks_api_only_on_miss(dictionary):
+    stub = StubServer()
+    service = TranslationService("key", stub.translate_url, offline=dictionary)
+    assert service.translate("Apple") == "яблоко"
+    assert service.translate("zoo") == "зоопарк"
+    assert service.translate("cat") is not None
+    stub.close()
+
+    assert stub.calls == {"lookup": 1}
+    assert service.stats["offline_hits"] == 2
@@ -0,0 +1,137 @@
+"""Тесты рассылки напоминаний (reminders.py)."""
+import threading
+import time
+import pytest
+import sqlalchemy as sq
+from sqlalchemy.orm import sessionmaker
+from telebot.apihelper import ApiTelegramException
+from migrations import migrate
+from models import Users, Vocabulary, ReminderRuns
+from reminders import ReminderScheduler
+from sender import SendQueue
+from training import utcnow
+
+FIRST_TG_ID = 1000
+
+
+class FakeBot:
+    """
+    Бот, записывающий отправленные сообщения вместо обращения к Telegram.
+
+    Атрибуты:
+        sent (list): chat_id отправленных сообщений.
+        blocked (set): chat_id пользователей, заблокировавших бота (ответ 403).
+        hold_after (int or None): После скольких сообщений отправка ждет release.
+
+    """
+    def __init__(self, blocked=(), hold_after=None):
+        self.sent = []
+        self.blocked = set(blocked)
+        self.hold_after = hold_after
+        self.holding = threading.Event()
+        self.release = threading.Event()
+
+    def send_message(self, chat_id, text, **kwargs):  # pylint: disable=unused-argument
+        if chat_id in self.blocked:
+            raise ApiTelegramException("sendMessage", None, {
+                "ok": False, "error_code": 403, "description": "Forbidden: bot was blocked"
+            })
+        if self.hold_after is not None and len(self.sent) >= self.hold_after:
+            self.holding.set()
+            self.release.wait(5)
+        self.sent.append(chat_id)
+
+
+@pytest.fixture(name="session_factory")
+def fixture_session_factory(tmp_path):
+    engine = sq.create_engine(f"sqlite:///{tmp_path / 'bot.db'}")
+    migrate(engine)
+    with engine.begin() as conn:
+        for number in range(10):
+            user_id = conn.execute(sq.insert(Users).values(
+                tg_id=FIRST_TG_ID + number, name=f"user{number}", last_active_at=None
+            )).inserted_primary_key[0]
+            conn.execute(sq.insert(Vocabulary).values(user_id=user_id, word_id=1))
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+def scheduler(session_factory, outbox):
+    return ReminderScheduler(session_factory, outbox, hour=0, min_words=1, rate=1e6,
+                             batch_size=3, tick=3600)
+
+
+def checkpoint(session_factory):
+    session = session_factory()
+    try:
+        return session.get(ReminderRuns, utcnow().date())
+    finally:
+        session.close()
+
+
+def test_checkpoint_advances_only_after_sending(session_factory):
+    bot = FakeBot(hold_after=4)
+    outbox = SendQueue(bot, workers=1, global_rate=1e6, chat_rate=1e6)
+    reminders = scheduler(session_factory, outbox)
+    runner = threading.Thread(target=reminders.run)
+    runner.start()
+    assert bot.holding.wait(5)
+    time.sleep(0.1)  # остальные напоминания стоят в очереди
+    reminders.close()
+    runner.join(5)
+    assert not outbox.close(timeout=0.1)  # очередь отбрасывает неотправленные
+    bot.release.set()  # пятое напоминание все-таки отправлено
+    for thread in outbox._threads:  # pylint: disable=protected-access
+        thread.join(5)
+
+    state = checkpoint(session_factory)
+    assert bot.sent == [FIRST_TG_ID + number for number in range(5)]
+    assert outbox.stats["dropped"] > 0
+    assert state.sent == 5 and state.finished_at is None
+    session = session_factory()
+    fifth = session.scalar(sq.select(Users.id).where(Users.tg_id == FIRST_TG_ID + 4))
+    session.close()
+    assert state.last_user_id == fifth
+
+    # после перезапуска отправляются только неотправленные напоминания
+    rerun = FakeBot()
+    outbox = SendQueue(rerun, workers=0)
+    scheduler(session_factory, outbox).run()
+    assert rerun.sent == [FIRST_TG_ID + number for number in range(5, 10)]
+    state = checkpoint(session_factory)
+    assert state.sent == 10 and state.finished_at is not None
+
+
+def test_rejected_reminder_does_not_block_checkpoint(session_factory):
+    bot = FakeBot(blocked={FIRST_TG_ID + 2})
+    outbox = SendQueue(bot, workers=2, global_rate=1e6, chat_rate=1e6)
+    state = scheduler(session_factory, outbox).run()
+    outbox.close(timeout=5)
+
+    assert len(bot.sent) == 9 and outbox.stats["failed"] == 1
+    assert state.sent == 9 and state.finished_at is not None
+
+
+def test_users_changed_mid_broadcast_are_not_skipped_or_repeated(session_factory):
+    bot = FakeBot()
+    engine = session_factory.kw["bind"]
+
+    def send_message(chat_id, text, **kwargs):
+        if not bot.sent:  # первая пачка: регистрируются новые пользователи, один удаляется
+            with engine.begin() as conn:
+                for number in range(10, 15):
+                    user_id = conn.execute(sq.insert(Users).values(
+                        tg_id=FIRST_TG_ID + number, name=f"user{number}", last_active_at=None
+                    )).inserted_primary_key[0]
+                    conn.execute(sq.insert(Vocabulary).values(user_id=user_id, word_id=1))
+                gone = conn.scalar(sq.select(Users.id).where(Users.tg_id == FIRST_TG_ID + 7))
+                conn.execute(sq.delete(Vocabulary).where(Vocabulary.user_id == gone))
+                conn.execute(sq.delete(Users).where(Users.id == gone))
+        FakeBot.send_message(bot, chat_id, text, **kwargs)
+
+    bot.send_message = send_message
+    state = scheduler(session_factory, SendQueue(bot, workers=0)).run()
+
+    expected = [FIRST_TG_ID + number for number in range(15) if number != 7]
+    assert bot.sent == expected  # каждый пользователь ровно один раз, по порядку users.id
+    assert state.sent == len(expected) and state.finished_at is not None
@@ -0,0 +1,42 @@
+"""Тесты записи входящих обновлений (replay.UpdateRecorder)."""
+from telebot import apihelper
+from telebot.types import Update
+import tg_bot
+from replay import StubServer, read_trace
+
+USER = 42
+
+
+def test_recorder_writes_inline_queries(tmp_path):
+    stub = StubServer()
+    apihelper.API_URL = stub.api_url
+    path = tmp_path / "updates.jsonl"
+    bot = tg_bot.create_app({
+        "TOKEN": "0:test", "DSN": f"sqlite:///{tmp_path / 'bot.db'}",
+        "TRANSLATE_URL": stub.translate_url, "SEND_WORKERS": 0,
+        "RECORD_UPDATES": str(path),
+    })
+    user = {"id": USER, "is_bot": False, "first_name": "u"}
+    bot.process_new_updates([
+        Update.de_json({"update_id": 1, "message": {
+            "message_id": 1, "date": 1, "text": "/start", "from": user,
+            "chat": {"id": USER, "type": "private"},
+            "entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+        }}),
+        Update.de_json({"update_id": 2, "inline_query": {
+            "id": "7", "from": user, "query": "wid", "offset": "",
+        }}),
+    ])
+    assert bot.worker_pool.drain(10)
+    error = bot.worker_pool.exception_info
+    tg_bot.shutdown()
+    stub.close()
+
+    assert error is None
+    assert stub.calls.get("answerInlineQuery") == 1  # обработчик поиска выполнен
+    message, query = read_trace(path)
+    assert message["message"]["text"] == "/start"
+    assert query["inline_query"] == {"id": "7", "from": user, "query": "wid", "offset": ""}
+    # запись снова разбирается в обновление
+    raw = {key: value for key, value in query.items() if key != "recorded_at"}
+    assert Update.de_json(raw).inline_query.from_user.id == USER
@@ -0,0 +1,90 @@
+"""Тесты поиска слов по началу слова с одной опечаткой (search.py)."""
+import random
+import pytest
+from search import SearchEngine, SearchIndex, normalize
+
+WORDS = [
+    (1, "kitchen", "кухня"),
+    (2, "garden", "сад"),
+    (3, "window", "окно"),
+    (4, "winter", "зима"),
+    (5, "water", "вода"),
+    (6, "wind", "ветер"),
+]
+
+
+def found(index, query, limit=10):
+    return {index.words[word_id][0] for word_id in index.search(query, limit)}
+
+
+def test_prefix_matches_in_alphabetical_order():
+    index = SearchIndex(WORDS)
+    assert index.search("win") == [6, 3, 4]  # wind, window, winter
+    assert found(index, "  WATER ") == {"water"}
+    assert found(index, "ок") == {"window"}  # по переводу
+    assert index.search("win", limit=2) == [6, 3]
+
+
+@pytest.mark.parametrize("query, word", [
+    ("ktichen", "kitchen"),  # перестановка соседних букв
+    ("gaarden", "garden"),  # лишняя буква
+    ("gardn", "garden"),  # пропущенная буква
+    ("wimdow", "window"),  # замененная буква
+    ("кухян", "kitchen"),  # перестановка в переводе
+    ("зема", "winter"),  # замена в переводе
+])
+def test_one_edit_variants_are_found(query, word):
+    index = SearchIndex(WORDS)
+    assert word in found(index, query)
+
+
+def test_short_and_distant_queries_find_nothing():
+    index = SearchIndex(WORDS)
+    assert not index.search("wx")  # короткие запросы - только по началу слова
+    assert not index.search("gxrdxn")  # две опечатки
+
+
+def test_add_and_remove_keep_terms_sorted():
+    rng = random.Random(3)
+    index = SearchIndex(WORDS)
+    words = {word_id: (target, translation) for word_id, target, translation in WORDS}
+    for word_id in range(10, 400):
+        if words and rng.random() < 0.3:
+            removed = rng.choice(list(words))
+            index.remove(removed)
+            del words[removed]
+        else:
+            target = "".join(rng.choice("abcde") for _ in range(rng.randint(1, 4)))
+            translation = rng.choice(["сад", "дом", "кот"])  # общие переводы
+            index.add(word_id, target, translation)
+            words[word_id] = (target, translation)
+        terms = {normalize(term) for pair in words.values() for term in pair}
+        assert index._terms == sorted(terms)  # pylint: disable=protected-access
+    assert index.words == words
+    with_garden = {word_id for word_id, (_, translation) in words.items() if translation == "сад"}
+    assert set(index.search("сад", limit=1000)) == with_garden
+
+
+def test_engine_puts_own_words_first_without_duplicates():
+    own = {42: [(100, "winner", "победитель"), (5, "water", "вода")]}
+    loads = []
+
+    def loader(session, tg_id):  # pylint: disable=unused-argument
+        loads.append(tg_id)
+        return WORDS if tg_id == SearchEngine.SHARED_TG_ID else own.get(tg_id, [])
+
+    engine = SearchEngine(loader, maxsize=1)
+    assert [row[0] for row in engine.search(None, 42, "w")] == [5, 100, 6, 3, 4]
+    assert [row[0] for row in engine.search(None, 42, "w", limit=3)] == [5, 100, 6]
+    assert engine.search(None, 42, "win", own_only=True) == [(100, "winner", "победитель")]
+
+    engine.add(42, 101, "wine", "вино")  # индекс построен - обновляется на месте
+    engine.add(7, 102, "wing", "крыло")  # индекса нет - построится при поиске
+    assert [row[0] for row in engine.search(None, 42, "win", own_only=True)] == [101, 100]
+    engine.remove(42, 100)
+    assert [row[0] for row in engine.search(None, 42, "win", own_only=True)] == [101]
+    assert loads == [42, 0]
+
+    engine.search(None, 7, "w")  # maxsize=1: индекс 42 вытесняется
+    engine.search(None, 42, "w")
+    assert loads == [42, 0, 7, 42]
@@ -0,0 +1,76 @@
+"""Тесты очереди исходящих сообщений (sender.py) с заглушкой Bot API."""
+import time
+import pytest
+import telebot
+from telebot import apihelper
+from replay import StubServer
+from sender import SendQueue
+
+CHATS = 10
+MESSAGES = 20
+
+
+@pytest.fixture(name="stub")
+def fixture_stub():
+    # каждый четвертый запрос к Bot API отклоняется ответом 429
+    stub = StubServer(too_many_requests=4, retry_after=0.05)
+    apihelper.API_URL = stub.api_url
+    yield stub
+    stub.close()
+
+
+def delivered(stub):
+    """Номера принятых сообщений по чатам (склеенные сообщения разделяются)."""
+    chats = {}
+    for chat_id, text in stub.messages:
+        chats.setdefault(chat_id, []).extend(int(line) for line in text.split("\n"))
+    return chats
+
+
+@pytest.mark.parametrize("coalesce", [False, True])
+def test_retries_429_and_keeps_chat_order(stub, coalesce):
+    outbox = SendQueue(telebot.TeleBot("0:test"), workers=4, global_rate=1000,
+                       chat_rate=100, coalesce=coalesce)
+    done = []
+    for number in range(MESSAGES):
+        for chat_id in range(1, CHATS + 1):
+            outbox.send_message(chat_id, str(number), on_done=done.append)
+    assert outbox.drain(30)
+    outbox.close()
+
+    assert delivered(stub) == {chat_id: list(range(MESSAGES)) for chat_id in range(1, CHATS + 1)}
+    assert done == [True] * CHATS * MESSAGES
+    assert stub.rejected > 0 and outbox.stats["retried"] == stub.rejected
+    assert outbox.stats["failed"] == 0
+
+
+def test_chat_rate_limits_sustained_throughput(stub):
+    outbox = SendQueue(telebot.TeleBot("0:test"), workers=4, global_rate=1000,
+                       chat_rate=20, chat_burst=1, coalesce=False)
+    started = time.perf_counter()
+    for number in range(MESSAGES):
+        outbox.send_message(1, str(number))
+    assert outbox.drain(30)
+    elapsed = time.perf_counter() - started
+    outbox.close()
+
+    # 20 сообщений одному чату при 20 сообщениях в секунду - около секунды
+    assert elapsed >= (MESSAGES - 1) / 20 * 0.9
+    assert delivered(stub) == {1: list(range(MESSAGES))}
+
+
+def test_retries_html_bad_gateway():
+    # каждый пятый запрос получает HTML-страницу 502 вместо ответа Bot API
+    stub = StubServer(bad_gateway=5)
+    apihelper.API_URL = stub.api_url
+    outbox = SendQueue(telebot.TeleBot("0:test"), workers=2, global_rate=1000, chat_rate=100)
+    for number in range(5):
+        for chat_id in range(1, 4):
+            outbox.send_message(chat_id, str(number), parse_mode="HTML")  # без склейки
+    assert outbox.drain(30)
+    outbox.close()
+    stub.close()
+
+    assert stub.bad_gateways > 0 and outbox.stats["retried"] == stub.bad_gateways
+    assert delivered(stub) == {chat_id: list(range(5)) for chat_id in range(1, 4)}
+    assert outbox.stats["failed"] == 0
@@ -0,0 +1,109 @@
+"""Тесты долговременного хранилища состояний (state_storage.py)."""
+from array import array
+import pytest
+import sqlalchemy as sq
+import telebot
+from telebot import types
+from common import MyStates
+from db import assert_max_queries
+from migrations import STATE_MIGRATIONS, current_version, migrate
+from models import BotStates
+from state_storage import SQLStateStorage, StateFlushMiddleware, create_state_storage
+
+
+@pytest.fixture(name="engine")
+def fixture_engine(tmp_path):
+    engine = sq.create_engine(f"sqlite:///{tmp_path / 'states.db'}")
+    migrate(engine, STATE_MIGRATIONS)
+    yield engine
+    engine.dispose()
+
+
+def callback_update(user_id, data):
+    return types.Update.de_json({
+        "update_id": 1,
+        "callback_query": {
+            "id": "1", "chat_instance": "1", "data": data,
+            "from": {"id": user_id, "is_bot": False, "first_name": "u"},
+            "message": {"message_id": 1, "date": 0,
+                        "chat": {"id": user_id, "type": "private"}},
+        },
+    })
+
+
+def test_state_set_by_callback_query_is_written(engine):
+    storage = SQLStateStorage(engine)
+    bot = telebot.TeleBot("1:test", state_storage=storage, use_class_middlewares=True,
+                          threaded=False)
+    bot.setup_middleware(StateFlushMiddleware(storage))
+
+    @bot.callback_query_handler(func=lambda call: True)
+    def choose(call):
+        bot.set_state(call.from_user.id, MyStates.default, call.message.chat.id)
+
+    bot.process_new_updates([callback_update(42, "del:1")])
+
+    # новый экземпляр хранилища (другой процесс) видит состояние
+    assert SQLStateStorage(engine).get_state(42, 42) == MyStates.default.name
+
+
+def test_update_costs_one_load_and_one_write(engine):
+    storage = SQLStateStorage(engine)
+    bot = telebot.TeleBot("1:test", state_storage=storage, threaded=False)
+    bot.set_state(42, MyStates.training, 42)
+    storage.flush(42)
+
+    with assert_max_queries(engine, 2):  # чтение записи и одна запись изменений
+        assert bot.get_state(42, 42) == MyStates.training.name
+        bot.set_state(42, MyStates.training_check, 42)
+        with bot.retrieve_data(42, 42) as data:
+            data["word_id"] = 1
+            data["wrong_attempts"] = 0
+        storage.flush(42)
+
+    with bot.retrieve_data(42, 42) as data:
+        assert data == {"word_id": 1, "wrong_attempts": 0}
+
+
+def test_data_is_stored_as_json(engine):
+    storage = SQLStateStorage(engine)
+    storage.set_state(42, 42, MyStates.training_check)
+    storage.save(42, 42, {"word_ids": array("i", [3, 1, 2]), "translation": "кошка",
+                          "user_db_id": None})
+    storage.flush(42)
+
+    with engine.connect() as conn:
+        stored = conn.scalar(sq.select(BotStates.data))
+    assert stored == '{"word_ids":{"__array__":"i","items":[3,1,2]},' \
+                     '"translation":"кошка","user_db_id":null}'
+    data = SQLStateStorage(engine).get_data(42, 42)
+    assert data["word_ids"] == array("i", [3, 1, 2]) and data["translation"] == "кошка"
+
+    storage.save(42, 42, {"seen": {1, 2}})  # множество не представимо в JSON
+    with pytest.raises(TypeError):
+        storage.flush(42)
+
+
+def test_separate_database_is_created_by_migrations(tmp_path):
+    url = f"sqlite:///{tmp_path / 'separate.db'}"
+    storage = create_state_storage(url, None)
+    storage.set_state(7, 7, MyStates.default)
+    storage.flush()
+
+    with storage.engine.connect() as conn:
+        assert current_version(conn) == STATE_MIGRATIONS[-1][0]
+        assert sq.inspect(conn).get_table_names() == ["bot_states", "schema_version"]
+    assert create_state_storage(url, None).get_state(7, 7) == MyStates.default.name
+    storage.engine.dispose()
+
+
+def test_pickled_states_are_dropped_by_migration(tmp_path):
+    engine = sq.create_engine(f"sqlite:///{tmp_path / 'states.db'}")
+    migrate(engine, STATE_MIGRATIONS[:1])  # таблица с данными в pickle (шаг 3)
+    with engine.begin() as conn:
+        conn.execute(sq.text("INSERT INTO bot_states VALUES (1, 1, 'MyStates:training', :data)"),
+                     {"data": b"\x80\x04}\x94."})
+
+    assert migrate(engine, STATE_MIGRATIONS) == [13]
+    assert SQLStateStorage(engine).get_state(1, 1) is None
+    engine.dispose()
@@ -0,0 +1,239 @@
+"""Тесты обработчиков tg_bot: тренировка, словарь, импорт и экспорт, число запросов к базе."""
+import pytest
+import sqlalchemy as sq
+from telebot import apihelper
+from telebot.types import Update
+import tg_bot
+from common import Commands, MyStates
+from db import CONNECTION_LEAKS, assert_max_queries
+from models import AnswerEvents, Reviews, Users, Vocabulary, user_cache
+from replay import StubServer
+
+USER = 42
+
+
+@pytest.fixture(name="bot")
+def fixture_bot(tmp_path):
+    stub = StubServer()
+    apihelper.API_URL = stub.api_url
+    bot = tg_bot.create_app({
+        "TOKEN": "0:test", "DSN": f"sqlite:///{tmp_path / 'bot.db'}",
+        "TRANSLATE_URL": stub.translate_url, "SEND_WORKERS": 0, "TRAINING_INLINE": False,
+    })
+    bot.stub = stub
+    send(bot, "/start")
+    send(bot, "Вася")
+    with tg_bot.engine.begin() as conn:  # слова, созданные миграцией
+        user_db_id = conn.scalar(sq.select(Users.id).where(Users.tg_id == USER))
+        conn.execute(sq.insert(Vocabulary), [
+            {"user_id": user_db_id, "word_id": word_id} for word_id in range(1, 11)
+        ])
+    yield bot
+    tg_bot.shutdown()
+    stub.close()
+
+
+def process(bot, update):
+    bot.process_new_updates([Update.de_json(update)])
+    assert bot.worker_pool.drain(10)
+
+
+def send(bot, text, message_id=1):
+    process(bot, {"update_id": message_id, "message": {
+        "message_id": message_id, "date": 0, "text": text,
+        "chat": {"id": USER, "type": "private"},
+        "from": {"id": USER, "is_bot": False, "first_name": "u"},
+        **({"entities": [{"type": "bot_command", "offset": 0, "length": len(text)}]}
+           if text.startswith("/") else {}),
+    }})
+
+
+def press(bot, data, keyboard):
+    process(bot, {"update_id": 1, "callback_query": {
+        "id": "1", "chat_instance": "1", "data": data,
+        "from": {"id": USER, "is_bot": False, "first_name": "u"},
+        "message": {
+            "message_id": 7, "date": 1,  # date 0 - недоступное сообщение
+            "text": "вопрос",
+            "chat": {"id": USER, "type": "private"},
+            "reply_markup": {"inline_keyboard": [
+                [{"text": str(number), "callback_data": button}]
+                for number, button in enumerate(keyboard)
+            ]},
+        },
+    }})
+
+
+def answers(word_id=None):
+    tg_bot.answer_log.flush()
+    with tg_bot.engine.connect() as conn:
+        query = sq.select(sq.func.count()).select_from(AnswerEvents)
+        if word_id is not None:
+            query = query.where(AnswerEvents.word_id == word_id)
+        return conn.scalar(query)
+
+
+def test_forged_training_callback_is_ignored(bot):
+    keyboard = ["t:1:1:0", "t:1:2:0", "t:1:3:0", "t:1:4:0", "t:stop"]
+    press(bot, "t:5:5:0", keyboard)  # слова 5 нет среди вариантов вопроса
+    press(bot, "t:1:2:9", keyboard)  # подмененное число ошибок
+
+    with tg_bot.engine.connect() as conn:
+        reviewed = conn.scalar(sq.select(sq.func.count()).select_from(Reviews).where(
+            Reviews.word_id == 5, Reviews.repetitions > 0
+        ))
+    assert answers() == 0 and not reviewed
+
+    press(bot, "t:1:2:0", keyboard)
+    assert answers(word_id=1) == 1
+
+
+def test_command_button_is_not_a_wrong_answer(bot):
+    send(bot, Commands.TRAIN)
+    send(bot, Commands.YES)
+    assert bot.get_state(USER, USER) == MyStates.training_check.name
+
+    send(bot, Commands.STATS)  # кнопка команды, а не вариант ответа
+    with bot.retrieve_data(USER, USER) as data:
+        assert data["wrong_attempts"] == 0
+    assert answers() == 0
+    assert bot.get_state(USER, USER) == MyStates.training_check.name
+
+    send(bot, "не перевод")
+    with bot.retrieve_data(USER, USER) as data:
+        assert data["wrong_attempts"] == 1
+    assert answers() == 1
+
+
+def test_dictionary_page_and_export_go_through_outbox(bot):
+    sent = tg_bot.outbox.stats["sent"]
+    press(bot, "dict:next:1", ["dict:next:1"])
+    assert tg_bot.outbox.stats["sent"] == sent + 1
+    assert bot.stub.calls.get("editMessageText") == 1
+
+    send(bot, "/export")
+    assert tg_bot.outbox.stats["sent"] == sent + 2
+    assert bot.stub.calls.get("sendDocument") == 1
+
+
+def test_too_large_import_is_not_downloaded(bot):
+    tg_bot.CONFIG["IMPORT_MAX_BYTES"] = 1000
+    process(bot, {"update_id": 2, "message": {
+        "message_id": 2, "date": 1, "chat": {"id": USER, "type": "private"},
+        "from": {"id": USER, "is_bot": False, "first_name": "u"},
+        "document": {"file_id": "f", "file_unique_id": "f", "file_name": "words.csv",
+                     "file_size": 1001},
+    }})
+    assert "getFile" not in bot.stub.calls
+    assert bot.stub.calls["sendMessage"] == 3
+
+
+def test_training_start_does_not_create_review_cards(bot):
+    with tg_bot.engine.connect() as conn:
+        cards = conn.scalar(sq.select(sq.func.count()).select_from(Reviews))
+    assert cards > 0  # карточки общих слов созданы при регистрации
+
+    statements = []
+    sq.event.listen(tg_bot.engine, "before_cursor_execute",
+                    lambda *args: statements.append(args[2]))
+    send(bot, Commands.TRAIN)
+    send(bot, Commands.YES)
+    assert bot.get_state(USER, USER) == MyStates.training_check.name
+    assert not [sql for sql in statements if sql.lstrip().upper().startswith("INSERT")]
+
+
+def test_handlers_round_trips(bot):
+    leaks = CONNECTION_LEAKS.snapshot()
+    with assert_max_queries(tg_bot.engine, 0):  # пользователь в кэше
+        send(bot, "/start")
+    with assert_max_queries(tg_bot.engine, 1):  # одна страница keyset-запросом
+        send(bot, Commands.MY_DICTIONARY)
+
+    send(bot, Commands.ADD)
+    send(bot, "apple")
+    # поиск пары, вставка пары в точке сохранения, запись словаря и карточка
+    with assert_max_queries(tg_bot.engine, 8):
+        send(bot, "яблоко")
+
+    send(bot, Commands.DELETE)
+    # поиск записи, удаление записи, карточки и статистики, проверка и удаление пары
+    with assert_max_queries(tg_bot.engine, 6):
+        send(bot, "apple")
+    assert bot.get_state(USER, USER) == MyStates.default.name
+
+    # сессии обновлений закрыты, соединения возвращены в пул
+    assert tg_bot.engine.pool.checkedout() == 0
+    assert CONNECTION_LEAKS.snapshot() == leaks
+
+
+@pytest.mark.parametrize("steps,lookups", [
+    (["/start"], 1),
+    ([Commands.MY_DICTIONARY], 2),  # пользователь и общие слова (tg_id 0)
+    ([Commands.TRAIN, Commands.YES], 1),  # начало тренировки, первый вопрос
+    ([Commands.STATS], 1),
+])
+def test_user_cache_saves_lookups(bot, steps, lookups):
+    counts = []
+    for cold in (False, False, True):  # первый проход прогревает кэш словарей
+        for text in steps[:-1]:
+            send(bot, text)
+        if cold:
+            user_cache.clear()
+        with assert_max_queries(tg_bot.engine, 10) as statements:
+            send(bot, steps[-1])
+        counts.append(len(statements))
+        send(bot, Commands.STOP_TRAINING)
+    assert counts[2] == counts[1] + lookups
+
+
+def test_training_answers_do_not_look_up_user(bot):
+    send(bot, Commands.TRAIN)
+    send(bot, Commands.YES)
+    counts = []
+    for cold in (False, True):
+        if cold:
+            user_cache.clear()
+        with assert_max_queries(tg_bot.engine, 4) as statements:  # users.id в состоянии
+            send(bot, "не перевод")
+        counts.append(len(statements))
+    assert counts[0] == counts[1]
+
+
+def test_bot_api_calls_per_question(bot, monkeypatch):
+    def calls_since(before):
+        return {method: count - before.get(method, 0)
+                for method, count in bot.stub.calls.items() if count != before.get(method, 0)}
+
+    # обычная клавиатура: каждый ответ и каждый вопрос - новое сообщение
+    send(bot, Commands.TRAIN)
+    send(bot, Commands.YES)
+    before = dict(bot.stub.calls)
+    send(bot, "не перевод")
+    assert calls_since(before) == {"sendMessage": 1}
+    with bot.retrieve_data(USER, USER) as data:
+        translation = data["translation"]
+    before = dict(bot.stub.calls)
+    send(bot, translation)
+    assert calls_since(before) == {"sendMessage": 2}  # "правильно" и следующий вопрос
+    send(bot, Commands.STOP_TRAINING)
+
+    # inline-клавиатура: одно сообщение вопроса, которое редактируется
+    tg_bot.CONFIG["TRAINING_INLINE"] = True
+    markups = []
+    send_message = tg_bot.outbox.send_message
+    monkeypatch.setattr(tg_bot.outbox, "send_message", lambda *args, **kwargs: (
+        markups.append(kwargs.get("reply_markup")), send_message(*args, **kwargs))[1])
+    before = dict(bot.stub.calls)
+    send(bot, Commands.TRAIN)
+    assert calls_since(before) == {"sendMessage": 1}
+    keyboard = [button.callback_data for row in markups[-1].keyboard for button in row]
+    target_id = keyboard[0].split(":")[1]
+    right = f"t:{target_id}:{target_id}:0"
+    wrong = next(data for data in keyboard if data not in (right, "t:stop"))
+
+    before = dict(bot.stub.calls)
+    press(bot, wrong, keyboard)
+    assert calls_since(before) == {"editMessageReplyMarkup": 1, "answerCallbackQuery": 1}
+    before = dict(bot.stub.calls)
+    press(bot, right, keyboard)
+    assert calls_since(before) == {"editMessageText": 1, "answerCallbackQuery": 1}
@@ -0,0 +1,67 @@
+"""Тесты сервиса перевода (translation.py) с локальной заглушкой API."""
+import threading
+import pytest
+import sqlalchemy as sq
+from sqlalchemy.orm import sessionmaker
+from migrations import migrate
+from replay import STUB_TRANSLATION, StubServer
+from translation import CircuitBreaker, TranslationService
+
+
+@pytest.fixture(name="session_factory")
+def fixture_session_factory(tmp_path):
+    engine = sq.create_engine(f"sqlite:///{tmp_path / 'bot.db'}")
+    migrate(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+def test_word_reaches_api_once(session_factory):
+    stub = StubServer()
+    service = TranslationService("key", stub.translate_url, session_factory)
+    assert service.translate("Cat") == STUB_TRANSLATION
+    assert service.translate("cat ") == STUB_TRANSLATION  # кэш в памяти
+    service.close()
+
+    # другой процесс с той же базой данных берет перевод из таблицы translations
+    restarted = TranslationService("key", stub.translate_url, session_factory)
+    assert restarted.translate("cat") == STUB_TRANSLATION
+    assert restarted.translate("cat") == STUB_TRANSLATION
+    restarted.close()
+    stub.close()
+
+    assert stub.calls == {"lookup": 1}
+    assert service.stats["api_calls"] == 1 and service.stats["memory_hits"] == 1
+    assert restarted.stats["db_hits"] == 1 and restarted.stats["memory_hits"] == 1
+    assert restarted.hit_rate() == 1.0
+
+
+def test_concurrent_lookups_are_coalesced():
+    stub = StubServer(latency=0.3)
+    service = TranslationService("key", stub.translate_url)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(service.translate("dog")))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    service.close()
+    stub.close()
+
+    assert results == [STUB_TRANSLATION] * 8
+    assert stub.calls == {"lookup": 1}
+    assert service.stats["coalesced"] == 7
+
+
+def test_breaker_stops_calling_failing_api():
+    stub = StubServer()
+    url = stub.translate_url
+    stub.close()  # API недоступно: соединение отклоняется
+    service = TranslationService("key", url, timeout=1,
+                                 breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+    assert [service.translate(f"word{number}") for number in range(5)] == [None] * 5
+    service.close()
+
+    assert service.stats["failures"] == 2 and service.stats["rejected"] == 3
+    assert service.breaker.is_open
@@ -0,0 +1,67 @@
+"""Тесты кэша пользователей (models.UserCache): число запросов к базе с холодным и теплым кэшем."""
+import pytest
+import sqlalchemy as sq
+from sqlalchemy.orm import Session
+from db import assert_max_queries
+from migrations import migrate
+from models import UserCache, Users
+
+USERS = {1000: "Вася", 1001: "Петя"}
+
+
+@pytest.fixture(name="engine")
+def fixture_engine(tmp_path):
+    engine = sq.create_engine(f"sqlite:///{tmp_path / 'bot.db'}")
+    migrate(engine)
+    with engine.begin() as conn:
+        conn.execute(sq.insert(Users), [
+            {"tg_id": tg_id, "name": name} for tg_id, name in USERS.items()
+        ])
+    yield engine
+    engine.dispose()
+
+
+def test_lookup_queries_once_per_user(engine):
+    cache = UserCache()
+    with Session(engine) as session:
+        with assert_max_queries(engine, len(USERS)):  # холодный кэш
+            for tg_id, name in USERS.items():
+                assert cache.get(session, tg_id)[1] == name
+        with assert_max_queries(engine, 0):  # теплый кэш
+            for _ in range(3):
+                for tg_id, name in USERS.items():
+                    assert cache.get(session, tg_id)[1] == name
+    assert cache.stats() == {"hits": 6, "misses": 2, "size": 2}
+
+
+def test_missing_user_is_not_cached(engine):
+    cache = UserCache()
+    with Session(engine) as session:
+        with assert_max_queries(engine, 2):
+            assert cache.get(session, 2000) is None
+            assert cache.get(session, 2000) is None
+        cache.put(2000, 99, "Новый")  # регистрация (set_name)
+        with assert_max_queries(engine, 0):
+            assert cache.get(session, 2000) == (99, "Новый")
+
+
+def test_expired_and_evicted_entries_are_reloaded(engine):
+    cache = UserCache(maxsize=1)
+    with Session(engine) as session:
+        cache.get(session, 1000)
+        cache.get(session, 1001)  # вытесняет 1000
+        with assert_max_queries(engine, 0):
+            cache.get(session, 1001)
+        with assert_max_queries(engine, 1):
+            cache.get(session, 1000)
+
+        cache.ttl = 0.0  # записи сразу устаревают
+        cache.get(session, 1000)
+        with assert_max_queries(engine, 1):
+            cache.get(session, 1000)
+
+        cache.ttl = 600.0
+        cache.get(session, 1000)
+        cache.invalidate(1000)  # удаление пользователя
+        with assert_max_queries(engine, 1):
+            cache.get(session, 1000)
@@ -0,0 +1,65 @@
+"""Тесты кэша словарей пользователей (models.VocabularyCache)."""
+import pytest
+import sqlalchemy as sq
+from sqlalchemy.orm import Session
+from db import assert_max_queries
+from migrations import DEFAULT_WORDS, migrate
+from models import Users, VocabularyCache, Words, Vocabulary, user_cache
+
+USERS = {1000: [("cat", "кошка")], 1001: [("dog", "собака"), ("bird", "птица")]}
+
+
+@pytest.fixture(name="engine")
+def fixture_engine(tmp_path):
+    engine = sq.create_engine(f"sqlite:///{tmp_path / 'bot.db'}")
+    migrate(engine)
+    with engine.begin() as conn:
+        for tg_id, pairs in USERS.items():
+            user_id = conn.execute(sq.insert(Users).values(tg_id=tg_id, name="u")).\
+                inserted_primary_key[0]
+            for target, translation in pairs:
+                word_id = conn.execute(sq.insert(Words).values(
+                    target=target, translation=translation
+                )).inserted_primary_key[0]
+                conn.execute(sq.insert(Vocabulary).values(user_id=user_id, word_id=word_id))
+    user_cache.clear()
+    yield engine
+    user_cache.clear()
+    engine.dispose()
+
+
+def joins(statements):
+    return [sql for sql in statements if "JOIN vocabulary" in sql]
+
+
+def test_join_runs_once_per_user_until_vocabulary_changes(engine):
+    cache = VocabularyCache()
+    with Session(engine) as session:
+        with assert_max_queries(engine, 6) as statements:  # 3 пользователя и 3 словаря
+            for _ in range(3):
+                for tg_id, pairs in USERS.items():
+                    words = list(cache.get(session, tg_id))
+                    assert len(words) == len(DEFAULT_WORDS) + len(pairs)
+        # общие слова и словарь каждого пользователя загружаются по одному разу
+        assert len(joins(statements)) == 1 + len(USERS)
+        assert cache.stats() == {"hits": 4, "misses": 2, "evictions": 0, "size": 2}
+
+        # изменение словаря (add_word_input_translation, delete_word_from_db)
+        cache.invalidate(1000)
+        with assert_max_queries(engine, 1) as statements:
+            cache.get(session, 1000)
+            cache.get(session, 1000)
+            cache.get(session, 1001)
+        assert len(joins(statements)) == 1
+
+
+def test_least_recently_used_user_is_evicted(engine):
+    cache = VocabularyCache(maxsize=1)
+    with Session(engine) as session:
+        cache.get(session, 1000)
+        cache.get(session, 1001)  # вытесняет 1000
+        with assert_max_queries(engine, 0):
+            cache.get(session, 1001)
+        with assert_max_queries(engine, 1):
+            cache.get(session, 1000)
+    assert cache.stats() == {"hits": 1, "misses": 3, "evictions": 2, "size": 1}
@@ -1,218 +1,68 @@
 """Основной модуль для работы с тг-ботом"""
-import os.path
+import io
+from datetime import timedelta
+import tempfile
+import time
 from random import shuffle
-import requests
 import telebot
-import sqlalchemy
-from sqlalchemy.orm import sessionmaker
 from sqlalchemy.sql import or_
-from telebot.handler_backends import State, StatesGroup
 from telebot.types import ReplyKeyboardMarkup, KeyboardButton
-from dotenv import load_dotenv
+from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton
+from telebot.types import InlineQueryResultArticle, InputTextMessageContent
 from models import Words, Users, Vocabulary
-from models import create_tables, fill_db_with_default_data, get_words_list
+from models import get_word_ids, get_words_by_ids, vocabulary_cache
+from models import get_user_id, user_cache, load_own_words
+from models import add_word_to_vocabulary, remove_word_from_vocabulary
+from models import add_shared_reviews, next_due_word, record_review, dictionary_page
+from models import user_answer_stats
+from common import Commands, MyStates, BotMessages, MARKUP_DEFAULT, DEFAULT_BUTTONS
+from common import validate_target_word, validate_translation
+from common import load_config, make_config
+from dispatcher import Router
+from state_storage import SQLStateStorage, StateFlushMiddleware, create_state_storage
+from training import answer_quality, pick_distractors, utcnow
+from migrations import migrate
+from db import create_db_engine, create_session, PoolMonitor, SessionMiddleware
+from translation import TranslationService
+from distractors import DistractorEngine
+from search import SearchEngine
+from answers import AnswerLog
+from reminders import ActivityTracker, ReminderScheduler
+from offline_dict import OfflineDictionary
+from sender import SendQueue
+from metrics import HANDLER_LATENCY, MetricsMiddleware, Profiler, timed
+from metrics import instrument_engine, instrumented, start_metrics_server
+from lanes import use_lanes
+from replay import UpdateRecorder
+from lifecycle import Poller
+from bulk import detect_format, import_pairs, iter_pairs, iter_user_words, write_csv
 
 ### ОПРЕДЕЛЕНИЕ ГЛОБАЛЬНЫХ ПЕРЕМЕННЫХ
+# Бот, движок и фабрика сессий создаются функцией create_app, поэтому
+# импорт модуля не читает config.env и не обращается к базе данных.
 PATH = "config.env"
-
-if os.path.exists(PATH):
-    load_dotenv(PATH)
-else:
-    raise FileNotFoundError("Файл не был найден")
-
-TOKEN = os.getenv("TOKEN")
-login = os.getenv("LOGIN")
-password = os.getenv("PASSWORD")
-host = os.getenv("HOST")
-db_name = os.getenv("DATABASE_NAME")
-port = os.getenv("PORT")
-TRANSLATE_TOKEN = os.getenv("TRANSLATE_TOKEN")
-
-bot = telebot.TeleBot(TOKEN)
-DSN = f'postgresql://{login}:{password}@{host}:{port}/{db_name}'
-engine = sqlalchemy.create_engine(DSN)
-Session = sessionmaker(bind=engine)
-
-create_tables(engine)  # создание таблиц бд, учебная вещь
-
-SESSION = Session()
-fill_db_with_default_data(SESSION)
-SESSION.close()
+WRONG_MARK = "❌ "  # пометка отвергнутого варианта в inline-тренировке
+DICTIONARY_PAGE_SIZE = 15  # слов на странице "Моего словаря": 15 пар по 120+120 символов < 4096
+INLINE_RESULTS = 20  # результатов inline-поиска (Telegram принимает до 50)
+DELETE_SUGGESTIONS = 5  # похожих слов, предлагаемых при удалении
+CONFIG = None
+bot = None
+engine = None
+Session = None
+translator = None
+distractors = None  # подбор неправильных вариантов тренировки (distractors.DistractorEngine)
+search = None  # поиск слов по началу слова и с опечатками (search.SearchEngine)
+outbox = None  # очередь исходящих сообщений (sender.SendQueue)
+answer_log = None  # журнал ответов тренировки (answers.AnswerLog)
+reminders = None  # ежедневная рассылка напоминаний (reminders.ReminderScheduler)
+metrics_server = None
+recorder = None  # запись входящих обновлений (replay.UpdateRecorder)
+router = Router()
 ### ОПРЕДЕЛЕНИЕ ГЛОБАЛЬНЫХ ПЕРЕМЕННЫХ
 
-class Commands:
-    """Класс для хранения команд пользователя"""
-    REFUSE_NAME_ENTER = "Отказаться вводить имя"
-    ADD = "Добавить слово"
-    DELETE = "Удалить слово"
-    TRAIN = "Тренироваться"
-    HELP = "Справкаℹ️"
-    MY_DICTIONARY = "Мой словарь"
-    YES = "Да✅"
-    NO = "Нет❌"
-    STOP_TRAINING = "Остановиться"
-    LET_TRANSLATE = "Переведи мое слово сам"
-
-class MyStates(StatesGroup):
-    """Класс для хранения состояний бота для пользователя"""
-    default = State()
-    waiting_for_name = State()
-    waiting_for_target_word = State()
-    waiting_for_translation = State()
-    waiting_word_to_del = State()
-    training = State()
-    training_check = State()
-
-class BotMessages:
-    """Класс для хранения сообщений бота"""
-    WELCOME = """
-👋 Привет! Я ваш помощник в изучении английских слов!
-
-✨ Вот что я умею:
-
-1. Добавлять новые слова для изучения: Скажите мне слово, и я сохраню его для вас, чтобы вы могли учить его позже!
-   
-2. Удалять слово после его полного изучения: Когда вы почувствуете, что освоили слово, дайте мне знать, и я удалю его из вашего списка.
-
-3. Практиковаться над уже существующими словами: Я помогу вам освежить память и потренироваться с вашими словами, которые вы уже добавили.
-
-Начнем учить новые слова? 💪📚 Перед началом, я бы хотел знать, как вас называть! Пожалуйста, напишите своё имя
-"""
-    WELCOME_AGAIN = """
-👋 Рад снова вас видеть! Я ваш помощник в изучении английских слов!
-
-✨ Вот что я умею:
-
-1. Добавлять новые слова для изучения: Просто отправьте мне слово, и я сохраню его для вас, чтобы вы могли учить его позже!
-   
-2. Удалять слово после его полного изучения: Когда вы почувствуете, что освоили слово, дайте мне знать, и я удалю его из вашего списка.
-
-3. Практиковаться над уже существующими словами: Я помогу вам освежить память и потренироваться с вашими словами, которые вы уже добавили.
-
-Начнем учить новые слова? 💪📚
-"""
-    WAITING_NEW_WORD_ENG = """
-Пожалуйста, введите новое слово для изучения по-английски🇬🇧​​
-"""
-    WAITING_NEW_WORD_RUS = """
-Пожалуйста, введите перевод этого слова на русский язык🇷🇺​​
-"""
-    ANSWER_FOR_ANON = """
-Понимаю! Важно быть осторожным в сети 🕵️‍♂️. Давай начнём учить новые слова вместе? 📚😊
-"""
-    ANSWER_FOR_USER = """
-Привет! 😊 Я рад с тобой познакомиться, {}! Давай начнем учить слова и весело проведем время! 🎉✨
-"""
-    INVALID_TARGET_WORD = """
-К сожалению, это слово не подходит! 😔
-
-Но не переживайте, попробуйте ввести слово еще раз! 😊 
-
-Обратите, пожалуйста, внимание: слово должно состоять только из латинских букв (а также допустим символ дефиса)
-"""
-    INVALID_TRASLATION = """
-К сожалению, это слово - не перевод на английский! 😔
-
-Но не переживайте, попробуйте ввести слово еще раз! 😊 
-
-Обратите, пожалуйста, внимание: слово должно состоять только из букв кириллицы (а также допустим символ дефиса)
-"""
-    WORD_SUCCESS_ADDED = """
-Отлично!😊 Пара слов {} - {} была успешно добавлена! Выбирайте, что будем делать сейчас?
-"""
-    WAITING_DEL_WORD_ENG = """
-Давайте выберем слово, которое вы хорошо знаете и уже не хотите изучать!
-"""
-    SUCCESS_DELETE_WORD = """
-Слово было успешно удалено. Командуйте, что мы делаем дальше?
-"""
-    FAILURE_DELETE_WORD = """
-Вы такое слово не добавляли!
-"""
-    TRAINING_MODE = """
-Добро пожаловать в режим тренировки! 🎉
-
-Сегодня мы будем учиться новым словам и улучшать ваши навыки перевода. Готовы?
-"""
-    TRAINING_MODE_ITERATION = """
-Ваше слово - {}. Укажите правильный перевод!
-"""
-    STOP_TRAINING = """
-Хорошо! Скажите мне, когда будете готовы потренироваться 💪
-"""
-    CORRECT_ANSWER = """
-Замечательно! Это правильный ответ✅
-"""
-    INCORRECT_ANSWER = """
-К сожалению, это неправильный ответ❌ Попробуйте снова
-"""
-    NO_WORDS_LEFT = """
-Супер! Все слова закончились!
-"""
-    FAILURE_TRANSLATE = """
-К сожалению, слово перевести не удалось.😔 Пожалуйста, введите перевод вручную📚
-"""
-    SHOW_DICTIONARY = """
-Слова, которые вы изучаете:
-{}
-"""
-    NO_WORDS_IN_DICT = """
-Вы пока что не добавили слова!
-"""
-    INVALID_USER = """
-Слушайте, похоже, что я вас забыл или не встречал! Давайте срочно познакомимся😊 Напиши мне /start или нажми на "Справкаℹ️"
-"""
-
-MARKUP_DEFAULT = ReplyKeyboardMarkup(resize_keyboard=True)
-DEFAULT_BUTTONS = [
-    KeyboardButton(Commands.ADD),
-    KeyboardButton(Commands.DELETE),
-    KeyboardButton(Commands.TRAIN),
-    KeyboardButton(Commands.HELP),
-    KeyboardButton(Commands.MY_DICTIONARY)
-]
-MARKUP_DEFAULT.add(*DEFAULT_BUTTONS)
-
-def validate_target_word(target):
-    """Проверяет, является ли целевое слово допустимым для записи в бд.
-
-    Параметры:
-        target (str): Слово для проверки.
-
-    Возвращает:
-        bool: True, если слово допустимо, иначе False.
-
-    """
-    allowed_chars = 'abcdefghijklmnopqrstuvwxyz'
-    allowed_chars += allowed_chars.upper() + '- '
-    if not target:
-        return False
-    for char in target:
-        if char not in allowed_chars:
-            return False
-    return True
-
-def validate_translation(translate):
-    """Проверяет, является ли перевод допустимым.
-
-    Параметры:
-        translate (str): Перевод для проверки.
-
-    Возвращает:
-        bool: True, если перевод допустим, иначе False.
-
-    """
-    allowed_chars = 'абвгдеёжзийклмнопрстуфхцчшщъыьэюя'
-    allowed_chars += allowed_chars.upper() + '- '
-    if not translate:
-        return False
-    for char in translate:
-        if char not in allowed_chars:
-            return False
-    return True
-
 def translate_word(word):
     """Переводит английское слово на русский с помощью API Яндекс для словарей
+    через сервис перевода (пул соединений, кэш, предохранитель).
     
     Параметры:
         word (str): Английское слово для перевода.
@@ -221,28 +71,8 @@ def translate_word(word):
         str or None: Переведенное слово на русский или None, если не удалось перевести.
     
     """
-    url = 'https://dictionary.yandex.net/api/v1/dicservice.json/lookup'
-    params = {
-        'key': TRANSLATE_TOKEN,
-        'lang': 'en-ru',
-        'text': word,
-    }
-    response = requests.get(url, params=params, timeout=10)
-    tr_json = response.json()
-    flag_found = False
-    trans_word = None
-
-    for definition in tr_json['def']:
-        if not flag_found:
-            for translation in definition['tr']:
-                trans_word = translation['text']
-                flag_found = True
-                break  # первый попавшийся перевод нам подходит
-    if trans_word is None:
-        return None
-    return trans_word.lower()
+    return translator.translate(word)
 
-@bot.message_handler(commands=["start", "help"])
 def send_welcome(message):
     """
     Обрабатывает команды /start и /help.
@@ -262,16 +92,8 @@ def send_welcome(message):
     chat_id = message.chat.id
     keybord_markup = ReplyKeyboardMarkup(resize_keyboard=True)
 
-    session = Session()
-    user = list(
-        session.query(Users.name, Users.tg_id).\
-            select_from(Users).\
-            filter(Users.tg_id == message.from_user.id).all()
-        )
-    session.close()
-
-    if user:
-        bot.send_message(
+    if get_user_id(Session(), message.from_user.id) is not None:
+        outbox.send_message(
             chat_id,
             BotMessages.WELCOME_AGAIN,
             reply_markup=MARKUP_DEFAULT
@@ -284,7 +106,7 @@ def send_welcome(message):
     else:
         button = KeyboardButton(Commands.REFUSE_NAME_ENTER)
         keybord_markup.add(button)
-        bot.send_message(
+        outbox.send_message(
             chat_id,
             BotMessages.WELCOME,
             reply_markup=keybord_markup
@@ -295,9 +117,7 @@ def send_welcome(message):
             message.chat.id             # имя, то все равно добавляем его
         )                               # только как анонима
 
-@bot.message_handler(
-        func=lambda message:
-        bot.get_state(message.from_user.id) == MyStates.waiting_for_name.name)
+@router.state(MyStates.waiting_for_name)
 def set_name(message):
     """
     Обрабатывает ввод имени пользователя.
@@ -316,14 +136,14 @@ def set_name(message):
     username = message.text
     session = Session()
     if username == Commands.REFUSE_NAME_ENTER:
-        bot.reply_to(
+        outbox.reply_to(
             message,
             BotMessages.ANSWER_FOR_ANON,
             reply_markup=MARKUP_DEFAULT
         )
         user = Users(tg_id=message.from_user.id, name="Аноним")
     else:
-        bot.reply_to(
+        outbox.reply_to(
             message,
             BotMessages.ANSWER_FOR_USER.format(username),
             reply_markup=MARKUP_DEFAULT
@@ -332,11 +152,11 @@ def set_name(message):
 
     session.add(user)
     session.commit()
-
-    session.close()
+    add_shared_reviews(session, user.id, utcnow())
+    user_cache.put(user.tg_id, user.id, user.name)
     bot.set_state(message.from_user.id, MyStates.default, message.chat.id)
 
-@bot.message_handler(func=lambda message: message.text == Commands.ADD)
+@router.command(Commands.ADD)
 def add_word(message):
     """
     Обрабатывает команду добавления нового слова.
@@ -350,12 +170,10 @@ def add_word(message):
     """
     chat_id = message.chat.id
 
-    bot.send_message(chat_id, BotMessages.WAITING_NEW_WORD_ENG, reply_markup=ReplyKeyboardMarkup())
+    outbox.send_message(chat_id, BotMessages.WAITING_NEW_WORD_ENG, reply_markup=ReplyKeyboardMarkup())
     bot.set_state(message.from_user.id, MyStates.waiting_for_target_word, chat_id)
 
-@bot.message_handler(
-        func=lambda message:
-        bot.get_state(message.from_user.id) == MyStates.waiting_for_target_word.name)
+@router.state(MyStates.waiting_for_target_word)
 def add_word_input_target(message):
     """
     Обрабатывает ввод целевого слова от пользователя.
@@ -374,12 +192,12 @@ def add_word_input_target(message):
     target_word = message.text.lower()
 
     if not validate_target_word(target_word):
-        bot.reply_to(message, BotMessages.INVALID_TARGET_WORD)
+        outbox.reply_to(message, BotMessages.INVALID_TARGET_WORD)
         return  # предполагается ввод слов далее
     keyboard_markup = ReplyKeyboardMarkup(resize_keyboard=True)
     keyboard_markup.add(KeyboardButton(Commands.LET_TRANSLATE))
 
-    bot.send_message(
+    outbox.send_message(
         chat_id,
         BotMessages.WAITING_NEW_WORD_RUS,
         reply_markup=keyboard_markup
@@ -392,9 +210,7 @@ def add_word_input_target(message):
     with bot.retrieve_data(user_id, chat_id) as data:
         data['target_word'] = target_word
 
-@bot.message_handler(
-        func=lambda message:
-        bot.get_state(message.from_user.id) == MyStates.waiting_for_translation.name)
+@router.state(MyStates.waiting_for_translation)
 def add_word_input_translation(message):
     """
     Обработчик для получения перевода слова от пользователя.
@@ -413,44 +229,37 @@ def add_word_input_translation(message):
     if translation == Commands.LET_TRANSLATE:
         translation = translate_word(target_word)
         if translation is None:
-            bot.send_message(chat_id, BotMessages.FAILURE_TRANSLATE)
+            outbox.send_message(chat_id, BotMessages.FAILURE_TRANSLATE)
             return
     translation = translation.lower()
     if not validate_translation(translation):
-        bot.reply_to(message, BotMessages.INVALID_TRASLATION)
+        outbox.reply_to(message, BotMessages.INVALID_TRASLATION)
         return  # предполагается ввод слов далее
 
     session = Session()
 
-    user_query = session.query(Users).\
-            filter(Users.tg_id == message.from_user.id).all()
-    if len(list(user_query)) > 0:
-        user = user_query[0]
-
-        word_pair = Words(target=target_word, translation=translation)
-        vocabulary_pair = Vocabulary(user=user, word=word_pair)
-
-        session.add_all([word_pair, vocabulary_pair])
-        session.commit()
-        session.close()
-    else:
-        bot.send_message(
+    user_db_id = get_user_id(session, user_id)
+    if user_db_id is None:
+        outbox.send_message(
             chat_id,
             BotMessages.INVALID_USER,
             reply_markup=MARKUP_DEFAULT
         )
         bot.set_state(user_id, MyStates.default, chat_id)
-        session.close()
         return
+    word_id = add_word_to_vocabulary(session, user_db_id, target_word, translation)
+    vocabulary_cache.invalidate(user_id)
+    distractors.add(user_id, word_id, translation)
+    search.add(user_id, word_id, target_word, translation)
 
-    bot.send_message(
+    outbox.send_message(
         message.chat.id,
         BotMessages.WORD_SUCCESS_ADDED.format(target_word, translation),
         reply_markup=MARKUP_DEFAULT
     )
     bot.set_state(user_id, MyStates.default, chat_id)
 
-@bot.message_handler(func=lambda message: message.text == Commands.DELETE)
+@router.command(Commands.DELETE)
 def delete_word(message):
     """
     Обработчик для начала процесса удаления слова.
@@ -463,16 +272,15 @@ def delete_word(message):
     chat_id = message.chat.id
     user_id = message.from_user.id
 
-    bot.send_message(chat_id, BotMessages.WAITING_DEL_WORD_ENG)
+    outbox.send_message(chat_id, BotMessages.WAITING_DEL_WORD_ENG)
     bot.set_state(user_id, MyStates.waiting_word_to_del, chat_id)
 
-@bot.message_handler(
-        func=lambda message:
-        bot.get_state(message.from_user.id) == MyStates.waiting_word_to_del.name)
+@router.state(MyStates.waiting_word_to_del)
 def delete_word_from_db(message):
     """
     Обработчик для удаления слова из базы данных.
-    Проверяет, существует ли слово, и, если да, удаляет его.
+    Проверяет, существует ли слово, и, если да, удаляет его, а если нет -
+    предлагает кнопками похожие слова из словаря пользователя.
     
     Параметры:
         message (telebot.types.Message): Объект сообщения от пользователя.
@@ -483,34 +291,98 @@ def delete_word_from_db(message):
     user_id = message.from_user.id
 
     session = Session()
-    word_query = session.query(Vocabulary.id, Words.id).select_from(Words).\
+    word_query = session.query(Vocabulary.id, Words.id, Vocabulary.user_id).select_from(Words).\
         join(Vocabulary, Vocabulary.word_id == Words.id).\
-        join(Users, Users.id == Vocabulary.user_id).\
-            filter(Users.tg_id == user_id).\
-            filter(or_(Words.target == word_to_del, Words.translation == word_to_del))
-
-    if len(list(word_query)) > 0:
-        voc_id, words_id = word_query[0]
-        session.query(Vocabulary).filter(Vocabulary.id == voc_id).delete()
-        session.query(Words).filter(Words.id == words_id).delete()
-        session.commit()
-        bot.send_message(
+            filter(Vocabulary.user_id == get_user_id(session, user_id)).\
+            filter(or_(Words.target == word_to_del, Words.translation == word_to_del)).\
+            first()
+
+    if word_query is not None:
+        remove_own_word(session, user_id, word_query)
+        outbox.send_message(
             chat_id,
             BotMessages.SUCCESS_DELETE_WORD,
             reply_markup=MARKUP_DEFAULT
         )
     else:
-        bot.send_message(
-            chat_id,
-            BotMessages.FAILURE_DELETE_WORD,
-            reply_markup=MARKUP_DEFAULT
-        )
-        session.close()
+        matches = search.search(session, user_id, word_to_del, DELETE_SUGGESTIONS, own_only=True)
+        if matches:
+            markup = InlineKeyboardMarkup()
+            for word_id, target, translation in matches:
+                markup.add(InlineKeyboardButton(f"{target} - {translation}",
+                                                callback_data=f"del:{word_id}"))
+            outbox.send_message(chat_id, BotMessages.DELETE_SUGGESTIONS, reply_markup=markup)
+        else:
+            outbox.send_message(
+                chat_id,
+                BotMessages.FAILURE_DELETE_WORD,
+                reply_markup=MARKUP_DEFAULT
+            )
         return
-    session.close()
     bot.set_state(user_id, MyStates.default, chat_id)
 
-@bot.message_handler(func=lambda message: message.text == Commands.TRAIN)
+def remove_own_word(session, user_id, word_query):
+    """
+    Удаляет слово из словаря пользователя и из его кэшей и индексов.
+
+    Параметры:
+        session: SQLAlchemy session для выполнения операций с базой данных.
+        user_id (int): Идентификатор пользователя в Telegram.
+        word_query (tuple): (id записи vocabulary, id пары слов, id пользователя).
+
+    """
+    remove_word_from_vocabulary(session, *word_query)
+    vocabulary_cache.invalidate(user_id)
+    distractors.remove(user_id, word_query[1])
+    search.remove(user_id, word_query[1])
+
+def delete_suggestion_callback(call):
+    """
+    Удаляет слово, выбранное среди предложенных похожих слов.
+
+    Аргументы:
+        call (telebot.types.CallbackQuery): Нажатие кнопки с данными del:<id пары>.
+
+    """
+    user_id = call.from_user.id
+    chat_id = call.message.chat.id
+    session = Session()
+    word_query = session.query(Vocabulary.id, Vocabulary.word_id, Vocabulary.user_id).\
+        filter(Vocabulary.user_id == get_user_id(session, user_id)).\
+            filter(Vocabulary.word_id == int(call.data.split(":")[1])).\
+            first()
+    if word_query is not None:
+        remove_own_word(session, user_id, word_query)
+        text = BotMessages.SUCCESS_DELETE_WORD
+        bot.set_state(user_id, MyStates.default, chat_id)
+    else:  # слово уже удалено
+        text = BotMessages.FAILURE_DELETE_WORD
+    outbox.edit_message_text(text, chat_id, call.message.message_id)
+    bot.answer_callback_query(call.id)
+
+def inline_search(query):
+    """
+    Отвечает на inline-запрос "@бот начало слова": ищет слова пользователя
+    и общие слова по началу английского слова или перевода, в том числе с
+    одной опечаткой. Выбранный результат отправляет в чат пару слов.
+
+    Аргументы:
+        query (telebot.types.InlineQuery): Inline-запрос пользователя.
+
+    """
+    session = Session()
+    matches = search.search(session, query.from_user.id, query.query, INLINE_RESULTS)
+    results = [
+        InlineQueryResultArticle(
+            str(word_id),
+            f"{target} - {translation}",
+            InputTextMessageContent(f"{target} - {translation}")
+        )
+        for word_id, target, translation in matches
+    ]
+    bot.answer_inline_query(query.id, results, cache_time=0, is_personal=True)
+
+@router.command(Commands.TRAIN)
 def train_words(message):
     """
     Обработчик для начала режима тренировки слов.
@@ -520,22 +392,63 @@ def train_words(message):
         message (telebot.types.Message): Объект сообщения от пользователя.
 
     """
+    if CONFIG["TRAINING_INLINE"]:
+        start_inline_training(message)
+        return
+
     keyboard_markup = ReplyKeyboardMarkup(resize_keyboard=True)
 
     keyboard_markup.add(KeyboardButton(Commands.YES), KeyboardButton(Commands.NO))
     chat_id = message.chat.id
     user_id = message.from_user.id
 
-    bot.send_message(chat_id, BotMessages.TRAINING_MODE, reply_markup=keyboard_markup)
+    outbox.send_message(chat_id, BotMessages.TRAINING_MODE, reply_markup=keyboard_markup)
     bot.set_state(user_id, MyStates.training, chat_id)
     with bot.retrieve_data(user_id, chat_id) as data:
         data['target_word'] = None
         data['translation'] = None
-        data['all_words'] = None
+        data['word_id'] = None
+        data['word_ids'] = None
+        data['user_db_id'] = None
+        data['wrong_attempts'] = 0
+
+def prepare_question(session, user_id, user_db_id, word_ids, previous_id, now):
+    """
+    Выбирает очередное слово тренировки и варианты ответа.
+
+    Параметры:
+        session: SQLAlchemy session.
+        user_id (int): Идентификатор пользователя в Telegram.
+        user_db_id (int): Идентификатор пользователя из таблицы users.
+        word_ids (array.array or None): Идентификаторы слов пользователя
+                                        для случайных вариантов, если индекс
+                                        не помог (None - загрузить при
+                                        необходимости).
+        previous_id (int or None): Предыдущее слово (не повторяется подряд).
+        now (datetime): Текущий момент (UTC).
+
+    Возвращает:
+        tuple or None: (id слова, слово, перемешанные варианты (id, перевод))
+                       или None, если слов не осталось.
+
+    """
+    target_id = next_due_word(session, user_db_id, now, exclude=previous_id)
+    distractor_ids = None
+    if target_id is not None:
+        distractor_ids = distractors.pick(session, user_id, target_id)
+        if distractor_ids is None:  # слова нет в индексе или похожих слов мало
+            if word_ids is None:
+                word_ids = get_word_ids(session, user_id)
+            distractor_ids = pick_distractors(word_ids, target_id)
+    if distractor_ids is None:
+        return None
+
+    texts = get_words_by_ids(session, [target_id, *distractor_ids])
+    options = [(word_id, texts[word_id][1]) for word_id in [target_id, *distractor_ids]]
+    shuffle(options)
+    return target_id, texts[target_id][0], options
 
-@bot.message_handler(
-        func=lambda message:
-        bot.get_state(message.from_user.id) == MyStates.training.name)
+@router.state(MyStates.training)
 def train_mode_iteration_start(message):
     """
     Обработчик для начала итерации тренировки слов.
@@ -550,34 +463,38 @@ def train_mode_iteration_start(message):
     user_id = message.from_user.id
 
     if answer == Commands.NO or answer == Commands.STOP_TRAINING:
-        bot.send_message(chat_id, BotMessages.STOP_TRAINING, reply_markup=MARKUP_DEFAULT)
+        outbox.send_message(chat_id, BotMessages.STOP_TRAINING, reply_markup=MARKUP_DEFAULT)
         bot.set_state(user_id, MyStates.default, chat_id)
         return
 
     with bot.retrieve_data(user_id, chat_id) as data:
-        if data['all_words'] is not None:
-            all_words = data['all_words']
-        else:
-            session = Session()
-            all_words = get_words_list(session, user_id)
-            session.close()
+        word_ids = data['word_ids']
+        user_db_id = data['user_db_id']
+        previous_id = data['word_id']
+    session = Session()
+    now = utcnow()
+    if word_ids is None:  # начало тренировки
+        user_db_id = get_user_id(session, user_id)
+        if user_db_id is None:
+            outbox.send_message(chat_id, BotMessages.INVALID_USER, reply_markup=MARKUP_DEFAULT)
+            bot.set_state(user_id, MyStates.default, chat_id)
+            return
+        word_ids = get_word_ids(session, user_id)
 
-    if len(all_words) < 4:
-        bot.send_message(chat_id, BotMessages.NO_WORDS_LEFT, reply_markup=MARKUP_DEFAULT)
+    question = prepare_question(session, user_id, user_db_id, word_ids, previous_id, now)
+    if question is None:
+        outbox.send_message(chat_id, BotMessages.NO_WORDS_LEFT, reply_markup=MARKUP_DEFAULT)
         bot.set_state(user_id, MyStates.default, chat_id)
         return
-
-    shuffle(all_words)
-    others = all_words[-4:]
-    target_word, translation = others[-1]
-    shuffle(others)
+    target_id, target_word, options = question
+    translation = dict(options)[target_id]
 
     keyboard_markup = ReplyKeyboardMarkup()
-    for _, transl in others:
+    for _, transl in options:
         keyboard_markup.add(transl)
     keyboard_markup.add(Commands.STOP_TRAINING, *DEFAULT_BUTTONS)
 
-    bot.send_message(
+    outbox.send_message(
         chat_id,
         BotMessages.TRAINING_MODE_ITERATION.format(target_word),
         reply_markup=keyboard_markup
@@ -586,11 +503,12 @@ def train_mode_iteration_start(message):
     with bot.retrieve_data(user_id, chat_id) as data:
         data['target_word'] = target_word
         data['translation'] = translation
-        data['all_words'] = all_words[:-1]
+        data['word_id'] = target_id
+        data['word_ids'] = word_ids
+        data['user_db_id'] = user_db_id
+        data['wrong_attempts'] = 0
 
-@bot.message_handler(
-        func=lambda message:
-        bot.get_state(message.from_user.id) == MyStates.training_check.name)
+@router.state(MyStates.training_check)
 def train_mode_iteration_end(message):
     """
     Обрабатывает завершение итерации режима тренировки для языкового перевода.
@@ -606,22 +524,189 @@ def train_mode_iteration_end(message):
     user_id = message.from_user.id
     chat_id = message.chat.id
 
-    with bot.retrieve_data(user_id, chat_id) as data:
-        translation = data['translation']
-
     if message.text == Commands.STOP_TRAINING:
         train_mode_iteration_start(message)
         return
+    command = router.by_text.get(message.text)
+    if command is not None:  # нажатие кнопки команды - не ответ
+        command[1](message)
+        return
 
+    with bot.retrieve_data(user_id, chat_id) as data:
+        translation = data['translation']
+        if translation != message.text:
+            data['wrong_attempts'] += 1
+        word_id = data['word_id']
+        user_db_id = data['user_db_id']
+        wrong_attempts = data['wrong_attempts']
+
+    answer_log.record(user_db_id, word_id, translation == message.text, utcnow())
     if translation == message.text:
-        bot.send_message(chat_id, BotMessages.CORRECT_ANSWER)
+        session = Session()
+        record_review(session, user_db_id, word_id, answer_quality(wrong_attempts), utcnow())
+        outbox.send_message(chat_id, BotMessages.CORRECT_ANSWER)
         bot.set_state(user_id, MyStates.training, chat_id)
         train_mode_iteration_start(message)
     else:
-        bot.send_message(chat_id, BotMessages.INCORRECT_ANSWER)
+        outbox.send_message(chat_id, BotMessages.INCORRECT_ANSWER)
+        return
+
+def training_markup(target_id, options, wrong_attempts=0, crossed=()):
+    """
+    Создает inline-клавиатуру вопроса тренировки.
+
+    Данные кнопки варианта - t:<id слова>:<id варианта>:<ошибок>, поэтому
+    для проверки ответа не нужно читать состояние пользователя: нажатие
+    принимается, только если его данные есть на клавиатуре сообщения. Уже
+    отвергнутые варианты помечаются и получают данные t:x:<id варианта>.
+
+    Параметры:
+        target_id (int): Идентификатор загаданной пары слов.
+        options (list): Варианты (id пары, перевод) в порядке показа.
+        wrong_attempts (int): Сколько раз пользователь уже ошибся.
+        crossed (set): Идентификаторы отвергнутых вариантов.
+
+    Возвращает:
+        InlineKeyboardMarkup: Клавиатура с вариантами и кнопкой остановки.
+
+    """
+    markup = InlineKeyboardMarkup()
+    for word_id, translation in options:
+        if word_id in crossed:
+            markup.add(InlineKeyboardButton(WRONG_MARK + translation,
+                                            callback_data=f"t:x:{word_id}"))
+        else:
+            markup.add(InlineKeyboardButton(
+                translation, callback_data=f"t:{target_id}:{word_id}:{wrong_attempts}"
+            ))
+    markup.add(InlineKeyboardButton(Commands.STOP_TRAINING, callback_data="t:stop"))
+    return markup
+
+def parse_training_markup(markup):
+    """
+    Восстанавливает варианты вопроса из клавиатуры сообщения.
+
+    Параметры:
+        markup (InlineKeyboardMarkup): Клавиатура, созданная training_markup.
+
+    Возвращает:
+        tuple: (варианты (id пары, перевод), множество отвергнутых id).
+
+    """
+    options, crossed = [], set()
+    for row in markup.keyboard:
+        parts = row[0].callback_data.split(":")
+        if parts[1] == "stop":
+            continue
+        word_id, text = int(parts[2]), row[0].text
+        if parts[1] == "x":
+            crossed.add(word_id)
+            text = text[len(WRONG_MARK):]
+        options.append((word_id, text))
+    return options, crossed
+
+def start_inline_training(message):
+    """
+    Начинает тренировку с inline-клавиатурой: отправляет первый вопрос
+    одним сообщением, которое затем редактируется после каждого ответа
+    (см. training_callback).
+
+    Параметры:
+        message (telebot.types.Message): Объект сообщения от пользователя.
+
+    """
+    chat_id = message.chat.id
+    user_id = message.from_user.id
+    session = Session()
+    user_db_id = get_user_id(session, user_id)
+    if user_db_id is None:
+        outbox.send_message(chat_id, BotMessages.INVALID_USER, reply_markup=MARKUP_DEFAULT)
         return
+    question = prepare_question(session, user_id, user_db_id, None, None, utcnow())
+    if question is None:
+        outbox.send_message(chat_id, BotMessages.NO_WORDS_LEFT, reply_markup=MARKUP_DEFAULT)
+        return
+    target_id, target_word, options = question
+    outbox.send_message(
+        chat_id,
+        BotMessages.TRAINING_MODE_ITERATION.format(target_word),
+        reply_markup=training_markup(target_id, options)
+    )
 
-@bot.message_handler(func=lambda message: message.text == Commands.HELP)
+def training_callback(call):
+    """
+    Обрабатывает нажатие варианта ответа в тренировке с inline-клавиатурой.
+
+    Правильный ответ сохраняется, а сообщение вопроса заменяется следующим
+    вопросом; неправильный вариант помечается на клавиатуре. Результат
+    ответа показывается всплывающим уведомлением, новых сообщений в чате
+    не появляется.
+
+    Аргументы:
+        call (telebot.types.CallbackQuery): Нажатие кнопки с данными t:...
+
+    """
+    parts = call.data.split(":")
+    chat_id = call.message.chat.id
+    message_id = call.message.message_id
+    if parts[1] == "x":  # вариант уже отвергнут
+        bot.answer_callback_query(call.id)
+        return
+    if parts[1] == "stop":
+        outbox.edit_message_text(BotMessages.STOP_TRAINING, chat_id, message_id)
+        bot.answer_callback_query(call.id)
+        return
+    if getattr(call.message, "reply_markup", None) is None:
+        # сообщение вопроса старше 48 часов недоступно боту - начинаем заново
+        bot.answer_callback_query(call.id)
+        call.message.from_user = call.from_user
+        start_inline_training(call.message)
+        return
+    # состояние inline-тренировки - клавиатура вопроса, которую Telegram
+    # хранит на своей стороне: принимаются только данные ее кнопок, так что
+    # поддельное или устаревшее (уже замененное) нажатие не записывается
+    if call.data not in {button.callback_data
+                         for row in call.message.reply_markup.keyboard for button in row}:
+        bot.answer_callback_query(call.id)
+        return
+
+    target_id, option_id, wrong_attempts = map(int, parts[1:])
+    user_id = call.from_user.id
+    session = Session()
+    user_db_id = get_user_id(session, user_id)
+    if user_db_id is None:
+        bot.answer_callback_query(call.id)
+        outbox.send_message(chat_id, BotMessages.INVALID_USER, reply_markup=MARKUP_DEFAULT)
+        return
+
+    now = utcnow()
+    answer_log.record(user_db_id, target_id, option_id == target_id, now)
+    # изменение сообщения ставится в очередь до ответа на нажатие, чтобы
+    # оба запроса к Bot API выполнялись одновременно
+    if option_id != target_id:
+        options, crossed = parse_training_markup(call.message.reply_markup)
+        outbox.edit_message_reply_markup(
+            chat_id, message_id,
+            reply_markup=training_markup(target_id, options, wrong_attempts + 1,
+                                         crossed | {option_id})
+        )
+        bot.answer_callback_query(call.id, BotMessages.INCORRECT_ANSWER.strip())
+        return
+
+    record_review(session, user_db_id, target_id, answer_quality(wrong_attempts), now)
+    question = prepare_question(session, user_id, user_db_id, None, target_id, now)
+    if question is None:
+        outbox.edit_message_text(BotMessages.NO_WORDS_LEFT, chat_id, message_id)
+    else:
+        target_id, target_word, options = question
+        outbox.edit_message_text(
+            BotMessages.TRAINING_MODE_ITERATION.format(target_word),
+            chat_id, message_id,
+            reply_markup=training_markup(target_id, options)
+        )
+    bot.answer_callback_query(call.id, BotMessages.CORRECT_ANSWER.strip())
+
+@router.command(Commands.HELP)
 def show_help_info(message):
     """
     Отображает справочную информацию для пользователя.
@@ -635,46 +720,398 @@ def show_help_info(message):
     """
     send_welcome(message)
 
-@bot.message_handler(func=lambda message: message.text == Commands.MY_DICTIONARY)
-def show_dictionary(message):
+@router.command(Commands.STATS)
+def show_stats(message):
     """
-    Показывает словарь пользователя с сохраненными словами и их переводами.
-    Функция выполняет запрос к базе данных для получения сохранённых слов 
-    пользователя, формируя их в строку для отображения. Если слова не найдены, 
-    уведомляет пользователя.
+    Показывает статистику ответов пользователя в режиме тренировки:
+    точность, серии правильных ответов и самые трудные слова.
 
     Аргументы:
-        message (telebot.types.Message): Объект сообщения, содержащий запрос 
-                                         пользователя на просмотр словаря.
+        message (telebot.types.Message): Объект сообщения от пользователя.
 
     """
     chat_id = message.chat.id
-    user_id = message.from_user.id
+    session = Session()
+    user_db_id = get_user_id(session, message.from_user.id)
+    if user_db_id is None:
+        outbox.send_message(chat_id, BotMessages.INVALID_USER, reply_markup=MARKUP_DEFAULT)
+        return
+
+    answer_log.flush()  # учесть ответы, еще не записанные фоновым потоком
+    stats, hardest = user_answer_stats(session, user_db_id)
+    if stats is None:
+        outbox.send_message(chat_id, BotMessages.NO_STATS, reply_markup=MARKUP_DEFAULT)
+        return
+    hardest_text = BotMessages.HARDEST_WORDS.format("\n".join(
+        f"{target} - {translation}: ошибок {mistakes} из {answers}"
+        for target, translation, mistakes, answers in hardest
+    )) if hardest else ""
+    outbox.send_message(
+        chat_id,
+        BotMessages.STATS.format(
+            stats.answers, stats.correct, stats.correct / stats.answers,
+            stats.streak, stats.best_streak, hardest_text
+        ),
+        reply_markup=MARKUP_DEFAULT
+    )
+
+def render_dictionary_page(rows):
+    """
+    Формирует текст страницы словаря.
+
+    Параметры:
+        rows: Строки (id, target, translation) страницы.
+
+    Возвращает:
+        str: Текст сообщения.
+
+    """
+    return BotMessages.SHOW_DICTIONARY.format(
+        "\n".join(f"{target} - {translation}" for _, target, translation in rows)
+    )
+
+def dictionary_markup(rows, has_prev, has_next):
+    """
+    Создает inline-клавиатуру перелистывания словаря.
+
+    В данных кнопок хранится идентификатор первого или последнего слова
+    страницы, от которого строится соседняя страница.
+
+    Параметры:
+        rows: Строки (id, target, translation) текущей страницы.
+        has_prev (bool): Есть ли предыдущая страница.
+        has_next (bool): Есть ли следующая страница.
+
+    Возвращает:
+        InlineKeyboardMarkup or None: Клавиатура или None, если листать некуда.
+
+    """
+    buttons = []
+    if has_prev:
+        buttons.append(InlineKeyboardButton(Commands.PREV_PAGE,
+                                            callback_data=f"dict:prev:{rows[0][0]}"))
+    if has_next:
+        buttons.append(InlineKeyboardButton(Commands.NEXT_PAGE,
+                                            callback_data=f"dict:next:{rows[-1][0]}"))
+    if not buttons:
+        return None
+    markup = InlineKeyboardMarkup()
+    markup.row(*buttons)
+    return markup
+
+def load_dictionary_page(tg_id, anchor_id=None, backwards=False):
+    """
+    Загружает страницу словаря и определяет, есть ли соседние страницы.
+
+    Параметры:
+        tg_id (int): Идентификатор пользователя в Telegram.
+        anchor_id (int or None): Слово-граница страницы (None - первая страница).
+        backwards (bool): Листать назад.
+
+    Возвращает:
+        tuple: (строки страницы, есть ли предыдущая, есть ли следующая).
 
+    """
     session = Session()
+    rows = dictionary_page(session, tg_id, anchor_id, backwards, DICTIONARY_PAGE_SIZE + 1)
 
-    dict_query = session.query(Words.target, Words.translation).select_from(Words).\
-        join(Vocabulary, Vocabulary.word_id == Words.id).\
-        join(Users, Users.id == Vocabulary.user_id).\
-            filter(or_(Users.tg_id == user_id, Users.tg_id == 0))
-    dict_list = list(dict_query)
+    more = len(rows) > DICTIONARY_PAGE_SIZE  # лишняя строка - признак следующей страницы
+    if backwards:
+        return rows[-DICTIONARY_PAGE_SIZE:], more, True
+    return rows[:DICTIONARY_PAGE_SIZE], anchor_id is not None, more
+
+@router.command(Commands.MY_DICTIONARY)
+def show_dictionary(message):
+    """
+    Показывает первую страницу словаря пользователя с сохраненными словами
+    и их переводами. Остальные страницы открываются кнопками под сообщением
+    (см. dictionary_page_callback). Если слова не найдены, уведомляет пользователя.
+
+    Аргументы:
+        message (telebot.types.Message): Объект сообщения, содержащий запрос 
+                                         пользователя на просмотр словаря.
 
-    if len(dict_list) > 0:
-        dict_str = "\n".join([" - ".join(i) for i in dict_list])
-        bot.send_message(
+    """
+    chat_id = message.chat.id
+    rows, has_prev, has_next = load_dictionary_page(message.from_user.id)
+
+    if rows:
+        outbox.send_message(
             chat_id,
-            BotMessages.SHOW_DICTIONARY.format(dict_str),
-            reply_markup=MARKUP_DEFAULT
+            render_dictionary_page(rows),
+            reply_markup=dictionary_markup(rows, has_prev, has_next) or MARKUP_DEFAULT
         )
     else:
-        bot.send_message(
+        outbox.send_message(
             chat_id,
             BotMessages.NO_WORDS_IN_DICT,
             reply_markup=MARKUP_DEFAULT
         )
 
-    session.close()
+def dictionary_page_callback(call):
+    """
+    Перелистывает словарь: заменяет текст сообщения соседней страницей.
+
+    Аргументы:
+        call (telebot.types.CallbackQuery): Нажатие кнопки с данными
+                                            dict:prev:<id> или dict:next:<id>.
+
+    """
+    _, direction, anchor_id = call.data.split(":")
+    rows, has_prev, has_next = load_dictionary_page(
+        call.from_user.id, int(anchor_id), backwards=direction == "prev"
+    )
+    if not rows:  # слово-граница могло быть удалено: начинаем сначала
+        rows, has_prev, has_next = load_dictionary_page(call.from_user.id)
+
+    if rows:
+        outbox.edit_message_text(
+            render_dictionary_page(rows),
+            call.message.chat.id,
+            call.message.message_id,
+            reply_markup=dictionary_markup(rows, has_prev, has_next)
+        )
+    bot.answer_callback_query(call.id)
+
+def import_document(message):
+    """
+    Импортирует слова из присланного пользователем файла (CSV, TSV, JSON
+    или JSON Lines) в его словарь.
+
+    Файл разбирается потоково, некорректные строки пропускаются, а слова
+    записываются в базу данных пачками. Файлы больше IMPORT_MAX_BYTES не
+    скачиваются: Bot API отдает файл целиком, и его размер ограничивает
+    память, занятую одним импортом.
+
+    Параметры:
+        message (telebot.types.Message): Сообщение с документом.
+
+    """
+    chat_id = message.chat.id
+    user_id = message.from_user.id
+
+    fmt = detect_format(message.document.file_name)
+    if fmt is None:
+        outbox.reply_to(message, BotMessages.IMPORT_UNKNOWN_FORMAT)
+        return
+
+    session = Session()
+    user_db_id = get_user_id(session, user_id)
+    session.close()  # соединение не нужно на время загрузки файла
+    if user_db_id is None:
+        outbox.send_message(chat_id, BotMessages.INVALID_USER, reply_markup=MARKUP_DEFAULT)
+        return
+
+    limit = CONFIG["IMPORT_MAX_BYTES"]
+    too_large = BotMessages.IMPORT_TOO_LARGE.format(limit // (1 << 20) or 1)
+    if (message.document.file_size or 0) > limit:
+        outbox.reply_to(message, too_large)
+        return
+    file_info = bot.get_file(message.document.file_id)
+    if (file_info.file_size or 0) > limit:
+        outbox.reply_to(message, too_large)
+        return
+    content = bot.download_file(file_info.file_path)
+    if len(content) > limit:  # размер в сообщении не обязателен
+        outbox.reply_to(message, too_large)
+        return
+    stream = io.TextIOWrapper(io.BytesIO(content), encoding="utf-8-sig", newline="")
+    try:
+        result = import_pairs(engine, user_db_id, iter_pairs(stream, fmt))
+    except (ValueError, UnicodeDecodeError):
+        outbox.reply_to(message, BotMessages.IMPORT_UNKNOWN_FORMAT)
+        return
+    finally:
+        vocabulary_cache.invalidate(user_id)
+        distractors.invalidate(user_id)
+        search.invalidate(user_id)
+
+    outbox.send_message(
+        chat_id,
+        BotMessages.IMPORT_DONE.format(result["rows"], result["imported"], result["invalid"]),
+        reply_markup=MARKUP_DEFAULT
+    )
+
+def export_dictionary(message):
+    """
+    Обрабатывает команду /export: отправляет пользователю его словарь
+    файлом CSV. Слова выбираются из базы данных потоково.
+
+    Параметры:
+        message (telebot.types.Message): Сообщение с командой.
+
+    """
+    chat_id = message.chat.id
+
+    session = Session()
+    file = tempfile.SpooledTemporaryFile(max_size=1 << 20, mode="w+b")  # pylint: disable=consider-using-with
+    text = io.TextIOWrapper(file, encoding="utf-8", newline="")
+    count = write_csv(iter_user_words(session, message.from_user.id), text)
+    session.close()  # соединение не нужно на время отправки файла
+    text.flush()
+    text.detach()
+    if count == 0:
+        file.close()
+        outbox.send_message(chat_id, BotMessages.NO_WORDS_IN_DICT, reply_markup=MARKUP_DEFAULT)
+        return
+    # файл закрывается после отправки из очереди сообщений
+    outbox.send_document(
+        chat_id, file, "dictionary.csv",
+        on_done=lambda sent: file.close(),
+        caption=BotMessages.EXPORT_DONE.format(count),
+        reply_markup=MARKUP_DEFAULT
+    )
+
+def dispatch(message):
+    """
+    Единая точка входа для всех текстовых сообщений, кроме команд /start и /help.
+
+    Читает состояние пользователя из хранилища ровно один раз и выбирает
+    обработчик через таблицу маршрутизации router.
+
+    Параметры:
+        message (telebot.types.Message): Объект сообщения от пользователя.
+
+    """
+    state = bot.get_state(message.from_user.id)
+    handler = router.resolve(state, message.text)
+    if handler is not None:
+        with timed(HANDLER_LATENCY, handler.__name__, state or "-"):
+            handler(message)
+
+def create_app(config=None):
+    """
+    Собирает приложение: движок базы данных, фабрику сессий, хранилище
+    состояний и бота с зарегистрированными обработчиками.
+
+    Параметры:
+        config (dict or None): Параметры бота, недостающие берутся из
+                               common.DEFAULT_CONFIG. Если не переданы,
+                               читаются из config.env.
+
+    Возвращает:
+        telebot.TeleBot: Бот, готовый к запуску.
+
+    """
+    global CONFIG, bot, engine, Session, translator, distractors, search, outbox, answer_log
+    global reminders, metrics_server, recorder
+    CONFIG = make_config(**config) if config is not None else load_config(PATH)
+
+    engine = create_db_engine(
+        CONFIG["DSN"],
+        pool_size=CONFIG["DB_POOL_SIZE"],
+        max_overflow=CONFIG["DB_MAX_OVERFLOW"],
+        pool_timeout=CONFIG["DB_POOL_TIMEOUT"],
+        pool_recycle=CONFIG["DB_POOL_RECYCLE"]
+    )
+    instrument_engine(engine)
+    pool_monitor = PoolMonitor(engine, max_hold=CONFIG["DB_MAX_HOLD"])
+    Session = create_session(engine)
+    migrate(engine)  # применение недостающих миграций схемы и начальных данных
+    # кэши модуля models принадлежат прежней базе, если приложение создается заново
+    user_cache.clear()
+    vocabulary_cache.clear()
+    vocabulary_cache.maxsize = CONFIG["VOCABULARY_CACHE_SIZE"]
+    distractors = DistractorEngine(load_own_words, maxsize=CONFIG["VOCABULARY_CACHE_SIZE"])
+    search = SearchEngine(load_own_words, maxsize=CONFIG["VOCABULARY_CACHE_SIZE"])
+    answer_log = AnswerLog(
+        Session.session_factory,
+        batch_size=CONFIG["ANSWER_LOG_BATCH"],
+        interval=CONFIG["ANSWER_LOG_INTERVAL"],
+        max_pending=CONFIG["ANSWER_LOG_MAX_PENDING"]
+    )
+    user_cache.maxsize = CONFIG["USER_CACHE_SIZE"]
+    user_cache.ttl = CONFIG["USER_CACHE_TTL"]
+    translator = TranslationService(
+        CONFIG["TRANSLATE_TOKEN"],
+        url=CONFIG["TRANSLATE_URL"],
+        session_factory=Session.session_factory,  # свои короткие сессии, не сессия обновления
+        cache_size=CONFIG["TRANSLATE_CACHE_SIZE"],
+        timeout=CONFIG["TRANSLATE_TIMEOUT"],
+        offline=OfflineDictionary(CONFIG["OFFLINE_DICTIONARY"]) if CONFIG["OFFLINE_DICTIONARY"] else None
+    )
+
+    state_storage = create_state_storage(CONFIG["STATE_STORAGE"], engine)
+    bot = telebot.TeleBot(CONFIG["TOKEN"], state_storage=state_storage,
+                          use_class_middlewares=True, num_threads=0)
+    use_lanes(bot, CONFIG["LANES"], CONFIG["LANE_QUEUE_SIZE"])  # обновления пользователя - по порядку
+    if isinstance(state_storage, SQLStateStorage):
+        bot.setup_middleware(StateFlushMiddleware(state_storage))
+    bot.setup_middleware(SessionMiddleware(Session, pool_monitor))
+    profiler = Profiler(CONFIG["PROFILE_SLOWEST"]) if CONFIG["PROFILE_SLOWEST"] else None
+    bot.setup_middleware(MetricsMiddleware(profiler))
+    activity = ActivityTracker(Session.session_factory)
+    bot.setup_middleware(activity)
+    if CONFIG["RECORD_UPDATES"]:
+        recorder = UpdateRecorder(CONFIG["RECORD_UPDATES"])
+        bot.setup_middleware(recorder)
+    if CONFIG["METRICS_PORT"]:
+        metrics_server = start_metrics_server(CONFIG["METRICS_PORT"], CONFIG["METRICS_LISTEN"],
+                                              profiler)
+    outbox = SendQueue(
+        bot,
+        workers=CONFIG["SEND_WORKERS"],
+        global_rate=CONFIG["SEND_GLOBAL_RATE"],
+        chat_rate=CONFIG["SEND_CHAT_RATE"]
+    )
+    reminders = ReminderScheduler(
+        Session.session_factory,
+        outbox,
+        hour=CONFIG["REMINDER_HOUR"],
+        idle=timedelta(hours=CONFIG["REMINDER_IDLE_HOURS"]),
+        batch_size=CONFIG["REMINDER_BATCH"],
+        min_words=CONFIG["REMINDER_MIN_WORDS"],
+        rate=CONFIG["REMINDER_RATE"],
+        tracker=activity
+    )
+    reminders.start()
+
+    bot.register_message_handler(instrumented(send_welcome), commands=["start", "help"])
+    bot.register_message_handler(instrumented(export_dictionary), commands=["export"])
+    bot.register_message_handler(instrumented(show_stats), commands=["stats"])
+    bot.register_message_handler(instrumented(import_document), content_types=["document"])
+    bot.register_callback_query_handler(
+        instrumented(training_callback), func=lambda call: call.data.startswith("t:")
+    )
+    bot.register_callback_query_handler(
+        instrumented(dictionary_page_callback), func=lambda call: call.data.startswith("dict:")
+    )
+    bot.register_callback_query_handler(
+        instrumented(delete_suggestion_callback), func=lambda call: call.data.startswith("del:")
+    )
+    bot.register_inline_handler(instrumented(inline_search), func=lambda query: True)
+    bot.register_message_handler(dispatch, func=lambda message: True)
+    return bot
+
+def shutdown(timeout=10.0):
+    """
+    Останавливает фоновые компоненты бота после остановки обработки
+    обновлений: записывает буферы (ответы, активность пользователей, запись
+    обновлений) и отправляет сообщения, оставшиеся в очереди.
+
+    Параметры:
+        timeout (float): Сколько секунд всего ждать остановки компонентов.
+
+    """
+    deadline = time.monotonic() + timeout
+    reminders.close(timeout=max(0.0, deadline - time.monotonic()))
+    answer_log.close(timeout=max(0.0, deadline - time.monotonic()))
+    outbox.close(timeout=max(0.0, deadline - time.monotonic()))
+    translator.close()
+    if recorder is not None:
+        recorder.close()
+    if metrics_server is not None:
+        metrics_server.shutdown()
 
 if __name__ == '__main__':
+    create_app()
     print("Bot is currently running...")
-    bot.polling()
+    Poller(
+        bot,
+        Session.session_factory,
+        bot.worker_pool,
+        long_poll=CONFIG["POLL_TIMEOUT"],
+        drain_timeout=CONFIG["DRAIN_TIMEOUT"],
+        handover_timeout=CONFIG["HANDOVER_TIMEOUT"],
+        on_stop=shutdown
+    ).run()
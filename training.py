@@ -0,0 +1,93 @@
+"""
+Модуль логики режима тренировки.
+
+Порядок слов определяет интервальное повторение (алгоритм SM-2): после
+каждого ответа слово получает момент следующего повторения, а очередная
+карточка выбирается индексированным запросом по due_at (см.
+models.next_due_word). Неправильные варианты ответа подбирает индекс
+дистракторов (distractors.py); если он не нашел подходящих слов, варианты
+выбираются случайной выборкой из компактного массива идентификаторов слов
+пользователя (array('i')), который хранится в состоянии тренировки, так
+что подготовка вопроса не зависит от размера словаря. Текст загружается только для
+четырех показываемых слов.
+"""
+from datetime import datetime, timedelta, timezone
+from random import randrange
+
+OPTIONS_COUNT = 4  # сколько вариантов ответа показывается в вопросе
+MIN_EASE = 1.3
+LAPSE_DELAY = timedelta(minutes=10)  # когда повторить слово после ошибки
+
+
+def utcnow():
+    """Возвращает текущий момент UTC без часового пояса (как в столбцах DateTime)."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def answer_quality(wrong_attempts):
+    """
+    Переводит количество неправильных попыток в оценку SM-2 (0-5).
+
+    Параметры:
+        wrong_attempts (int): Сколько раз пользователь ошибся перед верным ответом.
+
+    Возвращает:
+        int: 5 - с первой попытки, 3 - со второй, 1 - с третьей и далее.
+
+    """
+    if wrong_attempts == 0:
+        return 5
+    if wrong_attempts == 1:
+        return 3
+    return 1
+
+def schedule_review(repetitions, interval_days, ease, quality, now):
+    """
+    Вычисляет следующее повторение слова по алгоритму SM-2.
+
+    Параметры:
+        repetitions (int): Количество успешных повторений подряд.
+        interval_days (float): Текущий интервал в днях.
+        ease (float): Коэффициент легкости.
+        quality (int): Оценка ответа от 0 до 5.
+        now (datetime): Текущий момент.
+
+    Возвращает:
+        tuple: (repetitions, interval_days, ease, due_at) после ответа.
+
+    """
+    ease = max(MIN_EASE, ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    if quality < 3:
+        return 0, 0.0, ease, now + LAPSE_DELAY
+
+    repetitions += 1
+    if repetitions == 1:
+        interval_days = 1.0
+    elif repetitions == 2:
+        interval_days = 6.0
+    else:
+        interval_days = round(interval_days * ease, 2)
+    return repetitions, interval_days, ease, now + timedelta(days=interval_days)
+
+def pick_distractors(word_ids, target_id, count=OPTIONS_COUNT - 1):
+    """
+    Выбирает неправильные варианты ответа случайной выборкой индексов.
+
+    Параметры:
+        word_ids (array.array): Идентификаторы пар слов пользователя.
+        target_id (int): Идентификатор загаданного слова.
+        count (int): Сколько вариантов нужно.
+
+    Возвращает:
+        list or None: Идентификаторы вариантов или None, если слов слишком мало.
+
+    """
+    if len(word_ids) <= count:
+        return None
+    chosen = set()
+    for _ in range(count * 50):  # в массиве возможны повторы, не зацикливаемся
+        word_id = word_ids[randrange(len(word_ids))]
+        if word_id != target_id:
+            chosen.add(word_id)
+            if len(chosen) == count:
+                return list(chosen)
+    return None
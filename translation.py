@@ -0,0 +1,270 @@
+"""
+Модуль сервиса перевода слов через API Яндекс для словарей.
+
+Сервис заменяет прямой вызов requests.get в обработчике:
+- если подключен локальный словарь (offline_dict.py), слово сначала ищется
+  в нем, и к API обращаются только при промахе;
+- HTTP-запросы идут через общий пул соединений (requests.Session);
+- переводы кэшируются в два уровня: LRU в памяти и таблица translations
+  в базе данных, поэтому популярные слова не запрашиваются у API повторно;
+- одновременные запросы одного и того же слова объединяются в один;
+- при серии ошибок API срабатывает предохранитель (circuit breaker), и
+  на время перевод сразу возвращает None, не дожидаясь таймаутов;
+- сетевые ошибки и некорректные ответы не доходят до обработчика:
+  в этих случаях возвращается None.
+"""
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+import requests
+from requests.adapters import HTTPAdapter
+import sqlalchemy as sq
+from models import Translations, dialect_insert
+from common import first_translation
+from metrics import HTTP_LATENCY
+
+YANDEX_URL = 'https://dictionary.yandex.net/api/v1/dicservice.json/lookup'
+_NOT_FOUND = object()  # отрицательный результат в кэше памяти
+
+
+class CircuitBreaker:
+    """
+    Предохранитель для внешнего API.
+
+    После failure_threshold ошибок подряд предохранитель размыкается и
+    reset_timeout секунд отклоняет запросы, затем пропускает один пробный
+    запрос: при успехе замыкается, при ошибке снова размыкается.
+
+    Атрибуты:
+        failure_threshold (int): Количество ошибок подряд до размыкания.
+        reset_timeout (float): Время в секундах до пробного запроса.
+
+    """
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        """bool: True, если запросы сейчас отклоняются."""
+        with self._lock:
+            return self._opened_at is not None
+
+    def allow(self):
+        """
+        Проверяет, можно ли выполнить запрос.
+
+        Возвращает:
+            bool: True, если запрос разрешен.
+
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._probing or time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            self._probing = True  # пропускаем один пробный запрос
+            return True
+
+    def record_success(self):
+        """Отмечает успешный запрос."""
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        """Отмечает неудачный запрос."""
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+
+class TranslationService:
+    """
+    Сервис перевода английских слов на русский.
+
+    Атрибуты:
+        token (str): Ключ API Яндекс для словарей.
+        url (str): Адрес метода lookup.
+        session_factory: Фабрика SQLAlchemy-сессий для кэша в базе данных
+                         (None - кэш только в памяти).
+        cache_size (int): Размер кэша в памяти.
+        timeout (float or tuple): Таймаут HTTP-запроса (как в requests).
+        breaker (CircuitBreaker): Предохранитель API.
+        offline (OfflineDictionary or None): Локальный словарь, к которому
+                                             сервис обращается первым.
+        stats (dict): Счетчики offline_hits, memory_hits, db_hits, api_calls,
+                      failures, coalesced, rejected.
+
+    """
+    def __init__(self, token, url=YANDEX_URL, session_factory=None, cache_size=10000,
+                 timeout=(3.05, 10), pool_size=10, breaker=None, offline=None):
+        self.token = token
+        self.url = url
+        self.session_factory = session_factory
+        self.cache_size = cache_size
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker()
+        self.offline = offline
+        self.stats = dict.fromkeys(
+            ("offline_hits", "memory_hits", "db_hits", "api_calls", "failures", "coalesced",
+             "rejected"), 0
+        )
+        self.http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.http.mount("https://", adapter)
+        self.http.mount("http://", adapter)
+        self._cache = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _remember(self, word, translation):
+        with self._lock:
+            self._cache[word] = _NOT_FOUND if translation is None else translation
+            self._cache.move_to_end(word)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _db_get(self, word):
+        if self.session_factory is None:
+            return None
+        session = self.session_factory()
+        try:
+            return session.scalar(
+                sq.select(Translations.translation).where(Translations.word == word)
+            )
+        finally:
+            session.close()
+
+    def _db_put(self, word, translation):
+        if self.session_factory is None:
+            return
+        session = self.session_factory()
+        try:
+            stmt = dialect_insert(session.get_bind(), Translations)
+            if stmt is not None:
+                session.execute(stmt.values(word=word, translation=translation).\
+                                on_conflict_do_nothing(index_elements=["word"]))
+            else:
+                session.merge(Translations(word=word, translation=translation))
+            session.commit()
+        except sq.exc.SQLAlchemyError:
+            session.rollback()  # кэш в базе необязателен для ответа пользователю
+        finally:
+            session.close()
+
+    def _request(self, word):
+        if not self.breaker.allow():
+            self._count("rejected")
+            raise ConnectionError("Предохранитель API перевода разомкнут")
+        self._count("api_calls")
+        start = time.perf_counter()
+        try:
+            response = self.http.get(
+                self.url,
+                params={'key': self.token, 'lang': 'en-ru', 'text': word},
+                timeout=self.timeout
+            )
+            response.raise_for_status()
+            translation = first_translation(response.json())
+        except (requests.RequestException, ValueError, KeyError, TypeError):
+            HTTP_LATENCY.observe(time.perf_counter() - start, "translate", "error")
+            self._count("failures")
+            self.breaker.record_failure()
+            raise
+        HTTP_LATENCY.observe(time.perf_counter() - start, "translate", "ok")
+        self.breaker.record_success()
+        return translation
+
+    def _lookup(self, word):
+        translation = self._db_get(word)
+        if translation is not None:
+            self._count("db_hits")
+            self._remember(word, translation)
+            return translation
+        translation = self._request(word)
+        if translation is not None:
+            self._db_put(word, translation)
+        self._remember(word, translation)
+        return translation
+
+    def translate(self, word):
+        """
+        Переводит английское слово на русский.
+
+        Параметры:
+            word (str): Английское слово для перевода.
+
+        Возвращает:
+            str or None: Перевод в нижнем регистре или None, если перевод
+                         не найден или API недоступен.
+
+        """
+        word = word.strip().lower()
+        if self.offline is not None:
+            translation = self.offline.lookup(word)
+            if translation is not None:
+                self._count("offline_hits")
+                return translation
+        with self._lock:
+            cached = self._cache.get(word)
+            if cached is not None:
+                self._cache.move_to_end(word)
+                self.stats["memory_hits"] += 1
+                return None if cached is _NOT_FOUND else cached
+            future = self._inflight.get(word)
+            owner = future is None
+            if owner:
+                future = self._inflight[word] = Future()
+            else:
+                self.stats["coalesced"] += 1
+
+        if not owner:
+            try:
+                return future.result()
+            except Exception:  # ошибку уже учел владелец запроса
+                return None
+
+        try:
+            translation = self._lookup(word)
+        except Exception as error:  # pylint: disable=broad-except
+            future.set_exception(error)
+            return None
+        else:
+            future.set_result(translation)
+            return translation
+        finally:
+            with self._lock:
+                self._inflight.pop(word, None)
+
+    def hit_rate(self):
+        """
+        Возвращает долю переводов, полученных без обращения к API.
+
+        Возвращает:
+            float: Доля попаданий в кэш (0.0, если обращений не было).
+
+        """
+        with self._lock:
+            hits = (self.stats["offline_hits"] + self.stats["memory_hits"]
+                    + self.stats["db_hits"] + self.stats["coalesced"])
+            total = hits + self.stats["api_calls"] + self.stats["rejected"]
+        return hits / total if total else 0.0
+
+    def close(self):
+        """Закрывает пул HTTP-соединений и локальный словарь."""
+        self.http.close()
+        if self.offline is not None:
+            self.offline.close()